@@ -0,0 +1,174 @@
+"""Benchmark of the conversion phases on synthetic OCR-D workflows.
+
+Each phase of the conversion is timed separately for workflows of increasing size:
+reading the workflow file, parsing the processor calls, validating them, rendering the
+process blocks, rendering the workflow block and writing the Nextflow script.
+
+Usage:
+    python -m benchmarks.bench_conversion --sizes 10 100 1000 --output results.json
+    python -m benchmarks.bench_conversion --baseline results.json --tolerance 0.25
+
+With `--baseline` the results are compared to a previously stored run and the exit
+status is 1 if any phase got slower than the tolerance allows.
+"""
+from argparse import ArgumentParser
+from json import dump, dumps, load
+from os.path import join
+import platform
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from oton.models import NextflowFileExecutable
+from oton.registry import OCRD_ALL_JSON
+from oton.utils import read_from_file
+from oton.validators.ocrd_validator import parse_arguments, validate_all_processors
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+PHASES = [
+    "read_from_file",
+    "parse_arguments",
+    "validate_all_processors",
+    "render_processes",
+    "render_workflow",
+    "produce_nextflow_file"
+]
+# Phases faster than this (in seconds) are not compared, their timings are mostly noise
+MIN_COMPARED_SECONDS = 0.001
+
+
+def select_executables() -> List[str]:
+    """Select the processors of the registry, which can be called without any parameters"""
+    executables = []
+    for executable in sorted(OCRD_ALL_JSON.keys()):
+        tool_json = OCRD_ALL_JSON[executable]
+        parameters = tool_json.get('parameters', {})
+        if any(parameter.get('required', False) for parameter in parameters.values()):
+            continue
+        if executable.startswith('ocrd-'):
+            executables.append(executable)
+    return executables
+
+
+def generate_workflow(steps: int, with_parameters: bool = False) -> str:
+    """Generate a linear `ocrd process` workflow cycling through the real processors.
+
+    If `with_parameters` is set, each step passes all default parameters of the processor inline with `-p`.
+    """
+    executables = select_executables()
+    lines = ['ocrd process \\']
+    for index in range(steps):
+        executable = executables[index % len(executables)]
+        task = f'{executable[len("ocrd-"):]} -I OCR-D-GRP-{index} -O OCR-D-GRP-{index + 1}'
+        if with_parameters:
+            parameters = {
+                name: parameter['default']
+                for name, parameter in OCRD_ALL_JSON[executable].get('parameters', {}).items()
+                if 'default' in parameter
+            }
+            if parameters:
+                task += f" -p '{dumps(parameters)}'"
+        separator = ' \\' if index < steps - 1 else ''
+        lines.append(f'  "{task}"{separator}')
+    return '\n'.join(lines) + '\n'
+
+
+def time_phases(workflow_path: str, output_path: str) -> Dict[str, float]:
+    timings = {}
+
+    start = perf_counter()
+    _, processor_tasks = read_from_file(workflow_path)
+    timings["read_from_file"] = perf_counter() - start
+
+    start = perf_counter()
+    processors = [parse_arguments(task) for task in processor_tasks]
+    timings["parse_arguments"] = perf_counter() - start
+
+    start = perf_counter()
+    validate_all_processors(processors)
+    timings["validate_all_processors"] = perf_counter() - start
+
+    nf_file_executable = NextflowFileExecutable()
+    nf_file_executable.build_parameters()
+    start = perf_counter()
+    nf_processes, _ = nf_file_executable.build_nextflow_processes(processors)
+    timings["render_processes"] = perf_counter() - start
+
+    start = perf_counter()
+    nf_file_executable.build_main_workflow(nf_processes)
+    timings["render_workflow"] = perf_counter() - start
+
+    start = perf_counter()
+    nf_file_executable.produce_nextflow_file(output_path)
+    timings["produce_nextflow_file"] = perf_counter() - start
+    return timings
+
+
+def run_benchmark(sizes: List[int], repeats: int = 3, with_parameters: bool = False) -> dict:
+    """Time each phase for each workflow size, keeping the best of `repeats` runs"""
+    results = {}
+    with TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            workflow_path = join(tmp_dir, f'workflow_{size}.txt')
+            with open(workflow_path, mode='w', encoding='utf-8') as workflow_file:
+                workflow_file.write(generate_workflow(size, with_parameters))
+            best = {}
+            for _ in range(repeats):
+                timings = time_phases(workflow_path, join(tmp_dir, f'nextflow_{size}.nf'))
+                for phase, seconds in timings.items():
+                    best[phase] = min(seconds, best.get(phase, seconds))
+            results[str(size)] = best
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'with_parameters': with_parameters,
+        'results': results
+    }
+
+
+def compare_to_baseline(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a message for each phase, which is slower than the baseline by more than `tolerance`"""
+    regressions = []
+    for size, timings in current['results'].items():
+        baseline_timings = baseline['results'].get(size)
+        if not baseline_timings:
+            continue
+        for phase, seconds in timings.items():
+            baseline_seconds = baseline_timings.get(phase)
+            if baseline_seconds is None or seconds < MIN_COMPARED_SECONDS:
+                continue
+            if seconds > baseline_seconds * (1 + tolerance):
+                regressions.append(f"{phase} [{size} steps]: {seconds:.4f}s, baseline {baseline_seconds:.4f}s")
+    return regressions
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(description="Benchmark the conversion phases on synthetic OCR-D workflows.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Amounts of workflow steps.')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per size, the best one is kept.')
+    parser.add_argument('--with-parameters', action='store_true', help='Pass the default parameters inline.')
+    parser.add_argument('--output', help='Path of the JSON file the results are written to.')
+    parser.add_argument('--baseline', help='Path of the JSON results of a previous run to compare to.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown to the baseline.')
+    args = parser.parse_args(arguments)
+
+    current = run_benchmark(args.sizes, args.repeats, args.with_parameters)
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as output_file:
+            dump(current, output_file, indent=2)
+    print(dumps(current, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, mode='r', encoding='utf-8') as baseline_file:
+            baseline = load(baseline_file)
+        regressions = compare_to_baseline(current, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
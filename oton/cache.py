@@ -0,0 +1,129 @@
+from functools import lru_cache
+from hashlib import sha256
+from json import dumps, loads
+from os import getpid, makedirs, replace, walk
+from os.path import abspath, dirname, isfile, join, relpath
+from shutil import copyfile
+from typing import List, Optional
+
+from .constants import OTON_CACHE_DIR
+from .instrumentation import get_logger
+
+__all__ = [
+    "ConversionCache",
+    "ValidationCache"
+]
+
+logger = get_logger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_converter_version() -> str:
+    """The hash of the sources of the converter.
+
+    The released version is not bumped along with changes of the rendered scripts or of the validation,
+    and is unknown if the package is not installed. Hashing the sources invalidates the cached entries
+    of older converter code instead. Computed on first use only.
+    """
+    package_dir = dirname(abspath(__file__))
+    source_paths = []
+    for directory, _, file_names in walk(package_dir):
+        source_paths.extend(join(directory, file_name) for file_name in file_names if file_name.endswith('.py'))
+    source_hash = sha256()
+    for source_path in sorted(source_paths):
+        source_hash.update(relpath(source_path, package_dir).encode('utf-8'))
+        with open(source_path, mode='rb') as source_file:
+            source_hash.update(source_file.read())
+    return source_hash.hexdigest()
+
+
+class ConversionCache:
+    """Content addressed store of the produced Nextflow scripts.
+
+    The key of a conversion is the hash of the normalized workflow lines, the version of
+    the ocrd tool registry, the hash of the converter sources and the conversion options.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = OTON_CACHE_DIR):
+        self.cache_dir = join(cache_dir, 'conversions')
+
+    @staticmethod
+    def build_key(workflow_lines: List[str], tool_version: str, options: dict) -> str:
+        key_source = dumps({
+            'workflow': workflow_lines,
+            'tool_version': tool_version,
+            'converter_version': get_converter_version(),
+            'options': options
+        }, sort_keys=True)
+        return sha256(key_source.encode('utf-8')).hexdigest()
+
+    def load(self, key: str, output_paths: List[str]) -> bool:
+        """Write the cached files of `key` to `output_paths`. Returns False if there are none"""
+        cached_paths = [self.__cached_path(key, index) for index in range(len(output_paths))]
+        if not all(isfile(cached_path) for cached_path in cached_paths):
+            return False
+        for cached_path, output_path in zip(cached_paths, output_paths):
+            copyfile(cached_path, output_path)
+        logger.info(f"Conversion cache hit: {key}")
+        return True
+
+    def store(self, key: str, output_paths: List[str]):
+        try:
+            makedirs(self.cache_dir, exist_ok=True)
+            for index, output_path in enumerate(output_paths):
+                tmp_path = join(self.cache_dir, f'{key}.{index}.{getpid()}.tmp')
+                copyfile(output_path, tmp_path)
+                replace(tmp_path, self.__cached_path(key, index))
+        except OSError as error:
+            logger.warning(f"Failed to store the conversion in the cache: {error}")
+
+    def __cached_path(self, key: str, index: int) -> str:
+        # The first file is the Nextflow script, the further ones are its module files
+        return join(self.cache_dir, f'{key}.nf' if index == 0 else f'{key}.{index}.nf')
+
+
+class ValidationCache:
+    """Content addressed store of the reports of the processor parameter validation.
+
+    The key of a validation is the hash of the executable, the canonical JSON of its parameters,
+    whether the defaults are inserted, the version of the ocrd tool registry and the hash of
+    the converter sources. A changed registry or converter hence yields new keys. The entries are written atomically,
+    so parallel `oton` processes may share the cache directory.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = OTON_CACHE_DIR):
+        self.cache_dir = join(cache_dir, 'validations')
+
+    @staticmethod
+    def build_key(executable: str, parameters: dict, tool_version: str, with_defaults: bool = False) -> str:
+        key_source = dumps({
+            'executable': executable,
+            'parameters': parameters,
+            'with_defaults': with_defaults,
+            'tool_version': tool_version,
+            'converter_version': get_converter_version()
+        }, sort_keys=True, separators=(',', ':'))
+        return sha256(key_source.encode('utf-8')).hexdigest()
+
+    def load(self, key: str) -> Optional[dict]:
+        """Returns the stored entry of `key`, i.e., the `errors` and the validated `parameters`, if any"""
+        try:
+            with open(self.__cached_path(key), mode='r', encoding='utf-8') as cached_file:
+                return loads(cached_file.read())
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, errors: List[str], parameters: dict):
+        cached_path = self.__cached_path(key)
+        tmp_path = f'{cached_path}.{getpid()}.tmp'
+        try:
+            makedirs(dirname(cached_path), exist_ok=True)
+            with open(tmp_path, mode='w', encoding='utf-8') as tmp_file:
+                tmp_file.write(dumps({'errors': errors, 'parameters': parameters}))
+            replace(tmp_path, cached_path)
+        except OSError as error:
+            logger.warning(f"Failed to store the validation in the cache: {error}")
+
+    def __cached_path(self, key: str) -> str:
+        # Sharded by the first key characters, to keep the directories small for large corpora
+        return join(self.cache_dir, key[:2], f'{key}.json')
@@ -1,12 +1,57 @@
 import click
 from .constants import DEFAULT_IN_FILE, DEFAULT_OUT_FILE
-from .converter import Converter
-from .validators.ocrd_validator import OCRDValidator
+from .instrumentation import enable_tracing, is_console_output_enabled, profile_calls, set_console_output
+
+# Note: The converter, the validators and the server pull in heavy dependencies
+#  (ocrd_validators, ocrd_utils, jsonschema). They are imported inside the commands,
+#  so that e.g. `oton --help` or a failing path check do not pay for them.
+
+
+def echo(message: str):
+    # The progress messages, turned off with `oton --quiet`
+    if is_console_output_enabled():
+        click.echo(message)
+
+
+def split_file_grps(file_grps: str):
+    # The comma separated file groups of the options, None if not given
+    return [file_grp for file_grp in file_grps.split(',') if file_grp] if file_grps else None
+
+
+# The options of the dataflow analysis shared by the commands validating a workflow
+existing_groups_option = click.option(
+    '--existing-groups',
+    default=None,
+    help='Comma separated file groups present in the workspace already (e.g. ground truth), '
+         'which the steps may read besides the input file groups of the first step.')
+keep_groups_option = click.option(
+    '--keep-groups',
+    default=None,
+    help='Comma separated file groups kept as final output. If given, the steps whose output is neither kept '
+         'nor read by a later step are reported as dead.')
+prune_dead_steps_option = click.option(
+    '--prune-dead-steps',
+    is_flag=True,
+    help='If set, the dead steps (see --keep-groups) are removed from the workflow.')
+merge_duplicates_option = click.option(
+    '--merge-duplicates',
+    is_flag=True,
+    help='If set, steps repeating a previous step (same executable, parameters and input) are removed and '
+         'the later steps read the output of the previous step instead.')
+
+
+def echo_trace_summary(tracer):
+    for line in tracer.summary_lines():
+        click.echo(line, err=True)
 
 
 @click.group()
-def cli():
-    pass
+@click.option('-q', '--quiet',
+              is_flag=True,
+              help='If set, only warnings, errors and the results of the commands are printed.')
+def cli(quiet: bool):
+    if quiet:
+        set_console_output(False)
 
 
 @cli.command("convert", help="Convert an OCR-D workflow to a Nextflow workflow script.")
@@ -14,20 +59,199 @@ def cli():
               type=click.Path(dir_okay=False, exists=True, readable=True),
               default=DEFAULT_IN_FILE,
               show_default=True,
-              help='Path to the OCR-D workflow file to be converted.')
+              help='Path to the OCR-D workflow file to be converted, or its intermediate representation.')
 @click.option('-O', '--output_path',
               type=click.Path(dir_okay=False, writable=True),
               default=DEFAULT_OUT_FILE,
               show_default=True,
               help='Path of the Nextflow workflow script to be generated.')
+@click.option('-T', '--target',
+              type=(click.Choice(['native', 'dockerized', 'docker', 'singularity', 'apptainer']),
+                    click.Path(dir_okay=False, writable=True)),
+              multiple=True,
+              help='Flavour and path of a further Nextflow workflow script rendered from the same validated workflow, '
+                   'repeatable, e.g. "-T dockerized ./nextflow_dockerized.nf".')
 @click.option('-D', '--dockerized',
               is_flag=True,
               help='If set, then the dockerized variant of the Nextflow script is generated.')
-def convert(input_path: str, output_path: str, dockerized: bool):
-    print(f"Converting from: {input_path}")
-    print(f"Converting to: {output_path}")
-    Converter().convert_OtoN(input_path, output_path, dockerized)
-    print("Conversion was successful!")
+@click.option('-C', '--container',
+              type=click.Choice(['docker', 'singularity', 'apptainer']),
+              default=None,
+              help='If set, the steps run in the container of the native container directive, '
+                   'the config enabling the container engine is written next to the script.')
+@click.option('--page-parallel',
+              type=click.IntRange(min=0),
+              default=0,
+              show_default=True,
+              help='If positive, the pages of the workspace are split into that many chunks processed concurrently.')
+@click.option('--dag',
+              is_flag=True,
+              help='If set, independent steps (by their file groups) are executed concurrently.')
+@click.option('--shared-workspace',
+              is_flag=True,
+              help='If set, the METS path is passed between the steps as value instead of staging the METS file, '
+                   'for workspaces on a shared filesystem.')
+@click.option('--scratch',
+              default=None,
+              help='Run the steps on a copy of the workspace in the scratch task directory, either "true" for the '
+                   'temporary directory of the node or a path. Requires --shared-workspace, --page-parallel or --dag.')
+@click.option('--multi-workspace',
+              type=click.IntRange(min=0),
+              default=0,
+              show_default=True,
+              help='If positive, the script processes many workspaces (params.workspaces) in a single run, '
+                   'up to that many concurrently per step.')
+@click.option('--resumable',
+              is_flag=True,
+              help='If set, the steps get stable inputs, so that "nextflow run -resume" skips the completed steps '
+                   'after a failure or a changed workflow. The workspace must be on a shared filesystem.')
+@click.option('--store-dir',
+              default=None,
+              help='Record the completed steps of the resumable mode per output file group in this directory '
+                   '(params.store_dir), to skip them even without -resume. Implies --resumable.')
+@existing_groups_option
+@keep_groups_option
+@prune_dead_steps_option
+@merge_duplicates_option
+@click.option('--fuse',
+              default=None,
+              help='Run consecutive steps back to back in a single task. Either ranges of zero based step indices '
+                   '(e.g. 0-3,5-6), "light" for the steps requesting few resources in the resource profile, '
+                   'or executable classes (e.g. preprocessing).')
+@click.option('--cache/--no-cache',
+              default=False,
+              show_default=True,
+              help='Reuse the result of a previous conversion of the same workflow with the same options.')
+@click.option('--deduplicate',
+              is_flag=True,
+              help='If set, one process per distinct template is defined in a module file next to the script '
+                   'and included under the name of each step.')
+@click.option('--resources',
+              is_flag=True,
+              help='If set, each step requests the cpus, memory and time of the built-in resource profile.')
+@click.option('--resource-profile',
+              type=click.Path(dir_okay=False, exists=True, readable=True),
+              default=None,
+              help='JSON file overriding the built-in resource profile per executable, implies --resources.')
+@click.option('--watch',
+              is_flag=True,
+              help='If set, keep running and convert again whenever the content of the input file changes.')
+@click.option('--profile',
+              is_flag=True,
+              help='If set, print the time spent in the phases of the conversion '
+                   '(read, parse, validate, render, write).')
+@click.option('--cprofile',
+              type=click.Path(dir_okay=False, writable=True),
+              default=None,
+              help='Write the cProfile stats of the conversion to this file, e.g., for snakeviz or pstats.')
+def convert(
+    input_path: str,
+    output_path: str,
+    target: tuple,
+    dockerized: bool,
+    container: str,
+    page_parallel: int,
+    dag: bool,
+    shared_workspace: bool,
+    scratch: str,
+    multi_workspace: int,
+    resumable: bool,
+    store_dir: str,
+    existing_groups: str,
+    keep_groups: str,
+    prune_dead_steps: bool,
+    merge_duplicates: bool,
+    fuse: str,
+    cache: bool,
+    deduplicate: bool,
+    resources: bool,
+    resource_profile: str,
+    watch: bool,
+    profile: bool,
+    cprofile: str
+):
+    from .converter import Converter
+    from .resources import ResourceProfile
+    from .utils import watch_file_changes
+    tracer = enable_tracing() if profile else None
+    echo(f"Converting from: {input_path}")
+    echo(f"Converting to: {output_path}")
+    for _, target_path in target:
+        echo(f"Converting to: {target_path}")
+
+    def run_conversion():
+        steps_profile = ResourceProfile.load(resource_profile) if resources or resource_profile else None
+        Converter().convert_OtoN(
+            input_path, output_path, dockerized, page_parallel, dag, use_cache=cache, deduplicate=deduplicate,
+            resource_profile=steps_profile, container=container, fuse=fuse, shared_workspace=shared_workspace,
+            scratch=scratch, multi_workspace=multi_workspace, resumable=resumable or bool(store_dir),
+            store_dir=store_dir, existing_file_grps=split_file_grps(existing_groups),
+            keep_file_grps=split_file_grps(keep_groups), prune_dead_steps=prune_dead_steps,
+            merge_duplicates=merge_duplicates, targets=list(target))
+        echo("Conversion was successful!")
+
+    with profile_calls(cprofile):
+        if not watch:
+            run_conversion()
+        else:
+            try:
+                for _ in watch_file_changes(input_path):
+                    try:
+                        run_conversion()
+                    except Exception as error:
+                        print(f"Conversion failed: {error}")
+            except KeyboardInterrupt:
+                pass
+    if tracer:
+        echo_trace_summary(tracer)
+
+
+@cli.command("convert-batch", help="Convert many OCR-D workflows to Nextflow workflow scripts in parallel.")
+@click.option('-I', '--input_source',
+              required=True,
+              help='Directory of OCR-D workflow files (*.txt), glob pattern or manifest file listing workflow paths.')
+@click.option('-O', '--output_dir',
+              type=click.Path(file_okay=False, writable=True),
+              required=True,
+              help='Directory in which the Nextflow workflow scripts are generated.')
+@click.option('-D', '--dockerized',
+              is_flag=True,
+              help='If set, then the dockerized variant of the Nextflow scripts is generated.')
+@click.option('-j', '--workers',
+              type=click.IntRange(min=1),
+              default=None,
+              help='Number of worker processes. Defaults to the number of CPU cores.')
+@existing_groups_option
+@keep_groups_option
+@click.option('--profile',
+              is_flag=True,
+              help='If set, print the time spent in the phases of the conversions, summed over the workers.')
+def convert_batch(input_source: str, output_dir: str, dockerized: bool, workers: int, existing_groups: str,
+                  keep_groups: str, profile: bool):
+    from .converter import Converter
+    from .utils import collect_workflow_files
+    tracer = enable_tracing() if profile else None
+    try:
+        input_paths = collect_workflow_files(input_source)
+    except FileNotFoundError as error:
+        raise click.BadParameter(str(error), param_hint="'-I' / '--input_source'")
+    if not input_paths:
+        raise click.UsageError(f"No workflow files found in: {input_source}")
+    echo(f"Converting {len(input_paths)} workflow(s) to: {output_dir}")
+    report = Converter().convert_batch(
+        input_paths, output_dir, dockerized, workers, split_file_grps(existing_groups), split_file_grps(keep_groups))
+    failed = 0
+    for input_path, output_path, error in report:
+        if error:
+            failed += 1
+            print(f"FAILED: {input_path}: {error}")
+        else:
+            echo(f"OK: {input_path} -> {output_path}")
+    print(f"Converted: {len(report) - failed}, failed: {failed}")
+    if tracer:
+        echo_trace_summary(tracer)
+    if failed:
+        raise SystemExit(1)
 
 
 @cli.command("validate", help="Validate an OCR-D workflow txt file.")
@@ -35,7 +259,201 @@ def convert(input_path: str, output_path: str, dockerized: bool):
               default=DEFAULT_IN_FILE,
               show_default=True,
               help='Path to the OCR-D workflow file to be validated.')
-def validate(input_path: str):
-    OCRDValidator().validate(input_path)
-    print(f"Validating: {input_path}")
-    print("Validation was successful!")
+@existing_groups_option
+@keep_groups_option
+def validate(input_path: str, existing_groups: str, keep_groups: str):
+    from .validators.validator_utils import validate_file_path
+    validate_file_path(input_path)
+    from .dataflow import find_dead_steps
+    from .validators.ocrd_validator import OCRDValidator
+    validator = OCRDValidator(existing_file_grps=split_file_grps(existing_groups))
+    validator.validate(input_path)
+    echo(f"Validating: {input_path}")
+    for index in find_dead_steps(validator.processors, split_file_grps(keep_groups)):
+        processor = validator.processors[index]
+        print(f"Dead step {index}: {processor.executable} -O {processor.output_file_grps}")
+    echo("Validation was successful!")
+
+
+@cli.command("parse", help="Parse and validate an OCR-D workflow into its intermediate representation.")
+@click.option('-I', '--input_path',
+              type=click.Path(dir_okay=False, exists=True, readable=True),
+              default=DEFAULT_IN_FILE,
+              show_default=True,
+              help='Path to the OCR-D workflow file to be parsed.')
+@click.option('-O', '--output_path',
+              type=click.Path(dir_okay=False, writable=True),
+              required=True,
+              help='Path of the intermediate representation to be written.')
+@click.option('--emit-ir',
+              type=click.Choice(['json', 'binary']),
+              default='json',
+              show_default=True,
+              help='Format of the intermediate representation.')
+@existing_groups_option
+@keep_groups_option
+@prune_dead_steps_option
+@merge_duplicates_option
+def parse(input_path: str, output_path: str, emit_ir: str, existing_groups: str, keep_groups: str,
+          prune_dead_steps: bool, merge_duplicates: bool):
+    from .converter import Converter
+    from .ir import WorkflowIR
+    from .validators.ocrd_validator import OCRDValidator
+    validator = OCRDValidator(existing_file_grps=split_file_grps(existing_groups))
+    validator.validate(input_path)
+    if merge_duplicates:
+        Converter.eliminate_duplicate_steps(validator, split_file_grps(keep_groups))
+    Converter.eliminate_dead_steps(validator, split_file_grps(keep_groups), prune_dead_steps)
+    WorkflowIR.from_processors(validator.ocrd_process_command, validator.processors).save(output_path, emit_ir)
+    echo(f"Intermediate representation written to: {output_path}")
+
+
+@cli.command("run", help="Run an OCR-D workflow locally with a concurrent subprocess scheduler, without Nextflow.")
+@click.option('-I', '--input_path',
+              type=click.Path(dir_okay=False, exists=True, readable=True),
+              default=DEFAULT_IN_FILE,
+              show_default=True,
+              help='Path to the OCR-D workflow file to be run, or its intermediate representation.')
+@click.option('-m', '--mets_path',
+              type=click.Path(dir_okay=False, exists=True, readable=True),
+              required=True,
+              help='Path to the METS file of the workspace.')
+@click.option('-j', '--jobs',
+              type=click.IntRange(min=1),
+              default=None,
+              help='Number of processor calls running at the same time. Defaults to the number of CPU cores.')
+@click.option('--page-chunks',
+              type=click.IntRange(min=0),
+              default=0,
+              show_default=True,
+              help='If positive, the pages of the workspace are split into that many chunks processed concurrently.')
+@existing_groups_option
+@keep_groups_option
+@prune_dead_steps_option
+@merge_duplicates_option
+def run(input_path: str, mets_path: str, jobs: int, page_chunks: int, existing_groups: str, keep_groups: str,
+        prune_dead_steps: bool, merge_duplicates: bool):
+    from .converter import Converter
+    from .executor import ExecutionError, LocalExecutor
+    from .ir import WorkflowIR, is_workflow_ir_file
+    from .validators.ocrd_validator import OCRDValidator
+    validator = OCRDValidator(existing_file_grps=split_file_grps(existing_groups))
+    if is_workflow_ir_file(input_path):
+        validator.validate_ir(WorkflowIR.load(input_path))
+    else:
+        validator.validate(input_path)
+    if merge_duplicates:
+        Converter.eliminate_duplicate_steps(validator, split_file_grps(keep_groups))
+    Converter.eliminate_dead_steps(validator, split_file_grps(keep_groups), prune_dead_steps)
+    steps_count = len(validator.processors)
+
+    def echo_result(result):
+        pages = f" pages {result.page_range}" if result.page_range else ""
+        status = "OK" if result.succeeded else f"FAILED ({result.returncode})"
+        echo(f"[{result.index + 1}/{steps_count}] {result.executable}{pages}: {result.duration:.2f}s {status}")
+
+    executor = LocalExecutor(validator.processors, mets_path, jobs, page_chunks, on_result=echo_result)
+    try:
+        results = executor.run()
+    except ExecutionError as error:
+        print(error)
+        raise SystemExit(1)
+    echo(f"Ran {len(results)} processor call(s) in {sum(result.duration for result in results):.2f}s of step time")
+
+
+@cli.command("profile", help="Rank the workflow steps by the measurements of Nextflow trace files.")
+@click.option('-T', '--trace_path',
+              type=click.Path(dir_okay=False, exists=True, readable=True),
+              multiple=True,
+              required=True,
+              help='Nextflow trace file (produced with -with-trace), repeatable to aggregate many runs.')
+@click.option('-I', '--input_path',
+              type=click.Path(dir_okay=False, exists=True, readable=True),
+              default=None,
+              help='The converted OCR-D workflow file, to map the tasks back to its steps. Pass the dataflow options '
+                   '(--keep-groups, --prune-dead-steps, --merge-duplicates) of its conversion as well.')
+@click.option('-n', '--top',
+              type=click.IntRange(min=1),
+              default=None,
+              help='Show only the hottest steps.')
+@click.option('--suggest-profile',
+              type=click.Path(dir_okay=False, writable=True),
+              default=None,
+              help='Write a resource profile suggested from the observed percentiles to this file.')
+@existing_groups_option
+@keep_groups_option
+@prune_dead_steps_option
+@merge_duplicates_option
+def profile(trace_path: tuple, input_path: str, top: int, suggest_profile: str, existing_groups: str,
+            keep_groups: str, prune_dead_steps: bool, merge_duplicates: bool):
+    from json import dump
+    from .profiling import (
+        aggregate_by_executable,
+        aggregate_traces,
+        format_duration,
+        format_memory,
+        suggest_resource_profile
+    )
+    processors = None
+    if input_path:
+        from .converter import Converter
+        from .validators.ocrd_validator import OCRDValidator
+        validator = OCRDValidator(existing_file_grps=split_file_grps(existing_groups))
+        validator.validate(input_path)
+        # The steps as converted, so that their indices match the names of the processes
+        if merge_duplicates:
+            Converter.eliminate_duplicate_steps(validator, split_file_grps(keep_groups))
+        Converter.eliminate_dead_steps(validator, split_file_grps(keep_groups), prune_dead_steps)
+        processors = validator.processors
+    step_statistics = aggregate_traces(trace_path, processors)
+    executable_statistics = aggregate_by_executable(step_statistics)
+
+    columns = "{:<4} {:<40} {:>6} {:>7} {:>10} {:>10} {:>10} {:>8} {:>10}"
+    for title, statistics in (('Steps', step_statistics), ('Executables', executable_statistics)):
+        ranking = sorted(statistics.values(), key=lambda entry: entry.total_realtime, reverse=True)[:top]
+        print(f"{title} by total wall time:")
+        print(columns.format('#', 'name', 'tasks', 'failed', 'total', 'p50', 'p95', 'cpu %', 'peak rss'))
+        for rank, entry in enumerate(ranking, start=1):
+            mean_cpu = entry.mean_cpu_percentage
+            print(columns.format(
+                rank, entry.name, entry.count, entry.failed,
+                format_duration(entry.total_realtime),
+                format_duration(entry.realtime_percentile(50)),
+                format_duration(entry.realtime_percentile(95)),
+                f'{mean_cpu:.1f}' if mean_cpu is not None else '-',
+                format_memory(entry.max_peak_rss)
+            ))
+            for step in ([entry.step] if entry.step else entry.fused_steps):
+                print(f"     {step}")
+        print()
+
+    if suggest_profile:
+        with open(suggest_profile, mode='w', encoding='utf-8') as profile_file:
+            dump(suggest_resource_profile(executable_statistics), profile_file, indent=2)
+        echo(f"Suggested resource profile written to: {suggest_profile}")
+
+
+@cli.command("serve", help="Serve conversions and validations over HTTP with warm caches.")
+@click.option('-H', '--host',
+              default='127.0.0.1',
+              show_default=True,
+              help='Host to listen on.')
+@click.option('-p', '--port',
+              type=click.IntRange(min=0, max=65535),
+              default=8090,
+              show_default=True,
+              help='Port to listen on.')
+@click.option('-S', '--socket_path',
+              type=click.Path(dir_okay=False, writable=True),
+              default=None,
+              help='If set, listen on this Unix socket instead of the host and port.')
+def serve(host: str, port: int, socket_path: str):
+    from .server import create_server
+    server = create_server(host, port, socket_path)
+    print(f"Serving on: {socket_path if socket_path else f'http://{host}:{server.server_address[1]}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,21 +1,37 @@
-from json import load
 from os import environ
-from pkg_resources import resource_filename
+from os.path import dirname, expanduser, join
 
 
 __all__ = [
+    "ASSETS_DIR",
     "DEFAULT_IN_FILE",
     "DEFAULT_OUT_FILE",
-    "OCRD_ALL_JSON",
+    "OCRD_ALL_JSON_FILE",
+    "OTON_CACHE_DIR",
     "OTON_LOG_LEVEL",
     "OTON_LOG_FORMAT",
+    "OTON_TRACE",
+    "OTON_VALIDATION_CACHE",
+    "RESOURCE_PROFILE_FILE",
 ]
 
-DEFAULT_IN_FILE = resource_filename(__name__, 'assets/workflow1.txt')
-DEFAULT_OUT_FILE = resource_filename(__name__, 'assets/nextflow1.nf')
-OCRD_ALL_JSON_FILE = resource_filename(__name__, 'assets/ocrd_all_tool.json')
-with open(OCRD_ALL_JSON_FILE) as f:
-    OCRD_ALL_JSON = load(f)
+# The assets are shipped inside the package directory (see package_data in setup.py),
+# resolving them relative to this module avoids the slow import of pkg_resources
+ASSETS_DIR = join(dirname(__file__), 'assets')
+DEFAULT_IN_FILE = join(ASSETS_DIR, 'workflow1.txt')
+DEFAULT_OUT_FILE = join(ASSETS_DIR, 'nextflow1.nf')
+OCRD_ALL_JSON_FILE = join(ASSETS_DIR, 'ocrd_all_tool.json')
+RESOURCE_PROFILE_FILE = join(ASSETS_DIR, 'resource_profile.json')
+
+# Directory for the generated caches and indices, e.g., the index of the ocrd tool registry
+OTON_CACHE_DIR = environ.get(
+    "OTON_CACHE_DIR",
+    join(environ.get("XDG_CACHE_HOME", expanduser(join("~", ".cache"))), "oton")
+)
+# If enabled, the reports of the processor parameter validation are stored in OTON_CACHE_DIR
+OTON_VALIDATION_CACHE = environ.get("OTON_VALIDATION_CACHE", "false").lower() in ("1", "true", "yes")
 
 OTON_LOG_LEVEL = environ.get("OTON_LOG_LEVEL", "INFO")
 OTON_LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s:%(funcName)s: %(lineno)s: %(message)s'
+# If set, the timing spans and counters of the conversion phases are written as JSON to this path on exit
+OTON_TRACE = environ.get("OTON_TRACE", None)
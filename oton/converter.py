@@ -1,5 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count, makedirs
+from os.path import basename, dirname, join, splitext
+from typing import Dict, List, Optional, Tuple
+
+from .cache import ConversionCache
+from .dataflow import build_dependency_graph, find_dead_steps, is_linear_chain, merge_duplicate_steps
+from .fusion import plan_fusion
+from .instrumentation import count, get_logger, get_tracer, isolated_trace, span
+from .ir import WorkflowIR, is_workflow_ir_file
 from .models import NextflowFileExecutable
+from .models.constants import CONTAINER_ENGINES, TARGET_FLAVOURS
+from .registry import OCRD_ALL_JSON
+from .resources import ResourceProfile
+from .utils import read_from_file
 from .validators.ocrd_validator import OCRDValidator
+from .validators.validator_utils import validate_file_path
+
+logger = get_logger(__name__)
+
+# Below this number of steps, the targets of a conversion are rendered one after another,
+# since starting the worker processes takes longer than rendering the scripts
+PARALLEL_RENDER_MIN_STEPS = 500
+
+
+def _convert_batch_entry(
+    arguments: Tuple[str, str, bool, Optional[List[str]], Optional[List[str]], bool]
+) -> Tuple[str, str, Optional[str], Optional[dict]]:
+    # Module level, so that it can be pickled and dispatched to the worker processes
+    input_path, output_path, dockerized, existing_file_grps, keep_file_grps, trace = arguments
+    with isolated_trace() if trace else nullcontext() as tracer:
+        try:
+            Converter.convert_OtoN(
+                input_path, output_path, dockerized, existing_file_grps=existing_file_grps,
+                keep_file_grps=keep_file_grps)
+            error = None
+        except Exception as exception:
+            error = f"{type(exception).__name__}: {exception}"
+    # The trace of the worker is returned to be merged into the trace of the parent process
+    return input_path, output_path, error, tracer.to_dict() if tracer else None
+
+
+def _render_target_entry(arguments: Tuple[OCRDValidator, str, dict, bool]) -> Tuple[List[str], Optional[dict]]:
+    # Module level, so that it can be pickled and dispatched to the worker processes
+    validator, output_path, render_options, trace = arguments
+    with isolated_trace() if trace else nullcontext() as tracer:
+        written_paths = Converter.render_target(validator, output_path, **render_options)
+    return written_paths, tracer.to_dict() if tracer else None
 
 
 class Converter:
@@ -7,16 +55,426 @@ class Converter:
         pass
 
     @staticmethod
-    def convert_OtoN(input_path: str, output_path: str, dockerized: bool = False):
-        validator = OCRDValidator()
-        validator.validate(input_path)
+    def convert_OtoN(
+        input_path: str,
+        output_path: str,
+        dockerized: bool = False,
+        page_parallel: int = 0,
+        dag: bool = False,
+        use_cache: bool = False,
+        deduplicate: bool = False,
+        resource_profile: Optional[ResourceProfile] = None,
+        container: Optional[str] = None,
+        fuse: Optional[str] = None,
+        shared_workspace: bool = False,
+        scratch: Optional[str] = None,
+        multi_workspace: int = 0,
+        resumable: bool = False,
+        store_dir: Optional[str] = None,
+        existing_file_grps: Optional[List[str]] = None,
+        keep_file_grps: Optional[List[str]] = None,
+        prune_dead_steps: bool = False,
+        merge_duplicates: bool = False,
+        targets: Optional[List[Tuple[str, str]]] = None,
+        workers: Optional[int] = None
+    ):
+        """Convert an OCR-D workflow file, or its intermediate representation, to a Nextflow workflow script.
+
+        If `page_parallel` is positive, the pages of the workspace are split into that many chunks
+        which are processed concurrently, each with its own copy of the METS file that is merged
+        back into the original METS file at the end.
+
+        If `dag` is set, the steps are ordered by the dependencies between their file groups instead
+        of their position, so that independent steps run concurrently. Each step then works on its
+        own copy of the METS file. Workflows whose steps depend on each other linearly are converted
+        as without `dag`.
+
+        If `use_cache` is set, the produced script is stored in the conversion cache and a repeated
+        conversion of the same workflow with the same options is served from there, without parsing
+        and validating the workflow again.
+
+        If `deduplicate` is set, one process is defined per distinct template in the module file
+        `<output name>_modules.nf` next to the script, and the steps include it under their own names.
+
+        If `resource_profile` is set, each step requests the cpus, memory and time of its executable
+        and its thread limits are bound to the requested cpus.
+
+        If `container` names a container engine (docker, singularity or apptainer), the steps run in the
+        container of Nextflow's `container` directive instead of a `docker run` per step. The config
+        enabling the engine is written to `<output name>.config` next to the script.
+
+        If `fuse` is set, consecutive steps selected by the fusion policy run back to back in a single
+        task, see `plan_fusion` for the policies.
+
+        If `shared_workspace` is set, the METS path is passed between the steps as value, instead of staging
+        the METS file into each task directory. The workspace must be on a filesystem shared by the nodes.
+        If `scratch` is set (`true` or a path), the steps run on a copy of the workspace in their node-local
+        task directory and copy the new files back at once. Requires the shared workspace, page parallel or
+        DAG mode, which pass the METS path as value.
+
+        If `multi_workspace` is positive, the script processes the workspaces given by `params.workspaces`
+        (a glob of METS files, a directory of workspaces or a file listing METS paths) in a single run,
+        up to that many concurrently per step, and writes the status of each workspace to
+        `params.workspaces_summary`. The METS paths are passed as in the shared workspace mode.
+
+        If `resumable` is set, the inputs of the steps are stable across runs, so that `nextflow run -resume`
+        skips the completed steps after a failure, a changed step or an appended step. The METS paths are
+        passed as in the shared workspace mode and the steps overwrite the output of a previous run.
+        If `store_dir` is set as well, the completed steps are recorded per output file group in that
+        directory (`params.store_dir`) and skipped even without `-resume`.
+
+        The steps may read the file groups produced by previous steps, the input file groups of the first step
+        and the `existing_file_grps` present in the workspace already. Steps whose output file groups are neither
+        read by a later step nor among the `keep_file_grps` are reported as dead, and removed if `prune_dead_steps`
+        is set, see `find_dead_steps`. Without `keep_file_grps` no step is dead. If `merge_duplicates` is set,
+        steps repeating a previous step on the same input are removed and the later steps read the output of the
+        previous step instead, see `merge_duplicate_steps`.
+
+        `targets` are further `(flavour, output path)` pairs, see `TARGET_FLAVOURS`, rendered from the same parsed
+        and validated workflow with the same options, e.g., `[('dockerized', 'nextflow_dockerized.nf')]`. The
+        output at `output_path` is rendered in the flavour of `dockerized` and `container`. The targets of large
+        workflows are rendered concurrently by up to `workers` processes.
+        """
+        render_targets = [(output_path, dockerized, container)]
+        for flavour, target_path in targets or []:
+            if flavour not in TARGET_FLAVOURS:
+                raise ValueError(f"Unknown target flavour '{flavour}', expected one of: {list(TARGET_FLAVOURS)}")
+            render_targets.append((target_path, *TARGET_FLAVOURS[flavour]))
+        output_paths = []
+        renders = []
+        for target_path, target_dockerized, target_container in render_targets:
+            Converter.check_options(
+                target_dockerized, page_parallel, dag, target_container, fuse, shared_workspace, scratch,
+                multi_workspace, resumable, store_dir)
+            output_name = splitext(basename(target_path))[0]
+            module_file_name = f"{output_name}_modules.nf" if deduplicate else None
+            config_file_name = f"{output_name}.config" if target_container else None
+            if target_path in output_paths:
+                raise ValueError(f"Multiple targets would be written to: {target_path}")
+            output_paths.append(target_path)
+            for file_name in (module_file_name, config_file_name):
+                if file_name:
+                    output_paths.append(join(dirname(target_path), file_name))
+            renders.append((target_path, {
+                'dockerized': target_dockerized,
+                'page_parallel': page_parallel,
+                'dag': dag,
+                'module_file_name': module_file_name,
+                'config_file_name': config_file_name,
+                'resource_profile': resource_profile,
+                'container': target_container,
+                'fuse': fuse,
+                'shared_workspace': shared_workspace,
+                'scratch': scratch,
+                'multi_workspace': multi_workspace,
+                'resumable': resumable,
+                'store_dir': store_dir
+            }))
+
+        validate_file_path(input_path)
+        # The input is either an OCR-D workflow file or its intermediate representation, see `WorkflowIR`
+        with span('read'):
+            workflow_ir = WorkflowIR.load(input_path) if is_workflow_ir_file(input_path) else None
+
+        conversion_cache, cache_key = None, None
+        if use_cache:
+            with span('read'):
+                if workflow_ir:
+                    ocrd_process_command, *processor_tasks = workflow_ir.to_lines()
+                else:
+                    ocrd_process_command, processor_tasks = read_from_file(input_path)
+            options = {
+                'dockerized': dockerized,
+                'page_parallel': page_parallel,
+                'dag': dag,
+                'module_file_name': renders[0][1]['module_file_name'],
+                'resources': resource_profile.entries if resource_profile else None,
+                'container': container,
+                'fuse': fuse,
+                'shared_workspace': shared_workspace,
+                'scratch': scratch,
+                'multi_workspace': multi_workspace,
+                'resumable': resumable,
+                'store_dir': store_dir,
+                'existing_file_grps': existing_file_grps,
+                'keep_file_grps': keep_file_grps,
+                'prune_dead_steps': prune_dead_steps,
+                'merge_duplicates': merge_duplicates,
+                'targets': [(basename(target_path), render_options['dockerized'], render_options['container'])
+                            for target_path, render_options in renders[1:]]
+            }
+            conversion_cache = ConversionCache()
+            cache_key = conversion_cache.build_key(
+                [ocrd_process_command] + processor_tasks, OCRD_ALL_JSON.version, options)
+            with span('cache'):
+                cache_hit = conversion_cache.load(cache_key, output_paths)
+            count('conversion_cache_hits' if cache_hit else 'conversion_cache_misses')
+            if cache_hit:
+                return
+
+        validator = OCRDValidator(existing_file_grps=existing_file_grps)
+        if workflow_ir:
+            validator.validate_ir(workflow_ir)
+        else:
+            validator.validate(input_path)
+        if merge_duplicates:
+            Converter.eliminate_duplicate_steps(validator, keep_file_grps)
+        Converter.eliminate_dead_steps(validator, keep_file_grps, prune_dead_steps)
+        Converter.render_targets(validator, renders, workers)
+        count('workflows')
+        if conversion_cache:
+            conversion_cache.store(cache_key, output_paths)
+
+    @staticmethod
+    def render_target(
+        validator: OCRDValidator,
+        output_path: str,
+        module_file_name: Optional[str] = None,
+        config_file_name: Optional[str] = None,
+        **build_options
+    ) -> List[str]:
+        """Render the validated workflow to the Nextflow script at `output_path`, see `build_nextflow_executable`
+        for the options. Returns the paths of the written files.
+        """
+        with span('render'):
+            nf_file_executable = Converter.build_nextflow_executable(
+                validator, module_file_name=module_file_name, **build_options)
+            if config_file_name:
+                nf_file_executable.build_container_config(build_options['container'], config_file_name)
+        # The script is formatted while it is streamed to the file
+        with span('write'):
+            written_paths = nf_file_executable.produce_nextflow_file(output_path)
+        count('files_written', len(written_paths))
+        return written_paths
+
+    @staticmethod
+    def render_targets(
+        validator: OCRDValidator,
+        renders: List[Tuple[str, dict]],
+        workers: Optional[int] = None
+    ) -> List[str]:
+        """Render the validated workflow to each `(output path, options)` target, see `render_target`.
+
+        Rendering does not modify the validated steps, so that the targets share them. The targets of
+        workflows with many steps are rendered concurrently by up to `workers` processes.
+        """
+        workers = min(len(renders), workers or cpu_count() or 1)
+        if workers == 1 or len(validator.processors) < PARALLEL_RENDER_MIN_STEPS:
+            return [path for output_path, render_options in renders
+                    for path in Converter.render_target(validator, output_path, **render_options)]
+
+        tasks = [(validator, output_path, render_options, get_tracer() is not None)
+                 for output_path, render_options in renders]
+        # The forked workers inherit the tool descriptions already looked up by the parent
+        mp_context = get_context('fork') if 'fork' in get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+            entries = list(executor.map(_render_target_entry, tasks))
+        written_paths = []
+        for target_paths, trace in entries:
+            if trace:
+                get_tracer().merge(trace)
+            written_paths.extend(target_paths)
+        return written_paths
+
+    @staticmethod
+    def convert_string(
+        workflow: str,
+        dockerized: bool = False,
+        page_parallel: int = 0,
+        dag: bool = False,
+        resource_profile: Optional[ResourceProfile] = None,
+        container: Optional[str] = None,
+        fuse: Optional[str] = None,
+        shared_workspace: bool = False,
+        scratch: Optional[str] = None,
+        multi_workspace: int = 0,
+        resumable: bool = False,
+        store_dir: Optional[str] = None,
+        existing_file_grps: Optional[List[str]] = None,
+        keep_file_grps: Optional[List[str]] = None,
+        prune_dead_steps: bool = False,
+        merge_duplicates: bool = False
+    ) -> str:
+        """Convert the content of an OCR-D workflow file to the content of a Nextflow workflow script.
+
+        The options are the same as of `convert_OtoN`. With `container`, the script is meant to be run
+        with the container engine enabled, e.g., with `nextflow run -with-docker`.
+        """
+        Converter.check_options(
+            dockerized, page_parallel, dag, container, fuse, shared_workspace, scratch, multi_workspace, resumable,
+            store_dir)
+        validator = OCRDValidator(existing_file_grps=existing_file_grps)
+        validator.validate_string(workflow)
+        if merge_duplicates:
+            Converter.eliminate_duplicate_steps(validator, keep_file_grps)
+        Converter.eliminate_dead_steps(validator, keep_file_grps, prune_dead_steps)
+        with span('render'):
+            nf_file_executable = Converter.build_nextflow_executable(
+                validator, dockerized, page_parallel, dag, resource_profile=resource_profile, container=container,
+                fuse=fuse, shared_workspace=shared_workspace, scratch=scratch, multi_workspace=multi_workspace,
+                resumable=resumable, store_dir=store_dir)
+            representation = nf_file_executable.file_representation()
+        count('workflows')
+        return representation
+
+    @staticmethod
+    def check_options(
+        dockerized: bool = False,
+        page_parallel: int = 0,
+        dag: bool = False,
+        container: Optional[str] = None,
+        fuse: Optional[str] = None,
+        shared_workspace: bool = False,
+        scratch: Optional[str] = None,
+        multi_workspace: int = 0,
+        resumable: bool = False,
+        store_dir: Optional[str] = None
+    ):
+        if page_parallel and dag:
+            raise ValueError("The page parallel mode cannot be combined with the DAG mode")
+        if fuse and dag:
+            raise ValueError("The step fusion cannot be combined with the DAG mode")
+        if container and dockerized:
+            raise ValueError("The native container mode cannot be combined with the dockerized variant")
+        if container and container not in CONTAINER_ENGINES:
+            raise ValueError(f"Unknown container engine '{container}', expected one of: {list(CONTAINER_ENGINES)}")
+        if scratch and dockerized:
+            raise ValueError("The scratch mode cannot be combined with the dockerized variant")
+        if scratch and not (shared_workspace or page_parallel or dag or multi_workspace or resumable):
+            raise ValueError("The scratch mode requires the shared workspace, resumable, page parallel or DAG mode")
+        if resumable and (page_parallel or dag or multi_workspace):
+            raise ValueError(
+                "The resumable mode cannot be combined with the page parallel, DAG or multi workspace mode")
+        if store_dir and not resumable:
+            raise ValueError("The store directory requires the resumable mode")
+        if multi_workspace and (page_parallel or dag):
+            raise ValueError("The multi workspace mode cannot be combined with the page parallel or DAG mode")
+        if multi_workspace and dockerized:
+            raise ValueError("The multi workspace mode cannot be combined with the dockerized variant, "
+                             "which mounts a single workspace. Use the native container mode instead")
+
+    @staticmethod
+    def eliminate_duplicate_steps(
+        validator: OCRDValidator,
+        keep_file_grps: Optional[List[str]] = None
+    ) -> Dict[int, int]:
+        """Remove the steps of the validated workflow repeating a previous step on the same input"""
+        processors = validator.processors
+        validator.processors, duplicates = merge_duplicate_steps(processors, keep_file_grps)
+        count('merged_steps', len(duplicates))
+        for index, original in duplicates.items():
+            logger.info("Step %d (%s) repeats step %d, its output file groups %s are read from %s instead",
+                        index, processors[index].executable, original, processors[index].output_file_grps,
+                        processors[original].output_file_grps)
+        return duplicates
+
+    @staticmethod
+    def eliminate_dead_steps(
+        validator: OCRDValidator,
+        keep_file_grps: Optional[List[str]] = None,
+        prune: bool = False
+    ) -> List[int]:
+        """Report the dead steps of the validated workflow and remove them from it if `prune` is set"""
+        if keep_file_grps:
+            produced_file_grps = {file_grp for processor in validator.processors if processor.output_file_grps
+                                  for file_grp in processor.output_file_grps.split(',')}
+            unknown_file_grps = [file_grp for file_grp in keep_file_grps if file_grp not in produced_file_grps]
+            if unknown_file_grps:
+                raise ValueError(f"Kept file groups not produced by any step: {','.join(unknown_file_grps)}")
+        dead_steps = find_dead_steps(validator.processors, keep_file_grps)
+        count('dead_steps', len(dead_steps))
+        for index in dead_steps:
+            processor = validator.processors[index]
+            logger.warning("Step %d (%s) is dead, its output file groups %s are neither read by a later step "
+                           "nor kept", index, processor.executable, processor.output_file_grps)
+        if prune and dead_steps:
+            dead = set(dead_steps)
+            validator.processors = [processor for index, processor in enumerate(validator.processors)
+                                    if index not in dead]
+            logger.info("Removed %d dead step(s)", len(dead_steps))
+        return dead_steps
+
+    @staticmethod
+    def build_nextflow_executable(
+        validator: OCRDValidator,
+        dockerized: bool = False,
+        page_parallel: int = 0,
+        dag: bool = False,
+        module_file_name: Optional[str] = None,
+        resource_profile: Optional[ResourceProfile] = None,
+        container: Optional[str] = None,
+        fuse: Optional[str] = None,
+        shared_workspace: bool = False,
+        scratch: Optional[str] = None,
+        multi_workspace: int = 0,
+        resumable: bool = False,
+        store_dir: Optional[str] = None
+    ) -> NextflowFileExecutable:
+        dependency_graph = None
+        if dag:
+            dependency_graph = build_dependency_graph(validator.processors)
+            if is_linear_chain(dependency_graph):
+                dependency_graph = None
+        fusion_groups = plan_fusion(validator.processors, fuse, resource_profile) if fuse else None
 
         nf_file_executable = NextflowFileExecutable()
-        nf_file_executable.build_parameters(dockerized)
+        nf_file_executable.build_parameters(dockerized, page_parallel, container, multi_workspace, store_dir)
         # TODO: first_file_grps replacement is a wacky hack
         #  to replace the default value of the pre-built REPR_INPUT_FILE_GRP
-        nf_processes, first_file_grps = nf_file_executable.build_nextflow_processes(validator.processors, dockerized)
+        nf_processes, first_file_grps = nf_file_executable.build_nextflow_processes(
+            validator.processors, dockerized, page_parallel, dag=dependency_graph is not None,
+            resource_profile=resource_profile, container=container, fusion_groups=fusion_groups,
+            shared_workspace=shared_workspace, scratch=scratch, multi_workspace=multi_workspace,
+            resumable=resumable, store_dir=store_dir)
         # TODO: This index is currently 3, but may change!
         nf_file_executable.nf_lines_parameters[3] = nf_file_executable.nf_lines_parameters[3].replace("null", f"{first_file_grps}")
-        nf_file_executable.build_main_workflow(nf_processes)
-        nf_file_executable.produce_nextflow_file(output_path)
+        if module_file_name:
+            nf_file_executable.deduplicate_processes(module_file_name)
+        if page_parallel:
+            nf_file_executable.build_page_chunk_processes(dockerized, container)
+        if dependency_graph is not None:
+            nf_file_executable.build_join_process(nf_processes, dockerized, container)
+        nf_file_executable.build_main_workflow(nf_processes, page_parallel, dependency_graph, multi_workspace)
+        return nf_file_executable
+
+    @staticmethod
+    def convert_batch(
+        input_paths: List[str],
+        output_dir: str,
+        dockerized: bool = False,
+        workers: Optional[int] = None,
+        existing_file_grps: Optional[List[str]] = None,
+        keep_file_grps: Optional[List[str]] = None
+    ) -> List[Tuple[str, str, Optional[str]]]:
+        """Convert many OCR-D workflow files in parallel.
+
+        Each input is written to `output_dir` as `<name>.nf`. A failing workflow does not abort
+        the batch, instead the returned report holds an `(input, output, error)` entry per file,
+        where `error` is None for successful conversions. The `existing_file_grps` and `keep_file_grps`
+        apply to all workflows, see `convert_OtoN`.
+        """
+        makedirs(output_dir, exist_ok=True)
+        tasks = []
+        output_paths = set()
+        for input_path in input_paths:
+            output_path = join(output_dir, f"{splitext(basename(input_path))[0]}.nf")
+            if output_path in output_paths:
+                raise ValueError(f"Multiple input workflows would be converted to: {output_path}")
+            output_paths.add(output_path)
+            tasks.append((input_path, output_path, dockerized, existing_file_grps, keep_file_grps,
+                          get_tracer() is not None))
+
+        if workers == 1:
+            entries = [_convert_batch_entry(task) for task in tasks]
+        else:
+            # Tool descriptions already looked up by the parent are inherited by the forked workers,
+            # the remaining ones are read from the shared on-disk index of the tool registry
+            mp_context = get_context('fork') if 'fork' in get_all_start_methods() else None
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+                entries = list(executor.map(_convert_batch_entry, tasks))
+        report = []
+        for input_path, output_path, error, trace in entries:
+            if trace:
+                get_tracer().merge(trace)
+            report.append((input_path, output_path, error))
+        return report
@@ -0,0 +1,192 @@
+from copy import copy
+from json import dumps
+from typing import Dict, List, Optional, Set, Tuple
+
+from .validators.ocrd_validator import ProcessorCallArguments
+
+__all__ = [
+    "build_dependency_graph",
+    "find_dead_steps",
+    "find_sink_steps",
+    "is_linear_chain",
+    "merge_duplicate_steps"
+]
+
+
+def build_dependency_graph(processors: List[ProcessorCallArguments]) -> List[List[int]]:
+    """Build the dependencies between the workflow steps from their file groups.
+
+    A step depends on the last previous step producing one of its input file groups,
+    on the last previous step producing one of its output file groups and on all
+    previous steps reading one of its output file groups, since these would read
+    overwritten data otherwise. File groups not produced by any step are expected
+    to be present in the workspace already.
+
+    The returned list holds the sorted indices of the direct dependencies of each step,
+    i.e., transitive dependencies are removed.
+    """
+    last_producer: Dict[str, int] = {}
+    readers_since_production: Dict[str, List[int]] = {}
+    dependencies: List[Set[int]] = []
+    for index, processor in enumerate(processors):
+        input_file_grps = processor.input_file_grps.split(',')
+        output_file_grps = processor.output_file_grps.split(',') if processor.output_file_grps else []
+        step_dependencies = set()
+        for file_grp in input_file_grps:
+            if file_grp in last_producer:
+                step_dependencies.add(last_producer[file_grp])
+        for file_grp in output_file_grps:
+            if file_grp in last_producer:
+                step_dependencies.add(last_producer[file_grp])
+            step_dependencies.update(readers_since_production.get(file_grp, []))
+        dependencies.append(step_dependencies)
+
+        for file_grp in input_file_grps:
+            readers_since_production.setdefault(file_grp, []).append(index)
+        for file_grp in output_file_grps:
+            last_producer[file_grp] = index
+            readers_since_production[file_grp] = []
+
+    # Transitive reduction - the dependencies always point to previous steps
+    ancestors: List[Set[int]] = []
+    reduced: List[List[int]] = []
+    for step_dependencies in dependencies:
+        step_ancestors = set(step_dependencies)
+        for dependency in step_dependencies:
+            step_ancestors.update(ancestors[dependency])
+        ancestors.append(step_ancestors)
+        indirect = set()
+        for dependency in step_dependencies:
+            indirect.update(ancestors[dependency])
+        reduced.append(sorted(step_dependencies - indirect))
+    return reduced
+
+
+def build_final_file_grps(
+    processors: List[ProcessorCallArguments],
+    keep_file_grps: Optional[List[str]] = None
+) -> Set[str]:
+    # The file groups kept as final output, by default the output file groups of the steps no other step depends on
+    if keep_file_grps:
+        return set(keep_file_grps)
+    final_file_grps = set()
+    for index in find_sink_steps(build_dependency_graph(processors)):
+        if processors[index].output_file_grps:
+            final_file_grps.update(processors[index].output_file_grps.split(','))
+    return final_file_grps
+
+
+def find_dead_steps(
+    processors: List[ProcessorCallArguments],
+    keep_file_grps: Optional[List[str]] = None
+) -> List[int]:
+    """Find the steps whose output file groups are neither read by a later step nor kept as final output.
+
+    Without `keep_file_grps` no step is dead, since the final output is not known, e.g., the outputs of
+    the parallel branches of a DAG workflow. The steps are walked backwards, so that steps feeding only
+    dead steps are dead as well, and a file group overwritten by a later step is needed only by the
+    steps reading it in between. Steps without output file groups are never dead. The returned list
+    holds the sorted indices of the dead steps.
+    """
+    if not keep_file_grps:
+        return []
+    needed = set(keep_file_grps)
+    dead_steps = []
+    for index in range(len(processors) - 1, -1, -1):
+        processor = processors[index]
+        output_file_grps = set(processor.output_file_grps.split(',')) if processor.output_file_grps else set()
+        if output_file_grps and not output_file_grps & needed:
+            dead_steps.append(index)
+            continue
+        needed -= output_file_grps
+        needed.update(processor.input_file_grps.split(','))
+    return dead_steps[::-1]
+
+
+def find_sink_steps(dependency_graph: List[List[int]]) -> List[int]:
+    """Find the steps no other step depends on"""
+    consumed = {dependency for step_dependencies in dependency_graph for dependency in step_dependencies}
+    return [index for index in range(len(dependency_graph)) if index not in consumed]
+
+
+def is_linear_chain(dependency_graph: List[List[int]]) -> bool:
+    """Check whether each step depends exactly on its predecessor"""
+    return all(step_dependencies == ([index - 1] if index else [])
+               for index, step_dependencies in enumerate(dependency_graph))
+
+
+def is_mergeable(
+    processors: List[ProcessorCallArguments],
+    original: int,
+    duplicate: int,
+    final_file_grps: Set[str],
+    writers: Dict[str, List[int]]
+) -> bool:
+    # The output of the original step must stay available to the readers of the output of the duplicate
+    if not processors[duplicate].output_file_grps:
+        return False
+    output_file_grps = processors[duplicate].output_file_grps.split(',')
+    original_file_grps = processors[original].output_file_grps.split(',')
+    if len(output_file_grps) != len(original_file_grps) or final_file_grps.intersection(output_file_grps):
+        return False
+    return all(writer <= original or writer == duplicate
+               for file_grp in original_file_grps for writer in writers[file_grp])
+
+
+def merge_duplicate_steps(
+    processors: List[ProcessorCallArguments],
+    keep_file_grps: Optional[List[str]] = None
+) -> Tuple[List[ProcessorCallArguments], Dict[int, int]]:
+    """Remove the steps repeating a previous step and read the output of the previous step instead.
+
+    A step is a duplicate if it calls the same executable with the same parameters on the same data
+    of the same input file groups as a previous step, i.e., no step overwrote the input file groups
+    in between. The duplicate is removed and the later steps read the output file groups of the
+    previous step in place of its output file groups (aliasing). Duplicates are kept if their output
+    file groups are kept as final output, by default the output of the steps no other step depends on,
+    or if the output file groups of the previous step are overwritten later on.
+
+    Returns the remaining steps, with the input file groups of the later steps rewritten, and the
+    indices of the removed steps mapped to the indices of the steps they repeat.
+    """
+    final_file_grps = build_final_file_grps(processors, keep_file_grps)
+    writers: Dict[str, List[int]] = {}
+    for index, processor in enumerate(processors):
+        for file_grp in processor.output_file_grps.split(',') if processor.output_file_grps else []:
+            writers.setdefault(file_grp, []).append(index)
+
+    # The step which produced the current data of each file group, -1 if present in the workspace
+    last_producer: Dict[str, int] = {}
+    aliases: Dict[str, str] = {}
+    first_calls: Dict[tuple, int] = {}
+    duplicates: Dict[int, int] = {}
+    merged: List[ProcessorCallArguments] = []
+    for index, processor in enumerate(processors):
+        input_file_grps = [aliases.get(file_grp, file_grp) for file_grp in processor.input_file_grps.split(',')]
+        output_file_grps = processor.output_file_grps.split(',') if processor.output_file_grps else []
+        key = (
+            processor.executable,
+            dumps(processor.parameters or {}, sort_keys=True),
+            tuple((file_grp, last_producer.get(file_grp, -1)) for file_grp in input_file_grps)
+        )
+        original = first_calls.get(key, None)
+        if original is not None and is_mergeable(processors, original, index, final_file_grps, writers):
+            duplicates[index] = original
+            original_file_grps = processors[original].output_file_grps.split(',')
+            for file_grp, original_file_grp in zip(output_file_grps, original_file_grps):
+                if file_grp != original_file_grp:
+                    aliases[file_grp] = original_file_grp
+            continue
+
+        if output_file_grps:
+            first_calls.setdefault(key, index)
+        for file_grp in output_file_grps:
+            last_producer[file_grp] = index
+            # The later steps read the new data of the file group, not the output of an aliased step
+            aliases.pop(file_grp, None)
+        step = processor
+        if ','.join(input_file_grps) != processor.input_file_grps:
+            step = copy(processor)
+            step.input_file_grps = ','.join(input_file_grps)
+        merged.append(step)
+    return merged, duplicates
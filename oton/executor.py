@@ -0,0 +1,197 @@
+import asyncio
+from asyncio.subprocess import DEVNULL, PIPE, STDOUT
+from json import dumps
+from math import ceil
+from os import cpu_count, remove
+from os.path import abspath
+from shutil import copyfile
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple
+
+from .instrumentation import count, get_logger, span
+from .validators.ocrd_validator import ProcessorCallArguments
+
+__all__ = [
+    "ExecutionError",
+    "LocalExecutor",
+    "StepResult",
+    "build_processor_command",
+    "split_page_ranges"
+]
+
+logger = get_logger(__name__)
+
+# The last lines of the output of a failed command kept for the error message
+OUTPUT_TAIL_LINES = 20
+
+
+class StepResult:
+    """The outcome of a workflow step run on the workspace or on a chunk of its pages"""
+
+    def __init__(
+        self,
+        index: int,
+        executable: str,
+        page_range: Optional[str],
+        returncode: int,
+        duration: float,
+        output: str = ''
+    ):
+        self.index = index
+        self.executable = executable
+        # The comma separated page ids of the chunk, None for the whole workspace
+        self.page_range = page_range
+        self.returncode = returncode
+        # The wall time in seconds
+        self.duration = duration
+        self.output = output
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0
+
+
+class ExecutionError(Exception):
+    def __init__(self, result: StepResult):
+        self.result = result
+        pages = f" on pages {result.page_range}" if result.page_range else ""
+        super().__init__(
+            f"Step {result.index} ({result.executable}){pages} failed with exit code {result.returncode}:\n"
+            f"{result.output}")
+
+
+def build_processor_command(
+    processor: ProcessorCallArguments,
+    mets_path: str,
+    page_range: Optional[str] = None
+) -> List[str]:
+    """The arguments of the processor call, the same call as rendered into the Nextflow processes"""
+    command = [processor.executable, '-m', mets_path, '-I', processor.input_file_grps]
+    if processor.output_file_grps:
+        command.extend(['-O', processor.output_file_grps])
+    if processor.parameters:
+        command.extend(['-p', dumps(processor.parameters)])
+    if page_range:
+        command.extend(['-g', page_range])
+    return command
+
+
+def split_page_ranges(page_ids: List[str], chunks: int) -> List[str]:
+    # At most `chunks` comma separated ranges of equal size, as in the page parallel Nextflow script
+    if not page_ids:
+        return []
+    chunk_size = max(1, ceil(len(page_ids) / chunks))
+    return [','.join(page_ids[start:start + chunk_size]) for start in range(0, len(page_ids), chunk_size)]
+
+
+def build_chunk_mets_path(mets_path: str, chunk_index: int) -> str:
+    # The copies must reside inside the workspace to keep the relative file paths valid
+    stem = mets_path[:-len('.xml')] if mets_path.endswith('.xml') else mets_path
+    return f'{stem}.chunk{chunk_index}.xml'
+
+
+class LocalExecutor:
+    """Run the validated steps of an OCR-D workflow directly as subprocesses, without Nextflow.
+
+    The steps run one after another on the METS file. If `page_chunks` is positive, the pages are
+    split into that many chunks, each chunk runs through all steps on its own copy of the METS file,
+    and the copies are merged back at the end, as in the page parallel Nextflow script. At most
+    `concurrency` processor calls run at the same time. `on_result` is called once per finished call.
+    """
+
+    def __init__(
+        self,
+        processors: List[ProcessorCallArguments],
+        mets_path: str,
+        concurrency: Optional[int] = None,
+        page_chunks: int = 0,
+        on_result: Optional[Callable[[StepResult], None]] = None
+    ):
+        self.processors = processors
+        self.mets_path = abspath(mets_path)
+        self.concurrency = concurrency or cpu_count() or 1
+        self.page_chunks = page_chunks
+        self.on_result = on_result
+        self.results: List[StepResult] = []
+
+    def run(self) -> List[StepResult]:
+        """Run the workflow, raises `ExecutionError` for the first failed step"""
+        with span('execute'):
+            return asyncio.run(self.run_async())
+
+    async def run_async(self) -> List[StepResult]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if not self.page_chunks:
+            await self.__run_chain(semaphore, self.mets_path)
+            return self.results
+
+        # The log messages on stderr are not part of the page ids
+        returncode, output, _ = await self.__run_command(
+            semaphore, ['ocrd', 'workspace', '-m', self.mets_path, 'list-page'], with_stderr=False)
+        if returncode:
+            raise ExecutionError(StepResult(-1, 'ocrd workspace list-page', None, returncode, 0.0, output))
+        page_ranges = split_page_ranges(output.split(), self.page_chunks)
+        chunks = []
+        for chunk_index, page_range in enumerate(page_ranges, start=1):
+            chunk_mets_path = build_chunk_mets_path(self.mets_path, chunk_index)
+            copyfile(self.mets_path, chunk_mets_path)
+            chunks.append((page_range, chunk_mets_path))
+
+        outcomes = await asyncio.gather(
+            *(self.__run_chain(semaphore, chunk_mets_path, page_range) for page_range, chunk_mets_path in chunks),
+            return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                # The METS copies of the chunks are kept for inspection
+                raise outcome
+        await self.__merge_chunks(semaphore, chunks)
+        return self.results
+
+    async def __run_chain(self, semaphore: asyncio.Semaphore, mets_path: str, page_range: Optional[str] = None):
+        for index, processor in enumerate(self.processors):
+            command = build_processor_command(processor, mets_path, page_range)
+            returncode, output, duration = await self.__run_command(semaphore, command)
+            # The output is kept for the error message of failed steps only
+            result = StepResult(
+                index, processor.executable, page_range, returncode, duration, output if returncode else '')
+            self.results.append(result)
+            count('executed_steps')
+            if self.on_result:
+                self.on_result(result)
+            if not result.succeeded:
+                raise ExecutionError(result)
+
+    async def __merge_chunks(self, semaphore: asyncio.Semaphore, chunks: List[Tuple[str, str]]):
+        # One after another, since all merges write the same METS file
+        for page_range, chunk_mets_path in chunks:
+            returncode, output, _ = await self.__run_command(semaphore, [
+                'ocrd', 'workspace', '-m', self.mets_path, 'merge', '--force', '--no-copy-files',
+                '-g', page_range, chunk_mets_path])
+            if returncode:
+                raise ExecutionError(StepResult(-1, 'ocrd workspace merge', page_range, returncode, 0.0, output))
+            remove(chunk_mets_path)
+
+    @staticmethod
+    async def __run_command(
+        semaphore: asyncio.Semaphore,
+        command: List[str],
+        with_stderr: bool = True
+    ) -> Tuple[int, str, float]:
+        # Without stderr, the output holds stdout only, unless the command failed.
+        # The returned wall time excludes the time waiting for a free slot of the semaphore.
+        logger.debug("Running: %s", command)
+        async with semaphore:
+            start = perf_counter()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT if with_stderr else PIPE)
+            except FileNotFoundError:
+                return 127, f"Executable not found: {command[0]}", perf_counter() - start
+            output, errors = await process.communicate()
+            duration = perf_counter() - start
+        if process.returncode:
+            if errors:
+                output = errors
+            output = output.decode('utf-8', errors='replace')
+            return process.returncode, '\n'.join(output.splitlines()[-OUTPUT_TAIL_LINES:]), duration
+        return process.returncode, output.decode('utf-8', errors='replace'), duration
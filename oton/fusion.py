@@ -0,0 +1,90 @@
+import re
+from typing import List, Optional
+
+from .registry import OCRD_ALL_JSON
+from .resources import ResourceProfile
+from .utils import parse_memory
+from .validators.ocrd_validator import ProcessorCallArguments
+
+__all__ = [
+    "FUSION_POLICY_LIGHT",
+    "plan_fusion"
+]
+
+# Fuse the steps estimated as cheap by the resource profile
+FUSION_POLICY_LIGHT = 'light'
+# The most expensive resources of a step which is still considered cheap
+LIGHT_STEP_CPUS = 1
+LIGHT_STEP_MEMORY = '2 GB'
+# Explicit groups of zero based step indices, e.g. "0-3,5-6"
+STEP_RANGES_PATTERN = re.compile(r'\d+-\d+(,\d+-\d+)*')
+
+
+def parse_step_ranges(policy: str, steps_count: int) -> List[List[int]]:
+    groups = []
+    for step_range in policy.split(','):
+        first, last = (int(index) for index in step_range.split('-'))
+        if first >= last or last >= steps_count:
+            raise ValueError(f"Invalid range of steps to fuse '{step_range}' for {steps_count} steps")
+        if groups and first <= groups[-1][-1]:
+            raise ValueError(f"The ranges of steps to fuse must be ascending and disjoint: {policy}")
+        groups.append(list(range(first, last + 1)))
+    return groups
+
+
+def is_light_step(processor: ProcessorCallArguments, resource_profile: ResourceProfile) -> bool:
+    resources = resource_profile.get(processor.executable)
+    return resources.get('cpus', 1) <= LIGHT_STEP_CPUS and \
+        parse_memory(resources.get('memory', LIGHT_STEP_MEMORY)) <= parse_memory(LIGHT_STEP_MEMORY)
+
+
+def is_step_of_classes(processor: ProcessorCallArguments, classes: List[str]) -> bool:
+    # The classes are prefixes of the steps in the ocrd tool JSON, e.g. "preprocessing/optimization"
+    tool_steps = OCRD_ALL_JSON[processor.executable].get('steps', [])
+    return bool(tool_steps) and all(
+        any(tool_step == cls or tool_step.startswith(f'{cls}/') for cls in classes) for tool_step in tool_steps)
+
+
+def plan_fusion(
+    processors: List[ProcessorCallArguments],
+    policy: str,
+    resource_profile: Optional[ResourceProfile] = None
+) -> List[List[int]]:
+    """Group the consecutive steps of a workflow to be fused into a single task.
+
+    The policy is one of:
+    - explicit ranges of zero based step indices, e.g. `0-3,5-6`
+    - `light`, fusing the consecutive steps requesting a single cpu and at most 2 GB memory
+      according to the resource profile (the built-in one, if not given)
+    - comma separated executable classes, fusing the consecutive steps whose tool steps all belong
+      to the classes, e.g. `preprocessing` or `preprocessing/optimization,layout/analysis`
+
+    Returns the groups of step indices in order, covering all steps. Steps not fused form a group on their own.
+    """
+    if STEP_RANGES_PATTERN.fullmatch(policy):
+        fused_groups = parse_step_ranges(policy, len(processors))
+    else:
+        if policy == FUSION_POLICY_LIGHT:
+            resource_profile = resource_profile or ResourceProfile.load()
+            is_fusible = [is_light_step(processor, resource_profile) for processor in processors]
+        else:
+            classes = [cls.strip().strip('/') for cls in policy.split(',') if cls.strip()]
+            is_fusible = [is_step_of_classes(processor, classes) for processor in processors]
+        fused_groups = []
+        current_group = []
+        for index, fusible in enumerate(is_fusible + [False]):
+            if fusible:
+                current_group.append(index)
+                continue
+            if len(current_group) > 1:
+                fused_groups.append(current_group)
+            current_group = []
+
+    groups = []
+    next_index = 0
+    for fused_group in fused_groups:
+        groups.extend([index] for index in range(next_index, fused_group[0]))
+        groups.append(fused_group)
+        next_index = fused_group[-1] + 1
+    groups.extend([index] for index in range(next_index, len(processors)))
+    return groups
@@ -0,0 +1,169 @@
+from atexit import register
+from contextlib import contextmanager, nullcontext
+from cProfile import Profile
+from json import dump
+import logging
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional
+
+from .constants import OTON_LOG_FORMAT, OTON_LOG_LEVEL, OTON_TRACE
+
+__all__ = [
+    "Tracer",
+    "count",
+    "enable_tracing",
+    "get_logger",
+    "get_tracer",
+    "isolated_trace",
+    "is_console_output_enabled",
+    "profile_calls",
+    "set_console_output",
+    "span"
+]
+
+# The loggers of all modules are children of the package logger, which holds the level
+PACKAGE_LOGGER_NAME = 'oton'
+NO_SPAN = nullcontext()
+
+_logging_configured = False
+_console_output = True
+_tracer: Optional['Tracer'] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """The logger of a module, the logging is configured once on first use"""
+    global _logging_configured
+    if not _logging_configured:
+        logging.basicConfig(format=OTON_LOG_FORMAT)
+        logging.getLogger(PACKAGE_LOGGER_NAME).setLevel(logging.getLevelName(OTON_LOG_LEVEL))
+        _logging_configured = True
+    return logging.getLogger(name)
+
+
+def set_console_output(enabled: bool):
+    """Turn the console output of the commands and the log messages below warnings on or off"""
+    global _console_output
+    _console_output = enabled
+    level = logging.getLevelName(OTON_LOG_LEVEL) if enabled else logging.WARNING
+    get_logger(PACKAGE_LOGGER_NAME).setLevel(level)
+
+
+def is_console_output_enabled() -> bool:
+    return _console_output
+
+
+class Tracer:
+    """Aggregated timing spans and counters of the conversion phases, e.g., read, parse, validate, render, write.
+
+    The spans are aggregated per name (count, total and maximum duration), so that the memory stays
+    constant in long batch runs. The trace of a worker process is merged with `merge`.
+    """
+
+    def __init__(self):
+        # The name of a span mapped to its count, total and maximum duration in seconds
+        self.spans: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, perf_counter() - start)
+
+    def add_span(self, name: str, duration: float):
+        entry = self.spans.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] = max(entry[2], duration)
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, trace: dict):
+        for name, other in trace.get('spans', {}).items():
+            entry = self.spans.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += other['count']
+            entry[1] += other['total_ms'] / 1000
+            entry[2] = max(entry[2], other['max_ms'] / 1000)
+        for name, value in trace.get('counters', {}).items():
+            self.count(name, value)
+
+    def to_dict(self) -> dict:
+        return {
+            'spans': {
+                name: {'count': entry[0], 'total_ms': entry[1] * 1000, 'max_ms': entry[2] * 1000}
+                for name, entry in self.spans.items()
+            },
+            'counters': dict(self.counters)
+        }
+
+    def write(self, output_path: str):
+        with open(output_path, mode='w', encoding='utf-8') as output_file:
+            dump(self.to_dict(), output_file, indent=2)
+
+    def summary_lines(self) -> List[str]:
+        columns = "{:<24} {:>8} {:>12} {:>12}"
+        lines = [columns.format('span', 'count', 'total ms', 'max ms')]
+        for name, entry in sorted(self.spans.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(columns.format(name, entry[0], f'{entry[1] * 1000:.2f}', f'{entry[2] * 1000:.2f}'))
+        lines.extend(f'{name:<24} {value:>8}' for name, value in sorted(self.counters.items()))
+        return lines
+
+
+def enable_tracing() -> Tracer:
+    """Record the spans and counters from now on, returns the active tracer"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The active tracer, None if tracing is disabled"""
+    return _tracer
+
+
+@contextmanager
+def isolated_trace() -> Iterator[Tracer]:
+    """Record into a new tracer within the block, e.g., the trace of a task of a worker process"""
+    global _tracer
+    previous_tracer = _tracer
+    _tracer = Tracer()
+    try:
+        yield _tracer
+    finally:
+        _tracer = previous_tracer
+
+
+def span(name: str):
+    """Time the enclosed block, a shared no-op context if tracing is disabled"""
+    if _tracer is None:
+        return NO_SPAN
+    return _tracer.span(name)
+
+
+def count(name: str, value: int = 1):
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+
+@contextmanager
+def profile_calls(output_path: Optional[str]) -> Iterator[None]:
+    """Profile the enclosed block with cProfile and write the stats to the path, if given"""
+    if not output_path:
+        yield
+        return
+    profiler = Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+
+
+if OTON_TRACE:
+    # The trace of the whole process is written on exit, worker processes return theirs to be merged
+    register(enable_tracing().write, OTON_TRACE)
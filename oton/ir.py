@@ -0,0 +1,268 @@
+from json import dumps, loads
+from struct import Struct, error as StructError
+from sys import intern
+from typing import Iterable, List, Optional, Tuple
+
+from .instrumentation import get_logger
+from .registry import OCRD_ALL_JSON
+from .validators.ocrd_validator import ProcessorCallArguments
+
+__all__ = [
+    "IR_FORMAT_BINARY",
+    "IR_FORMAT_JSON",
+    "StepIR",
+    "WorkflowIR",
+    "is_workflow_ir_file"
+]
+
+logger = get_logger(__name__)
+
+IR_FORMAT_BINARY = 'binary'
+IR_FORMAT_JSON = 'json'
+IR_FORMAT_VERSION = 1
+# The name of the JSON format, OCR-D workflow files never start with a JSON object
+IR_JSON_FORMAT_NAME = 'oton-ir'
+IR_BINARY_MAGIC = b'OTIR'
+# Binary layout, little endian:
+#  header: magic, format version, number of strings, number of steps
+#  string table: per string its length in bytes and the UTF-8 bytes
+#  workflow: string indices of the ocrd process command and of the tool registry version
+#  steps: string indices of the executable, input, output file groups and parameters
+# An output file group of None is stored as NO_STRING, the strings are shared by all steps
+IR_BINARY_HEADER = Struct('<4sHII')
+IR_BINARY_LENGTH = Struct('<I')
+IR_BINARY_WORKFLOW = Struct('<II')
+IR_BINARY_STEP = Struct('<IIII')
+NO_STRING = 0xFFFFFFFF
+
+
+class StepIR:
+    """An immutable, validated step of an OCR-D workflow.
+
+    The tool description is referenced by the executable, the key of the tool registry,
+    and the parameters are held as JSON string. All strings are interned, so that the
+    steps of many workflows share the same executable, file group and parameter strings.
+    """
+
+    __slots__ = ('executable', 'input_file_grps', 'output_file_grps', 'parameters_json')
+
+    def __init__(
+        self,
+        executable: str,
+        input_file_grps: str,
+        output_file_grps: Optional[str] = None,
+        parameters_json: str = '{}'
+    ):
+        object.__setattr__(self, 'executable', intern(executable))
+        object.__setattr__(self, 'input_file_grps', intern(input_file_grps))
+        object.__setattr__(self, 'output_file_grps', intern(output_file_grps) if output_file_grps else None)
+        object.__setattr__(self, 'parameters_json', intern(parameters_json))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return StepIR, self.__fields()
+
+    def __eq__(self, other):
+        return isinstance(other, StepIR) and self.__fields() == other.__fields()
+
+    def __hash__(self):
+        return hash(self.__fields())
+
+    def __repr__(self):
+        return f"StepIR({self.executable!r}, {self.input_file_grps!r}, {self.output_file_grps!r})"
+
+    def __fields(self) -> Tuple[str, str, Optional[str], str]:
+        return self.executable, self.input_file_grps, self.output_file_grps, self.parameters_json
+
+    @property
+    def parameters(self) -> dict:
+        # A new dict on each access, the step itself stays unchanged
+        return loads(self.parameters_json)
+
+    @property
+    def ocrd_tool_json(self) -> dict:
+        return OCRD_ALL_JSON[self.executable]
+
+    @staticmethod
+    def from_processor(processor: ProcessorCallArguments) -> 'StepIR':
+        return StepIR(
+            processor.executable, processor.input_file_grps, processor.output_file_grps,
+            dumps(processor.parameters or {}))
+
+    def to_processor(self) -> ProcessorCallArguments:
+        # The arguments are mutable, hence a new instance per call
+        return ProcessorCallArguments(
+            self.executable[len('ocrd-'):], self.input_file_grps, self.output_file_grps, self.parameters)
+
+    def to_line(self) -> str:
+        """The step as line of an OCR-D workflow file"""
+        line = f"{self.executable[len('ocrd-'):]} -I {self.input_file_grps}"
+        if self.output_file_grps:
+            line += f" -O {self.output_file_grps}"
+        if self.parameters_json != '{}':
+            line += f" -p '{self.parameters_json}'"
+        return line
+
+
+class WorkflowIR:
+    """An immutable, parsed and validated OCR-D workflow.
+
+    The tool registry version is the one the workflow was validated against. Loaded workflows
+    of the same version do not need to be parsed and validated again, see `OCRDValidator.validate_ir`.
+    """
+
+    __slots__ = ('ocrd_process_command', 'tool_version', 'steps')
+
+    def __init__(self, ocrd_process_command: str, tool_version: str, steps: Iterable[StepIR]):
+        object.__setattr__(self, 'ocrd_process_command', intern(ocrd_process_command))
+        object.__setattr__(self, 'tool_version', intern(tool_version))
+        object.__setattr__(self, 'steps', tuple(steps))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return WorkflowIR, (self.ocrd_process_command, self.tool_version, self.steps)
+
+    def __eq__(self, other):
+        return isinstance(other, WorkflowIR) and \
+            (self.ocrd_process_command, self.tool_version, self.steps) == \
+            (other.ocrd_process_command, other.tool_version, other.steps)
+
+    def __hash__(self):
+        return hash((self.ocrd_process_command, self.tool_version, self.steps))
+
+    def __repr__(self):
+        return f"WorkflowIR({self.ocrd_process_command!r}, {len(self.steps)} steps)"
+
+    @staticmethod
+    def from_processors(
+        ocrd_process_command: str,
+        processors: List[ProcessorCallArguments],
+        tool_version: Optional[str] = None
+    ) -> 'WorkflowIR':
+        steps = [StepIR.from_processor(processor) for processor in processors]
+        return WorkflowIR(ocrd_process_command, tool_version or OCRD_ALL_JSON.version, steps)
+
+    def to_processors(self) -> List[ProcessorCallArguments]:
+        return [step.to_processor() for step in self.steps]
+
+    def to_lines(self) -> List[str]:
+        """The workflow as lines of an OCR-D workflow file"""
+        return [self.ocrd_process_command] + [step.to_line() for step in self.steps]
+
+    def to_json(self) -> str:
+        return dumps({
+            'format': IR_JSON_FORMAT_NAME,
+            'version': IR_FORMAT_VERSION,
+            'tool_version': self.tool_version,
+            'ocrd_process_command': self.ocrd_process_command,
+            'steps': [{
+                'executable': step.executable,
+                'input_file_grps': step.input_file_grps,
+                'output_file_grps': step.output_file_grps,
+                'parameters': step.parameters
+            } for step in self.steps]
+        }, indent=2)
+
+    @staticmethod
+    def from_json(content: str) -> 'WorkflowIR':
+        document = loads(content)
+        if not isinstance(document, dict) or document.get('format') != IR_JSON_FORMAT_NAME:
+            raise ValueError("Not an intermediate representation of an OCR-D workflow")
+        if document.get('version') != IR_FORMAT_VERSION:
+            raise ValueError(f"Unsupported version of the intermediate representation: {document.get('version')}")
+        steps = [
+            StepIR(step['executable'], step['input_file_grps'], step['output_file_grps'], dumps(step['parameters']))
+            for step in document['steps']
+        ]
+        return WorkflowIR(document['ocrd_process_command'], document['tool_version'], steps)
+
+    def to_bytes(self) -> bytes:
+        strings: List[str] = []
+        string_indices = {}
+
+        def index_of(string: Optional[str]) -> int:
+            if string is None:
+                return NO_STRING
+            if string not in string_indices:
+                string_indices[string] = len(strings)
+                strings.append(string)
+            return string_indices[string]
+
+        workflow = IR_BINARY_WORKFLOW.pack(index_of(self.ocrd_process_command), index_of(self.tool_version))
+        steps = [
+            IR_BINARY_STEP.pack(
+                index_of(step.executable), index_of(step.input_file_grps),
+                index_of(step.output_file_grps), index_of(step.parameters_json))
+            for step in self.steps
+        ]
+        chunks = [IR_BINARY_HEADER.pack(IR_BINARY_MAGIC, IR_FORMAT_VERSION, len(strings), len(steps))]
+        for string in strings:
+            encoded = string.encode('utf-8')
+            chunks.append(IR_BINARY_LENGTH.pack(len(encoded)))
+            chunks.append(encoded)
+        chunks.append(workflow)
+        chunks.extend(steps)
+        return b''.join(chunks)
+
+    @staticmethod
+    def from_bytes(content: bytes) -> 'WorkflowIR':
+        try:
+            magic, format_version, strings_count, steps_count = IR_BINARY_HEADER.unpack_from(content, 0)
+            if magic != IR_BINARY_MAGIC:
+                raise ValueError("Not an intermediate representation of an OCR-D workflow")
+            if format_version != IR_FORMAT_VERSION:
+                raise ValueError(f"Unsupported version of the intermediate representation: {format_version}")
+            offset = IR_BINARY_HEADER.size
+            strings = []
+            for _ in range(strings_count):
+                (length,) = IR_BINARY_LENGTH.unpack_from(content, offset)
+                offset += IR_BINARY_LENGTH.size
+                strings.append(content[offset:offset + length].decode('utf-8'))
+                offset += length
+            command_index, version_index = IR_BINARY_WORKFLOW.unpack_from(content, offset)
+            offset += IR_BINARY_WORKFLOW.size
+            steps = []
+            for step_fields in IR_BINARY_STEP.iter_unpack(content[offset:offset + steps_count * IR_BINARY_STEP.size]):
+                steps.append(StepIR(*(strings[index] if index != NO_STRING else None for index in step_fields)))
+            if len(steps) != steps_count:
+                raise ValueError("Truncated intermediate representation of an OCR-D workflow")
+            return WorkflowIR(strings[command_index], strings[version_index], steps)
+        except (IndexError, StructError, UnicodeDecodeError) as error:
+            raise ValueError(f"Corrupt intermediate representation of an OCR-D workflow: {error}")
+
+    def save(self, output_path: str, ir_format: str = IR_FORMAT_JSON):
+        if ir_format == IR_FORMAT_BINARY:
+            with open(output_path, mode='wb') as output_file:
+                output_file.write(self.to_bytes())
+        elif ir_format == IR_FORMAT_JSON:
+            with open(output_path, mode='w', encoding='utf-8') as output_file:
+                output_file.write(self.to_json())
+        else:
+            raise ValueError(f"Unknown format of the intermediate representation: {ir_format}")
+        logger.info(f"Intermediate representation of {len(self.steps)} steps written to: {output_path}")
+
+    @staticmethod
+    def load(input_path: str) -> 'WorkflowIR':
+        """Load the intermediate representation from a file in either format"""
+        with open(input_path, mode='rb') as input_file:
+            content = input_file.read()
+        if content.startswith(IR_BINARY_MAGIC):
+            return WorkflowIR.from_bytes(content)
+        return WorkflowIR.from_json(content.decode('utf-8'))
+
+
+def is_workflow_ir_file(input_path: str) -> bool:
+    """Whether the file holds an intermediate representation instead of an OCR-D workflow"""
+    with open(input_path, mode='rb') as input_file:
+        start = input_file.read(64)
+    return start.startswith(IR_BINARY_MAGIC) or start.lstrip().startswith(b'{')
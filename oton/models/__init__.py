@@ -1,9 +1,10 @@
 __all__ = [
+  "NextflowBlockFusedProcess",
   "NextflowBlockProcess",
   "NextflowBlockWorkflow",
   "NextflowFileExecutable"
 ]
 
-from .nf_block_process import NextflowBlockProcess
+from .nf_block_process import NextflowBlockFusedProcess, NextflowBlockProcess
 from .nf_block_workflow import NextflowBlockWorkflow
 from .nf_file_executable import NextflowFileExecutable
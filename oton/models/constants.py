@@ -1,8 +1,29 @@
+from typing import List
+
 __all__ = [
     "DIR_IN",
     "DIR_OUT",
     "METS_FILE",
-
+    "PAGE_RANGE",
+    "METS_CHUNK",
+    "PAGE_CHUNKS",
+    "METS_INPUTS",
+    "SCRATCH_WORKSPACE",
+    "METS_PATHS",
+    "UPSTREAM_STAMP",
+
+    "NF_PROCESS_LIST_PAGES",
+    "NF_PROCESS_SPLIT_METS",
+    "NF_PROCESS_MERGE_METS",
+    "NF_PROCESS_JOIN_METS",
+    "FUSED_PROCESS_PREFIX",
+    "TASK_PROCESS_NAME",
+
+    "CONTAINER_ENGINES",
+    "TARGET_FLAVOURS",
+
+    "PARAMS_KEY_CONTAINER_IMAGE",
+    "PARAMS_KEY_CONTAINER_OPTIONS",
     "PARAMS_KEY_DOCKER_PWD",
     "PARAMS_KEY_DOCKER_VOLUME",
     "PARAMS_KEY_DOCKER_MODELS",
@@ -10,7 +31,12 @@ __all__ = [
     "PARAMS_KEY_DOCKER_COMMAND",
     "PARAMS_KEY_INPUT_FILE_GRP",
     "PARAMS_KEY_METS_PATH",
+    "PARAMS_KEY_PAGE_CHUNKS",
     "PARAMS_KEY_WORKSPACE_PATH",
+    "PARAMS_KEY_WORKSPACES",
+    "PARAMS_KEY_MAX_WORKSPACES",
+    "PARAMS_KEY_WORKSPACES_SUMMARY",
+    "PARAMS_KEY_STORE_DIR",
 
     "PARAMS_VAL_DOCKER_PWD",
     "PARAMS_VAL_DOCKER_VOLUME",
@@ -25,7 +51,10 @@ __all__ = [
     "PH_DIR_IN",
     "PH_DIR_OUT",
     "PH_METS_FILE",
+    "PH_PAGE_RANGE",
 
+    "REPR_CONTAINER_IMAGE",
+    "REPR_CONTAINER_MODELS_DIR",
     "REPR_DSL2",
     "REPR_DOCKER_COMMAND",
     "REPR_DOCKER_IMAGE",
@@ -35,13 +64,24 @@ __all__ = [
     "REPR_DOCKER_VOLUME",
     "REPR_INPUT_FILE_GRP",
     "REPR_METS_PATH",
+    "build_repr",
+    "build_mets_copy_path",
+    "build_container_config",
+    "build_container_options_repr",
+    "build_store_dir_path",
+    "build_store_dir_repr",
     "REPR_MODELS_PATH",
     "REPR_WORKSPACE_PATH",
+    "REPR_WORKSPACES",
+    "REPR_WORKSPACES_SUMMARY",
 
     "SPACES"
 ]
 
 # Parameter keys
+PARAMS_KEY_CONTAINER_IMAGE: str = 'params.container_image'
+PARAMS_KEY_CONTAINER_MODELS_DIR: str = 'params.container_models_dir'
+PARAMS_KEY_CONTAINER_OPTIONS: str = 'params.container_options'
 PARAMS_KEY_DOCKER_COMMAND: str = 'params.docker_command'
 PARAMS_KEY_DOCKER_IMAGE: str = 'params.docker_image'
 PARAMS_KEY_DOCKER_PWD: str = 'params.docker_pwd'
@@ -51,7 +91,12 @@ PARAMS_KEY_DOCKER_MODELS_DIR: str = 'params.docker_models_dir'
 PARAMS_KEY_METS_PATH: str = 'params.mets_path'
 PARAMS_KEY_INPUT_FILE_GRP: str = 'params.input_file_grp'
 PARAMS_KEY_MODELS_PATH: str = 'params.models_path'
+PARAMS_KEY_PAGE_CHUNKS: str = 'params.page_chunks'
 PARAMS_KEY_WORKSPACE_PATH: str = 'params.workspace_path'
+PARAMS_KEY_WORKSPACES: str = 'params.workspaces'
+PARAMS_KEY_MAX_WORKSPACES: str = 'params.max_workspaces'
+PARAMS_KEY_WORKSPACES_SUMMARY: str = 'params.workspaces_summary'
+PARAMS_KEY_STORE_DIR: str = 'params.store_dir'
 
 
 def __build_docker_command():
@@ -75,28 +120,110 @@ PARAMS_VAL_DOCKER_MODELS_DIR: str = "null"
 PARAMS_VAL_DOCKER_VOLUME: str = f'${PARAMS_KEY_WORKSPACE_PATH}:${PARAMS_KEY_DOCKER_PWD}'
 PARAMS_VAL_DOCKER_MODELS: str = f'${PARAMS_KEY_MODELS_PATH}:${PARAMS_KEY_DOCKER_MODELS_DIR}'
 PARAMS_VAL_DOCKER_COMMAND: str = __build_docker_command()
+PARAMS_VAL_CONTAINER_IMAGE: str = "null"
+PARAMS_VAL_CONTAINER_MODELS_DIR: str = "null"
+PARAMS_VAL_WORKSPACES: str = "null"
+PARAMS_VAL_WORKSPACES_SUMMARY: str = "workspaces_summary.tsv"
 
 
-def __build_repr(parameter, value):
+def build_repr(parameter, value):
     return f'{parameter} = "{value}"'
 
 
 # Parameters - file representation
 REPR_DSL2: str = 'nextflow.enable.dsl = 2'
-REPR_DOCKER_COMMAND: str = __build_repr(PARAMS_KEY_DOCKER_COMMAND, PARAMS_VAL_DOCKER_COMMAND)
-REPR_DOCKER_IMAGE: str = __build_repr(PARAMS_KEY_DOCKER_IMAGE, PARAMS_VAL_DOCKER_IMAGE)
-REPR_DOCKER_MODELS: str = __build_repr(PARAMS_KEY_DOCKER_MODELS, PARAMS_VAL_DOCKER_MODELS)
-REPR_DOCKER_MODELS_DIR: str = __build_repr(PARAMS_KEY_DOCKER_MODELS_DIR, PARAMS_VAL_DOCKER_MODELS_DIR)
-REPR_DOCKER_PWD: str = __build_repr(PARAMS_KEY_DOCKER_PWD, PARAMS_VAL_DOCKER_PWD)
-REPR_DOCKER_VOLUME: str = __build_repr(PARAMS_KEY_DOCKER_VOLUME, PARAMS_VAL_DOCKER_VOLUME)
-REPR_METS_PATH: str = __build_repr(PARAMS_KEY_METS_PATH, PARAMS_VAL_METS_PATH)
-REPR_INPUT_FILE_GRP: str = __build_repr(PARAMS_KEY_INPUT_FILE_GRP, PARAMS_VAL_INPUT_FILE_GRP)
-REPR_MODELS_PATH: str = __build_repr(PARAMS_KEY_MODELS_PATH, PARAMS_VAL_MODELS_PATH)
-REPR_WORKSPACE_PATH: str = __build_repr(PARAMS_KEY_WORKSPACE_PATH, PARAMS_VAL_WORKSPACE_PATH)
+REPR_CONTAINER_IMAGE: str = build_repr(PARAMS_KEY_CONTAINER_IMAGE, PARAMS_VAL_CONTAINER_IMAGE)
+REPR_CONTAINER_MODELS_DIR: str = build_repr(PARAMS_KEY_CONTAINER_MODELS_DIR, PARAMS_VAL_CONTAINER_MODELS_DIR)
+REPR_DOCKER_COMMAND: str = build_repr(PARAMS_KEY_DOCKER_COMMAND, PARAMS_VAL_DOCKER_COMMAND)
+REPR_DOCKER_IMAGE: str = build_repr(PARAMS_KEY_DOCKER_IMAGE, PARAMS_VAL_DOCKER_IMAGE)
+REPR_DOCKER_MODELS: str = build_repr(PARAMS_KEY_DOCKER_MODELS, PARAMS_VAL_DOCKER_MODELS)
+REPR_DOCKER_MODELS_DIR: str = build_repr(PARAMS_KEY_DOCKER_MODELS_DIR, PARAMS_VAL_DOCKER_MODELS_DIR)
+REPR_DOCKER_PWD: str = build_repr(PARAMS_KEY_DOCKER_PWD, PARAMS_VAL_DOCKER_PWD)
+REPR_DOCKER_VOLUME: str = build_repr(PARAMS_KEY_DOCKER_VOLUME, PARAMS_VAL_DOCKER_VOLUME)
+REPR_METS_PATH: str = build_repr(PARAMS_KEY_METS_PATH, PARAMS_VAL_METS_PATH)
+REPR_INPUT_FILE_GRP: str = build_repr(PARAMS_KEY_INPUT_FILE_GRP, PARAMS_VAL_INPUT_FILE_GRP)
+REPR_MODELS_PATH: str = build_repr(PARAMS_KEY_MODELS_PATH, PARAMS_VAL_MODELS_PATH)
+REPR_WORKSPACE_PATH: str = build_repr(PARAMS_KEY_WORKSPACE_PATH, PARAMS_VAL_WORKSPACE_PATH)
+REPR_WORKSPACES: str = build_repr(PARAMS_KEY_WORKSPACES, PARAMS_VAL_WORKSPACES)
+REPR_WORKSPACES_SUMMARY: str = build_repr(PARAMS_KEY_WORKSPACES_SUMMARY, PARAMS_VAL_WORKSPACES_SUMMARY)
 
 DIR_IN: str = 'input_file_grp'
 DIR_OUT: str = 'output_file_grp'
 METS_FILE: str = 'mets_file'
+PAGE_RANGE: str = 'page_range'
+METS_CHUNK: str = 'mets_chunk'
+PAGE_CHUNKS: str = 'page_chunks'
+METS_INPUTS: str = 'mets_inputs'
+# Channel of the METS paths of the multi workspace mode
+METS_PATHS: str = 'mets_paths'
+# The stamp file of the previous step of the resumable mode, which chains the fingerprints of the steps
+UPSTREAM_STAMP: str = 'upstream_stamp'
+# Directory of the workspace copy inside the (node-local) task directory of the scratch mode
+SCRATCH_WORKSPACE: str = 'scratch_workspace'
+
+# Names of the workspace management processes of the page parallel mode
+NF_PROCESS_LIST_PAGES: str = 'list_page_ids'
+NF_PROCESS_SPLIT_METS: str = 'split_mets'
+NF_PROCESS_MERGE_METS: str = 'merge_mets'
+# Name of the process merging the METS copies of the DAG mode back
+NF_PROCESS_JOIN_METS: str = 'join_mets'
+# Groovy expression of the name of the running process, the include alias of a deduplicated step,
+# without the names of the enclosing workflows
+TASK_PROCESS_NAME: str = "${task.process.tokenize(':')[-1]}"
+# Name prefix of the processes running several steps in one task, followed by the indices of the first and last step
+FUSED_PROCESS_PREFIX: str = 'ocrd_fused_'
+
+
+def build_store_dir_repr(store_dir: str) -> str:
+    return build_repr(PARAMS_KEY_STORE_DIR, store_dir)
+
+
+def build_store_dir_path(output_file_grps: str) -> str:
+    # The stamps are stored per workspace, keyed by the hash of its METS path, since the fingerprints of the
+    # steps do not depend on the workspace. A shared store directory would skip the steps of other workspaces.
+    return f'${{{PARAMS_KEY_STORE_DIR}}}/${{{METS_FILE}.md5()}}/{output_file_grps}'
+
+
+def build_mets_copy_path(suffix: str) -> str:
+    # Groovy expression of the path of a METS copy next to the original METS file.
+    # The copies must reside inside the workspace to keep the relative file paths valid.
+    return f"{PARAMS_KEY_METS_PATH}.replaceFirst(/\\.xml$/, '') + \".{suffix}.xml\""
+
+# The container engines of the native container mode and their bind mount option
+CONTAINER_ENGINES = {
+    'docker': '-v',
+    'singularity': '-B',
+    'apptainer': '-B'
+}
+# The flavours of the conversion targets, each with its dockerized variant flag and container engine
+TARGET_FLAVOURS = {
+    'native': (False, None),
+    'dockerized': (True, None),
+    **{container: (False, container) for container in CONTAINER_ENGINES}
+}
+
+
+def build_container_options_repr(container: str) -> str:
+    # The workspace is mounted at the same path inside the container, so that the
+    # absolute METS paths passed between the processes stay valid
+    bind = CONTAINER_ENGINES[container]
+    return build_repr(
+        PARAMS_KEY_CONTAINER_OPTIONS,
+        f'{bind} ${PARAMS_KEY_WORKSPACE_PATH}:${PARAMS_KEY_WORKSPACE_PATH} '
+        f'{bind} ${PARAMS_KEY_MODELS_PATH}:${PARAMS_KEY_CONTAINER_MODELS_DIR}'
+    )
+
+
+def build_container_config(container: str) -> List[str]:
+    # The config scope enabling the container engine, the engine takes care of pulling and caching the image
+    lines = [f'{container} {{', f'{SPACES}enabled = true']
+    if container == 'docker':
+        lines.append(f"{SPACES}runOptions = '-u $(id -u):$(id -g)'")
+    else:
+        lines.append(f'{SPACES}autoMounts = true')
+    lines.append('}')
+    return lines
+
 
 # Placeholders
 BS: str = '{}'
@@ -104,4 +231,5 @@ PH_DOCKER_COMMAND: str = f'${BS[0]}{PARAMS_KEY_DOCKER_COMMAND}{BS[1]}'
 PH_DIR_IN: str = f'${BS[0]}{DIR_IN}{BS[1]}'
 PH_DIR_OUT: str = f'${BS[0]}{DIR_OUT}{BS[1]}'
 PH_METS_FILE: str = f'${BS[0]}{METS_FILE}{BS[1]}'
+PH_PAGE_RANGE: str = f'${BS[0]}{PAGE_RANGE}{BS[1]}'
 SPACES = '    '
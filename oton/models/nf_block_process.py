@@ -1,71 +1,112 @@
-import logging
+from copy import copy
+from shlex import quote
+from typing import List
 from ..validators.ocrd_validator import ProcessorCallArguments
-from ..constants import (
-    OTON_LOG_LEVEL,
-    OTON_LOG_FORMAT,
-)
+from ..instrumentation import get_logger
 from .constants import (
+    FUSED_PROCESS_PREFIX,
+    METS_FILE,
+    PARAMS_KEY_CONTAINER_IMAGE,
+    PARAMS_KEY_CONTAINER_OPTIONS,
     PH_DIR_IN,
     PH_DIR_OUT,
     PH_METS_FILE,
     PH_DOCKER_COMMAND,
+    PH_PAGE_RANGE,
+    SCRATCH_WORKSPACE,
     SPACES
 )
 
+logger = get_logger(__name__)
+
 
 class NextflowBlockProcess:
-    def __init__(self, processor_call_arguments: ProcessorCallArguments, index_pos: int, dockerized: bool = False):
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.getLevelName(OTON_LOG_LEVEL))
-        logging.basicConfig(format=OTON_LOG_FORMAT)
+    def __init__(
+        self,
+        processor_call_arguments: ProcessorCallArguments,
+        index_pos: int,
+        dockerized: bool = False,
+        page_parallel: bool = False
+    ):
+        self.logger = logger
 
         self.dockerized = dockerized
-        self.nf_process_name = processor_call_arguments.executable.replace('-', '_') + "_" + str(index_pos)
+        self.nf_process_name = NextflowBlockProcess.build_process_name(processor_call_arguments.executable, index_pos)
         self.repr_in_workflow = [
             self.nf_process_name,
             f'"{processor_call_arguments.input_file_grps}"',
             f'"{processor_call_arguments.output_file_grps}"'
         ]
 
+        # The placeholders are set on a copy, the passed arguments of the workflow step are left intact
+        processor_call_arguments = copy(processor_call_arguments)
         processor_call_arguments.input_file_grps = PH_DIR_IN
         processor_call_arguments.output_file_grps = PH_DIR_OUT
         processor_call_arguments.mets_file_path = PH_METS_FILE
 
         self.ocrd_command_bash = f'{processor_call_arguments}'
+        if page_parallel:
+            self.ocrd_command_bash += f' -g {PH_PAGE_RANGE}'
         self.directives = []
         self.input_params = []
         self.output_params = []
+        # Groovy statements evaluated in the script block before the command string
+        self.script_statements: List[str] = []
+        # Shell commands executed before the (dockerized) command
+        self.script_prologue: List[str] = []
+        # Shell commands executed after the (dockerized) command
+        self.script_epilogue: List[str] = []
+        # Environment variables of the command, set inside the container if dockerized
+        self.environment: List[str] = []
+
+    @staticmethod
+    def build_process_name(executable: str, index_pos: int) -> str:
+        return executable.replace('-', '_') + "_" + str(index_pos)
 
     def file_representation(self):
-        representation = f'process {self.nf_process_name}' + ' {\n'
+        # Collect the lines and join them once, repeated string concatenation is quadratic
+        lines = [f'process {self.nf_process_name}' + ' {']
 
-        for directive in self.directives:
-            representation += f'{SPACES}{directive}\n'
-        representation += '\n'
+        if self.directives:
+            lines.extend(f'{SPACES}{directive}' for directive in self.directives)
+            lines.append('')
 
-        representation += f'{SPACES}input:\n'
-        for input_param in self.input_params:
-            representation += f'{SPACES}{SPACES}{input_param}\n'
-        representation += '\n'
+        if self.input_params:
+            lines.append(f'{SPACES}input:')
+            lines.extend(f'{SPACES}{SPACES}{input_param}' for input_param in self.input_params)
+            lines.append('')
 
-        representation += f'{SPACES}output:\n'
-        for output_param in self.output_params:
-            representation += f'{SPACES}{SPACES}{output_param}\n'
-        representation += '\n'
+        if self.output_params:
+            lines.append(f'{SPACES}output:')
+            lines.extend(f'{SPACES}{SPACES}{output_param}' for output_param in self.output_params)
+            lines.append('')
 
-        representation += f'{SPACES}script:\n'
-        representation += f'{SPACES}{SPACES}"""\n'
+        lines.append(f'{SPACES}script:')
+        lines.extend(f'{SPACES}{SPACES}{statement}' for statement in self.script_statements)
+        lines.append(f'{SPACES}{SPACES}"""')
+        lines.extend(f'{SPACES}{SPACES}{command}' for command in self.script_prologue)
+        commands_bash = self.commands_bash()
+        if self.environment:
+            commands_bash = [f'env {" ".join(self.environment)} {command_bash}' for command_bash in commands_bash]
         if self.dockerized:
-            representation += f'{SPACES}{SPACES}{PH_DOCKER_COMMAND} {self.ocrd_command_bash}\n'
-        else:
-            representation += f'{SPACES}{SPACES}{self.ocrd_command_bash}\n'
-        representation += f'{SPACES}{SPACES}"""\n'
+            commands_bash = self.dockerized_commands_bash(commands_bash)
+        lines.extend(f'{SPACES}{SPACES}{command_bash}' for command_bash in commands_bash)
+        lines.extend(f'{SPACES}{SPACES}{command}' for command in self.script_epilogue)
+        lines.append(f'{SPACES}{SPACES}"""')
 
-        representation += '}\n'
+        lines.append('}\n')
+        representation = '\n'.join(lines)
 
-        self.logger.debug(f"\n{representation}")
+        self.logger.debug("\n%s", representation)
         return representation
 
+    def commands_bash(self) -> List[str]:
+        return [self.ocrd_command_bash]
+
+    def dockerized_commands_bash(self, commands_bash: List[str]) -> List[str]:
+        # Each command in a container of its own
+        return [f'{PH_DOCKER_COMMAND} {command_bash}' for command_bash in commands_bash]
+
     def add_directive(self, directive: str):
         self.directives.append(directive)
 
@@ -74,3 +115,147 @@ class NextflowBlockProcess:
 
     def add_output_param(self, parameter: str):
         self.output_params.append(parameter)
+
+    def add_script_statement(self, statement: str):
+        self.script_statements.append(statement)
+
+    def add_script_prologue(self, command: str):
+        self.script_prologue.append(command)
+
+    def add_script_epilogue(self, command: str):
+        self.script_epilogue.append(command)
+
+    def replace_mets_file(self, mets_file: str):
+        # The METS file the commands work on, instead of the one passed to the process
+        self.ocrd_command_bash = self.ocrd_command_bash.replace(f'-m {PH_METS_FILE}', f'-m {mets_file}')
+
+    def add_command_option(self, option: str):
+        # An option of the OCR-D processor CLI appended to the command, e.g., `--overwrite`
+        self.ocrd_command_bash += f' {option}'
+
+    def use_scratch_workspace(self):
+        """Run the commands on a copy of the workspace in the task directory, e.g., on a node-local disk.
+
+        The copy consists of symbolic links to the files of the workspace and a copy of the METS file.
+        Thus, the existing files are read from the workspace, while the new files are written locally.
+        Afterwards, the new files and the METS file are copied back to the workspace at once.
+        """
+        self.add_script_statement(f'workspace_dir = file({METS_FILE}).parent')
+        self.add_script_statement(f'mets_name = file({METS_FILE}).name')
+        self.add_script_prologue(f'mkdir -p {SCRATCH_WORKSPACE} && cp -rs ${{workspace_dir}}/. {SCRATCH_WORKSPACE}/')
+        self.add_script_prologue(f'cp --remove-destination {PH_METS_FILE} {SCRATCH_WORKSPACE}/${{mets_name}}')
+        self.replace_mets_file(f'{SCRATCH_WORKSPACE}/${{mets_name}}')
+        # Only regular files are new, the symbolic links point to the existing files
+        self.add_script_epilogue(
+            f'cd {SCRATCH_WORKSPACE} && find . -type f -exec cp --parents -t ${{workspace_dir}} {{}} +')
+
+    def add_environment(self, variable: str, value: str):
+        self.environment.append(f'{variable}={value}')
+
+    def add_container_directives(self):
+        """Run the command in the container of the native container mode, instead of the host"""
+        self.add_directive(f'container {PARAMS_KEY_CONTAINER_IMAGE}')
+        self.add_directive(f'containerOptions {PARAMS_KEY_CONTAINER_OPTIONS}')
+
+    def add_resource_directives(self, resources: dict):
+        """Add the directives of the requested resources, see `ResourceProfile`.
+
+        The thread limits of the processor are bound to the requested cpus,
+        so that multithreaded processors do not oversubscribe the cores.
+        """
+        if 'cpus' in resources:
+            self.add_directive(f"cpus {resources['cpus']}")
+        if 'memory' in resources:
+            self.add_directive(f"memory '{resources['memory']}'")
+        if 'time' in resources:
+            self.add_directive(f"time '{resources['time']}'")
+        if 'maxForks' in resources:
+            self.add_directive(f"maxForks {resources['maxForks']}")
+        if 'cpus' in resources:
+            self.add_environment('OMP_NUM_THREADS', '${task.cpus}')
+            self.add_environment('OMP_THREAD_LIMIT', '${task.cpus}')
+
+
+class NextflowBlockHelperProcess(NextflowBlockProcess):
+    """A process block running a workspace management command instead of an OCR-D processor"""
+
+    def __init__(self, nf_process_name: str, command_bash: str, dockerized: bool = False):
+        self.logger = logger
+
+        self.dockerized = dockerized
+        self.nf_process_name = nf_process_name
+        self.repr_in_workflow = [self.nf_process_name]
+        self.ocrd_command_bash = command_bash
+        self.directives = []
+        self.input_params = []
+        self.output_params = []
+        self.script_statements: List[str] = []
+        self.script_prologue: List[str] = []
+        self.script_epilogue: List[str] = []
+        self.environment: List[str] = []
+
+
+class NextflowBlockFusedProcess(NextflowBlockProcess):
+    """A process block running several consecutive OCR-D processors back to back in a single task.
+
+    The block is called like the block of a single step, with the input file group of the first
+    and the output file group of the last processor. The file groups in between are fixed.
+    """
+
+    def __init__(
+        self,
+        processors_call_arguments: List[ProcessorCallArguments],
+        index_pos: int,
+        dockerized: bool = False,
+        page_parallel: bool = False
+    ):
+        self.logger = logger
+
+        self.dockerized = dockerized
+        last_index_pos = index_pos + len(processors_call_arguments) - 1
+        self.nf_process_name = NextflowBlockFusedProcess.build_fused_process_name(index_pos, last_index_pos)
+        self.repr_in_workflow = [
+            self.nf_process_name,
+            f'"{processors_call_arguments[0].input_file_grps}"',
+            f'"{processors_call_arguments[-1].output_file_grps}"'
+        ]
+
+        processors_call_arguments = [copy(arguments) for arguments in processors_call_arguments]
+        processors_call_arguments[0].input_file_grps = PH_DIR_IN
+        processors_call_arguments[-1].output_file_grps = PH_DIR_OUT
+        self.ocrd_commands_bash: List[str] = []
+        for processor_call_arguments in processors_call_arguments:
+            processor_call_arguments.mets_file_path = PH_METS_FILE
+            command_bash = f'{processor_call_arguments}'
+            if page_parallel:
+                command_bash += f' -g {PH_PAGE_RANGE}'
+            self.ocrd_commands_bash.append(command_bash)
+        self.ocrd_command_bash = ' && '.join(self.ocrd_commands_bash)
+        self.directives = []
+        self.input_params = []
+        self.output_params = []
+        self.script_statements: List[str] = []
+        self.script_prologue: List[str] = []
+        self.script_epilogue: List[str] = []
+        self.environment: List[str] = []
+
+    @staticmethod
+    def build_fused_process_name(first_index_pos: int, last_index_pos: int) -> str:
+        return f'{FUSED_PROCESS_PREFIX}{first_index_pos}_{last_index_pos}'
+
+    def replace_mets_file(self, mets_file: str):
+        self.ocrd_commands_bash = [
+            command_bash.replace(f'-m {PH_METS_FILE}', f'-m {mets_file}') for command_bash in self.ocrd_commands_bash]
+        self.ocrd_command_bash = ' && '.join(self.ocrd_commands_bash)
+
+    def add_command_option(self, option: str):
+        self.ocrd_commands_bash = [f'{command_bash} {option}' for command_bash in self.ocrd_commands_bash]
+        self.ocrd_command_bash = ' && '.join(self.ocrd_commands_bash)
+
+    def commands_bash(self) -> List[str]:
+        # One command per line, the script of a task stops at the first failing command
+        return self.ocrd_commands_bash
+
+    def dockerized_commands_bash(self, commands_bash: List[str]) -> List[str]:
+        # All commands in a single container, instead of starting a container per step
+        return [f'{PH_DOCKER_COMMAND} sh -c {quote(" && ".join(commands_bash))}']
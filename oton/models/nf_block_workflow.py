@@ -1,28 +1,67 @@
-import logging
-from typing import List
-from ..constants import (
-    OTON_LOG_LEVEL,
-    OTON_LOG_FORMAT,
-)
+from typing import List, Optional
+from ..dataflow import find_sink_steps
+from ..instrumentation import get_logger
 from .constants import (
+    METS_PATHS,
+    NF_PROCESS_JOIN_METS,
+    NF_PROCESS_LIST_PAGES,
+    NF_PROCESS_MERGE_METS,
+    NF_PROCESS_SPLIT_METS,
     PARAMS_KEY_METS_PATH,
     PARAMS_KEY_INPUT_FILE_GRP,
+    PARAMS_KEY_PAGE_CHUNKS,
+    PARAMS_KEY_WORKSPACES,
+    PARAMS_KEY_WORKSPACES_SUMMARY,
     SPACES
 )
 
+logger = get_logger(__name__)
+
 
 class NextflowBlockWorkflow:
-    def __init__(self, workflow_name: str, nf_processes: List[str]):
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.getLevelName(OTON_LOG_LEVEL))
-        logging.basicConfig(format=OTON_LOG_FORMAT)
+    def __init__(
+        self,
+        workflow_name: str,
+        nf_processes: List[str],
+        page_parallel: bool = False,
+        dependency_graph: Optional[List[List[int]]] = None,
+        multi_workspace: bool = False
+    ):
+        self.logger = logger
 
         self.workflow_name = workflow_name
         self.nf_processes: List[str] = nf_processes
+        self.page_parallel = page_parallel
+        # If set, the direct dependencies of each process, otherwise the processes are chained linearly
+        self.dependency_graph = dependency_graph
+        # If set, the METS files of many workspaces are fed through the processes
+        self.multi_workspace = multi_workspace
 
     def file_representation(self):
-        representation = 'workflow {\n'
-        representation += f'{SPACES}{self.workflow_name}:\n'
+        # Collect the lines and join them once, repeated string concatenation is quadratic
+        lines = ['workflow {', f'{SPACES}{self.workflow_name}:']
+
+        if self.dependency_graph is not None:
+            lines.extend(self.__dag_representation())
+        else:
+            lines.extend(self.__chain_representation())
+
+        lines.append('}')
+        representation = '\n'.join(lines)
+
+        self.logger.debug("\n%s", representation)
+        self.logger.info("Successfully created Nextflow Workflow: %s", self.workflow_name)
+        return representation
+
+    def __chain_representation(self) -> List[str]:
+        lines = []
+        first_input = PARAMS_KEY_METS_PATH
+        if self.page_parallel:
+            lines.extend(self.__page_chunks_representation())
+            first_input = f'{NF_PROCESS_SPLIT_METS}.out'
+        elif self.multi_workspace:
+            lines.extend(self.__mets_paths_representation())
+            first_input = METS_PATHS
 
         previous_nfp = None
         for nfp in self.nf_processes:
@@ -30,13 +69,75 @@ class NextflowBlockWorkflow:
             nfp_1 = nfp[1]
             nfp_2 = nfp[2]
             if previous_nfp is None:
-                representation += f'{SPACES}{SPACES}{nfp_0}({PARAMS_KEY_METS_PATH}, {PARAMS_KEY_INPUT_FILE_GRP}, {nfp_2})\n'
+                lines.append(f'{SPACES}{SPACES}{nfp_0}({first_input}, {PARAMS_KEY_INPUT_FILE_GRP}, {nfp_2})')
             else:
-                representation += f'{SPACES}{SPACES}{nfp_0}({previous_nfp}.out, {nfp_1}, {nfp_2})\n'
+                lines.append(f'{SPACES}{SPACES}{nfp_0}({previous_nfp}.out, {nfp_1}, {nfp_2})')
             previous_nfp = nfp_0
 
-        representation += '}'
+        if self.page_parallel:
+            lines.append(f'{SPACES}{SPACES}{NF_PROCESS_MERGE_METS}({previous_nfp}.out.collect(flat: false))')
+        elif self.multi_workspace:
+            lines.extend(self.__summary_representation(f'{previous_nfp}.out'))
+        return lines
 
-        self.logger.debug(f"\n{representation}")
-        self.logger.info(f"Successfully created Nextflow Workflow: {self.workflow_name}")
-        return representation
+    def __mets_channel(self, dependencies: List[int]) -> str:
+        # Processes without dependencies start from the METS file, several dependencies are joined
+        if not dependencies:
+            return PARAMS_KEY_METS_PATH
+        channels = [f'{self.nf_processes[dependency][0]}.out' for dependency in dependencies]
+        if len(channels) == 1:
+            return channels[0]
+        return f'{channels[0]}.mix({", ".join(channels[1:])}).collect()'
+
+    def __dag_representation(self) -> List[str]:
+        lines = []
+        for index, nfp in enumerate(self.nf_processes):
+            mets_channel = self.__mets_channel(self.dependency_graph[index])
+            input_file_grp = PARAMS_KEY_INPUT_FILE_GRP if index == 0 else nfp[1]
+            lines.append(f'{SPACES}{SPACES}{nfp[0]}({mets_channel}, {input_file_grp}, {nfp[2]})')
+        sinks_channel = self.__mets_channel(find_sink_steps(self.dependency_graph))
+        lines.append(f'{SPACES}{SPACES}{NF_PROCESS_JOIN_METS}({sinks_channel})')
+        return lines
+
+    @staticmethod
+    def __page_chunks_representation() -> List[str]:
+        # Split the page ids into at most params.page_chunks comma separated ranges of equal size
+        indent = f'{SPACES}{SPACES}'
+        return [
+            f'{indent}{NF_PROCESS_LIST_PAGES}({PARAMS_KEY_METS_PATH})',
+            f'{indent}page_ranges = {NF_PROCESS_LIST_PAGES}.out',
+            f'{indent}{SPACES}.splitText() {{ it.trim() }}',
+            f'{indent}{SPACES}.filter {{ it }}',
+            f'{indent}{SPACES}.toList()',
+            f'{indent}{SPACES}.flatMap {{ page_ids -> page_ids.collate(Math.max(1, Math.ceil('
+            f'page_ids.size() / ({PARAMS_KEY_PAGE_CHUNKS} as int)) as int)).collect {{ it.join(",") }} }}',
+            f'{indent}{NF_PROCESS_SPLIT_METS}(page_ranges)'
+        ]
+
+    @staticmethod
+    def __mets_paths_representation() -> List[str]:
+        # The workspaces are given by a glob of METS files, a directory of workspaces or a file listing METS files
+        indent = f'{SPACES}{SPACES}'
+        return [
+            f"{indent}if ({PARAMS_KEY_WORKSPACES}.contains('*')) {{",
+            f'{indent}{SPACES}{METS_PATHS} = Channel.fromPath({PARAMS_KEY_WORKSPACES})',
+            f'{indent}}} else if (file({PARAMS_KEY_WORKSPACES}).isDirectory()) {{',
+            f'{indent}{SPACES}{METS_PATHS} = Channel.fromPath("${{{PARAMS_KEY_WORKSPACES}}}/*/mets.xml")',
+            f'{indent}}} else {{',
+            f'{indent}{SPACES}{METS_PATHS} = Channel.fromPath({PARAMS_KEY_WORKSPACES})'
+            f'.splitText() {{ it.trim() }}.filter {{ it }}.map {{ file(it) }}',
+            f'{indent}}}',
+            f'{indent}{METS_PATHS} = {METS_PATHS}.map {{ it.toAbsolutePath().toString() }}'
+        ]
+
+    @staticmethod
+    def __summary_representation(last_output: str) -> List[str]:
+        # The workspaces missing in the output of the last process failed in one of the processes
+        indent = f'{SPACES}{SPACES}'
+        return [
+            f"{indent}{METS_PATHS}.map {{ [it, 'SUBMITTED'] }}",
+            f'{indent}{SPACES}.join({last_output}.map {{ [it, true] }}, remainder: true)',
+            f"{indent}{SPACES}.map {{ mets, submitted, completed -> \"${{mets}}\\t${{completed ? 'COMPLETED' : 'FAILED'}}\" }}",
+            f'{indent}{SPACES}.collectFile(name: file({PARAMS_KEY_WORKSPACES_SUMMARY}).name, '
+            f'storeDir: file({PARAMS_KEY_WORKSPACES_SUMMARY}).parent, newLine: true, sort: true)'
+        ]
@@ -1,16 +1,33 @@
-import logging
-from typing import List, Tuple
+from hashlib import sha256
+from itertools import chain
+from os.path import dirname, join
+from typing import Iterator, List, Optional, Tuple
 
+from ..resources import ResourceProfile
 from ..validators.ocrd_validator import ProcessorCallArguments
-from ..constants import (
-    OTON_LOG_FORMAT,
-    OTON_LOG_LEVEL,
-)
+from ..instrumentation import count, get_logger
 from .constants import (
     DIR_IN,
     DIR_OUT,
+    METS_CHUNK,
     METS_FILE,
+    METS_INPUTS,
+    PAGE_CHUNKS,
+    PAGE_RANGE,
+
+    NF_PROCESS_JOIN_METS,
+    NF_PROCESS_LIST_PAGES,
+    NF_PROCESS_MERGE_METS,
+    NF_PROCESS_SPLIT_METS,
+    PARAMS_KEY_DOCKER_COMMAND,
+    PARAMS_KEY_MAX_WORKSPACES,
+    PARAMS_KEY_METS_PATH,
+    PARAMS_KEY_PAGE_CHUNKS,
+    TASK_PROCESS_NAME,
+    UPSTREAM_STAMP,
 
+    REPR_CONTAINER_IMAGE,
+    REPR_CONTAINER_MODELS_DIR,
     REPR_DSL2,
     REPR_DOCKER_COMMAND,
     REPR_DOCKER_IMAGE,
@@ -21,22 +38,56 @@ from .constants import (
     REPR_METS_PATH,
     REPR_INPUT_FILE_GRP,
     REPR_MODELS_PATH,
-    REPR_WORKSPACE_PATH
+    REPR_WORKSPACE_PATH,
+    REPR_WORKSPACES,
+    REPR_WORKSPACES_SUMMARY,
+    build_container_config,
+    build_container_options_repr,
+    build_mets_copy_path,
+    build_repr,
+    build_store_dir_path,
+    build_store_dir_repr
 )
-from .nf_block_process import NextflowBlockProcess
+from .nf_block_process import NextflowBlockFusedProcess, NextflowBlockHelperProcess, NextflowBlockProcess
 from .nf_block_workflow import NextflowBlockWorkflow
 
+logger = get_logger(__name__)
+
+
+def build_step_fingerprint(upstream_fingerprint: Optional[str], nf_process_block: NextflowBlockProcess) -> str:
+    """The fingerprint of a step derived from its file groups and commands and the fingerprint of the previous step.
+
+    A changed step changes the fingerprints of all following steps, an appended step leaves the others unchanged.
+    """
+    content = '\n'.join([upstream_fingerprint or ''] + nf_process_block.repr_in_workflow[1:] +
+                        nf_process_block.commands_bash())
+    return sha256(content.encode('utf-8')).hexdigest()[:16]
+
 
 class NextflowFileExecutable:
     def __init__(self):
         self.nf_lines_parameters = []
+        self.nf_lines_includes = []
         self.nf_lines_processes = []
         self.nf_lines_workflow = []
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.getLevelName(OTON_LOG_LEVEL))
-        logging.basicConfig(format=OTON_LOG_FORMAT)
+        # The blocks of the workflow steps, the helper processes are not part of it
+        self.nf_process_blocks: List[NextflowBlockProcess] = []
+        # Process definitions shared by the steps, written to a separate module file
+        self.nf_lines_module = []
+        self.module_file_name: Optional[str] = None
+        # Nextflow config of the native container mode, written to a separate config file
+        self.nf_lines_config = []
+        self.config_file_name: Optional[str] = None
+        self.logger = logger
 
-    def build_parameters(self, dockerized: bool = False):
+    def build_parameters(
+        self,
+        dockerized: bool = False,
+        page_parallel: int = 0,
+        container: Optional[str] = None,
+        multi_workspace: int = 0,
+        store_dir: Optional[str] = None
+    ):
         self.nf_lines_parameters.append(REPR_DSL2)
         self.nf_lines_parameters.append('')
 
@@ -53,25 +104,137 @@ class NextflowFileExecutable:
             self.nf_lines_parameters.append(REPR_DOCKER_IMAGE)
             self.nf_lines_parameters.append(REPR_DOCKER_COMMAND)
 
+        if container:
+            self.nf_lines_parameters.append(REPR_WORKSPACE_PATH)
+            self.nf_lines_parameters.append(REPR_MODELS_PATH)
+            self.nf_lines_parameters.append(REPR_CONTAINER_MODELS_DIR)
+            self.nf_lines_parameters.append(REPR_CONTAINER_IMAGE)
+            self.nf_lines_parameters.append(build_container_options_repr(container))
+
+        if page_parallel:
+            self.nf_lines_parameters.append(build_repr(PARAMS_KEY_PAGE_CHUNKS, page_parallel))
+
+        if multi_workspace:
+            self.nf_lines_parameters.append(REPR_WORKSPACES)
+            self.nf_lines_parameters.append(build_repr(PARAMS_KEY_MAX_WORKSPACES, multi_workspace))
+            self.nf_lines_parameters.append(REPR_WORKSPACES_SUMMARY)
+
+        if store_dir:
+            self.nf_lines_parameters.append(build_store_dir_repr(store_dir))
+
         self.nf_lines_parameters.append('')
 
     def build_nextflow_processes(
         self,
         ocrd_processor: List[ProcessorCallArguments],
-        dockerized: bool = False
+        dockerized: bool = False,
+        page_parallel: int = 0,
+        dag: bool = False,
+        resource_profile: Optional[ResourceProfile] = None,
+        container: Optional[str] = None,
+        fusion_groups: Optional[List[List[int]]] = None,
+        shared_workspace: bool = False,
+        scratch: Optional[str] = None,
+        multi_workspace: int = 0,
+        resumable: bool = False,
+        store_dir: Optional[str] = None
     ) -> Tuple[List[str], str]:
+        """Build a process per workflow step, or per group of consecutive steps to be fused into one task.
+
+        In the shared workspace mode, the METS path is passed as value instead of staging the METS file
+        into the task directory. The value is output once the step completed, which orders the steps.
+        If `scratch` is set, the steps run on a copy of the workspace in their scratch task directory.
+        In the multi workspace mode, each step processes up to `multi_workspace` workspaces concurrently,
+        and a failing workspace does not abort the others.
+        In the resumable mode, the METS path is passed as value as well, and each step outputs a stamp file
+        named by its fingerprint, see `build_step_fingerprint`. The stamp is the input of the next step,
+        so that the inputs of the tasks are stable across runs. If `store_dir` is set, the stamps are
+        stored per workspace and output file group and the completed steps are skipped even without `-resume`.
+        """
 
         nf_processes = []
         first_file_grps = "DEFAULT"
-        index = 0
-        for processor in ocrd_processor:
-            nf_process_block = NextflowBlockProcess(processor, index, dockerized)
-            nf_process_block.add_directive('maxForks 1')
-            nf_process_block.add_input_param(f'path {METS_FILE}')
+        upstream_fingerprint = None
+        if fusion_groups is None:
+            fusion_groups = [[index] for index in range(len(ocrd_processor))]
+        for fusion_group in fusion_groups:
+            index = fusion_group[0]
+            if len(fusion_group) == 1:
+                nf_process_block = NextflowBlockProcess(
+                    ocrd_processor[index], index, dockerized, page_parallel=bool(page_parallel))
+            else:
+                nf_process_block = NextflowBlockFusedProcess(
+                    [ocrd_processor[position] for position in fusion_group], index, dockerized,
+                    page_parallel=bool(page_parallel))
+            if container:
+                nf_process_block.add_container_directives()
+            max_forks = None
+            if resource_profile:
+                resources = resource_profile.get(ocrd_processor[index].executable)
+                if len(fusion_group) > 1:
+                    resources = ResourceProfile.combine(
+                        [resource_profile.get(ocrd_processor[position].executable) for position in fusion_group])
+                if not page_parallel:
+                    # Only the page chunks or the workspaces of a step may run concurrently, the tasks of a
+                    # single workspace share the METS file. The workspaces are limited below.
+                    max_forks = resources.pop('maxForks', None)
+                nf_process_block.add_resource_directives(resources)
+            if page_parallel:
+                # Each page chunk has its own METS copy inside the workspace, hence the chunks
+                # are processed concurrently and the METS is passed as a path value, not staged
+                nf_process_block.add_input_param(f'tuple val({PAGE_RANGE}), val({METS_FILE})')
+            elif dag:
+                # Each step works on its own METS copy, the copies of its dependencies are merged into it
+                nf_process_block.add_directive('maxForks 1')
+                nf_process_block.add_input_param(f'val {METS_INPUTS}')
+                self.__add_mets_join(nf_process_block, dockerized)
+            elif multi_workspace:
+                if max_forks:
+                    # E.g. the GPU bound steps, limited by the resource profile across the workspaces
+                    nf_process_block.add_directive(
+                        f'maxForks Math.min({max_forks}, {PARAMS_KEY_MAX_WORKSPACES}.toInteger())')
+                else:
+                    nf_process_block.add_directive(f'maxForks {PARAMS_KEY_MAX_WORKSPACES}.toInteger()')
+                nf_process_block.add_directive("errorStrategy 'ignore'")
+                nf_process_block.add_input_param(f'val {METS_FILE}')
+            elif resumable:
+                # A rerun step overwrites the output of its failed or outdated previous run
+                nf_process_block.add_command_option('--overwrite')
+                fingerprint = build_step_fingerprint(upstream_fingerprint, nf_process_block)
+                nf_process_block.add_directive('maxForks 1')
+                # The stamp files are hashed by their content instead of their path and modification time
+                nf_process_block.add_directive("cache 'deep'")
+                if store_dir:
+                    output_file_grps = nf_process_block.repr_in_workflow[2].strip('"')
+                    nf_process_block.add_directive(f'storeDir "{build_store_dir_path(output_file_grps)}"')
+                if upstream_fingerprint:
+                    nf_process_block.add_input_param(f'tuple val({METS_FILE}), path({UPSTREAM_STAMP})')
+                else:
+                    nf_process_block.add_input_param(f'val {METS_FILE}')
+                nf_process_block.add_script_prologue(f'echo {fingerprint} > {fingerprint}.stamp')
+                upstream_fingerprint = fingerprint
+            elif shared_workspace:
+                nf_process_block.add_directive('maxForks 1')
+                nf_process_block.add_input_param(f'val {METS_FILE}')
+            else:
+                nf_process_block.add_directive('maxForks 1')
+                nf_process_block.add_input_param(f'path {METS_FILE}')
             nf_process_block.add_input_param(f'val {DIR_IN}')
             nf_process_block.add_input_param(f'val {DIR_OUT}')
-            nf_process_block.add_output_param(f'path {METS_FILE}')
+            if page_parallel:
+                nf_process_block.add_output_param(f'tuple val({PAGE_RANGE}), val({METS_FILE})')
+            elif resumable:
+                nf_process_block.add_output_param(f'tuple val({METS_FILE}), path("{upstream_fingerprint}.stamp")')
+            elif dag or shared_workspace or multi_workspace:
+                nf_process_block.add_output_param(f'val {METS_FILE}')
+            else:
+                nf_process_block.add_output_param(f'path {METS_FILE}')
+            if scratch:
+                # Either true for a temporary directory of the node or the path of a (node-local) directory
+                nf_process_block.add_directive(f"scratch {scratch if scratch == 'true' else repr(scratch)}")
+                nf_process_block.use_scratch_workspace()
             self.nf_lines_processes.append(nf_process_block.file_representation())
+            self.nf_process_blocks.append(nf_process_block)
 
             # Take the input_file_grp of the first processor and change the value of the
             # REPR_INPUT_FILE_GRP to set the desired file group as default
@@ -80,21 +243,156 @@ class NextflowFileExecutable:
 
             # This list is used when building the workflow
             nf_processes.append(nf_process_block.repr_in_workflow)
-            self.logger.info(f"Successfully created Nextflow Process: {nf_process_block.nf_process_name}")
-            index += 1
+            self.logger.info("Successfully created Nextflow Process: %s", nf_process_block.nf_process_name)
 
+        count('processes', len(nf_processes))
         return nf_processes, first_file_grps
 
-    def build_main_workflow(self, nf_processes: List[str]):
-        nf_workflow_block = NextflowBlockWorkflow("main", nf_processes)
+    def deduplicate_processes(self, module_file_name: str):
+        """Move the process definitions of the steps into a module file, keeping one per distinct template.
+
+        Steps sharing the same template (executable, parameters, directives, etc.) are instantiated
+        from the same module process with an include alias named after the step, so the workflow
+        block stays unchanged. Must be called before building any helper processes.
+        """
+        templates = {}
+        template_counts = {}
+        aliases = []
+        for nf_process_block in self.nf_process_blocks:
+            step_name = nf_process_block.nf_process_name
+            # The representation without the first line, holding the process name
+            template_key = nf_process_block.file_representation().split('\n', 1)[1]
+            if template_key not in templates:
+                executable_name = step_name.rsplit('_', 1)[0]
+                template_index = template_counts.get(executable_name, 0)
+                template_counts[executable_name] = template_index + 1
+                template_name = f'{executable_name}_t{template_index}'
+                templates[template_key] = template_name
+                nf_process_block.nf_process_name = template_name
+                self.nf_lines_module.append(nf_process_block.file_representation())
+                nf_process_block.nf_process_name = step_name
+            aliases.append(f'{templates[template_key]} as {step_name}')
+
+        self.module_file_name = module_file_name
+        for alias in aliases:
+            self.nf_lines_includes.append(f"include {{ {alias} }} from './{module_file_name}'")
+        self.nf_lines_includes.append('')
+        self.nf_lines_processes = []
+        self.logger.info(f"Deduplicated {len(aliases)} Nextflow Processes to {len(templates)} in: {module_file_name}")
+
+    def build_page_chunk_processes(self, dockerized: bool = False, container: Optional[str] = None):
+        """Build the processes listing the page ids, splitting the METS per page chunk and merging it back"""
+        docker_prefix = f'${{{PARAMS_KEY_DOCKER_COMMAND}}} ' if dockerized else ''
+
+        list_pages_block = NextflowBlockHelperProcess(
+            NF_PROCESS_LIST_PAGES, f'ocrd workspace -m ${{{METS_FILE}}} list-page', dockerized)
+        if container:
+            list_pages_block.add_container_directives()
+        list_pages_block.add_input_param(f'val {METS_FILE}')
+        list_pages_block.add_output_param('stdout')
+        self.nf_lines_processes.append(list_pages_block.file_representation())
+
+        split_mets_block = NextflowBlockHelperProcess(
+            NF_PROCESS_SPLIT_METS, f'cp ${{{PARAMS_KEY_METS_PATH}}} ${{{METS_CHUNK}}}')
+        split_mets_block.add_input_param(f'val {PAGE_RANGE}')
+        split_mets_block.add_output_param(f'tuple val({PAGE_RANGE}), val({METS_CHUNK})')
+        split_mets_block.add_script_statement(f"{METS_CHUNK} = {build_mets_copy_path('chunk${task.index}')}")
+        self.nf_lines_processes.append(split_mets_block.file_representation())
+
+        merge_mets_block = NextflowBlockHelperProcess(NF_PROCESS_MERGE_METS, '${merge_commands}')
+        if container:
+            merge_mets_block.add_container_directives()
+        merge_mets_block.add_directive('maxForks 1')
+        merge_mets_block.add_input_param(f'val {PAGE_CHUNKS}')
+        merge_mets_block.add_script_statement(
+            f'merge_commands = {PAGE_CHUNKS}.collect {{ {PAGE_RANGE}, {METS_CHUNK} -> '
+            f'"{docker_prefix}ocrd workspace -m ${{{PARAMS_KEY_METS_PATH}}} merge --force --no-copy-files '
+            f'-g ${{{PAGE_RANGE}}} ${{{METS_CHUNK}}} && rm ${{{METS_CHUNK}}}" }}.join(" && ")')
+        self.nf_lines_processes.append(merge_mets_block.file_representation())
+        self.logger.info(f"Successfully created Nextflow Processes for page parallel execution")
+
+    @staticmethod
+    def __add_mets_join(nf_process_block: NextflowBlockProcess, dockerized: bool = False):
+        docker_prefix = f'${{{PARAMS_KEY_DOCKER_COMMAND}}} ' if dockerized else ''
+        # The copy is named after the process at runtime, so that deduplicated steps share their template
+        nf_process_block.add_script_statement(
+            f"{METS_FILE} = {build_mets_copy_path(TASK_PROCESS_NAME)}")
+        nf_process_block.add_script_statement(f"{METS_INPUTS}_list = [{METS_INPUTS}].flatten()")
+        nf_process_block.add_script_statement(
+            f'merge_commands = {METS_INPUTS}_list.drop(1).collect {{ '
+            f'"{docker_prefix}ocrd workspace -m ${{{METS_FILE}}} merge --force --no-copy-files ${{it}}" }}.join("\\n")')
+        nf_process_block.add_script_prologue(f'cp ${{{METS_INPUTS}_list[0]}} ${{{METS_FILE}}}')
+        nf_process_block.add_script_prologue('${merge_commands}')
+
+    def build_join_process(self, nf_processes: List[str], dockerized: bool = False, container: Optional[str] = None):
+        """Build the process merging the METS copies of the last steps back into the METS file"""
+        docker_prefix = f'${{{PARAMS_KEY_DOCKER_COMMAND}}} ' if dockerized else ''
+        join_mets_block = NextflowBlockHelperProcess(
+            NF_PROCESS_JOIN_METS, '${merge_commands} && rm -f ${mets_copies}')
+        if container:
+            join_mets_block.add_container_directives()
+        join_mets_block.add_directive('maxForks 1')
+        join_mets_block.add_input_param(f'val {METS_INPUTS}')
+        join_mets_block.add_script_statement(
+            f'merge_commands = [{METS_INPUTS}].flatten().collect {{ '
+            f'"{docker_prefix}ocrd workspace -m ${{{PARAMS_KEY_METS_PATH}}} merge --force --no-copy-files ${{it}}" }}'
+            f'.join(" && ")')
+        process_names = ', '.join(f"'{nf_process[0]}'" for nf_process in nf_processes)
+        join_mets_block.add_script_statement(
+            f"mets_copies = [{process_names}].collect {{ {build_mets_copy_path('${it}')} }}.join(' ')")
+        self.nf_lines_processes.append(join_mets_block.file_representation())
+        self.logger.info(f"Successfully created Nextflow Process: {NF_PROCESS_JOIN_METS}")
+
+    def build_main_workflow(
+        self,
+        nf_processes: List[str],
+        page_parallel: int = 0,
+        dependency_graph: Optional[List[List[int]]] = None,
+        multi_workspace: int = 0
+    ):
+        nf_workflow_block = NextflowBlockWorkflow(
+            "main", nf_processes, page_parallel=bool(page_parallel), dependency_graph=dependency_graph,
+            multi_workspace=bool(multi_workspace))
         self.nf_lines_workflow.append(nf_workflow_block.file_representation())
 
-    def produce_nextflow_file(self, output_path: str):
-        # Write Nextflow line tokens to an output file
+    def build_container_config(self, container: str, config_file_name: str):
+        """Build the Nextflow config enabling the container engine of the native container mode"""
+        self.config_file_name = config_file_name
+        self.nf_lines_config.extend(build_container_config(container))
+        self.logger.info(f"Successfully created Nextflow config for the container engine: {container}")
+
+    def iter_file_representation(self) -> Iterator[str]:
+        nf_lines = chain(self.nf_lines_parameters, self.nf_lines_includes, self.nf_lines_processes, self.nf_lines_workflow)
+        for nextflow_line in nf_lines:
+            yield f'{nextflow_line}\n'
+
+    def file_representation(self) -> str:
+        return ''.join(self.iter_file_representation())
+
+    def module_representation(self) -> str:
+        return ''.join(f'{nextflow_line}\n' for nextflow_line in self.nf_lines_module)
+
+    def config_representation(self) -> str:
+        return ''.join(f'{nextflow_line}\n' for nextflow_line in self.nf_lines_config)
+
+    def produce_nextflow_file(self, output_path: str) -> List[str]:
+        """Write the Nextflow script and next to it the module file and the config file, if any.
+
+        Returns the paths of the written files.
+        """
+        # Stream the Nextflow line tokens through a single buffered writer to the output file
         with open(output_path, mode='w', encoding='utf-8') as nextflow_file:
-            for nextflow_line in self.nf_lines_parameters:
-                nextflow_file.write(f'{nextflow_line}\n')
-            for nextflow_line in self.nf_lines_processes:
-                nextflow_file.write(f'{nextflow_line}\n')
-            for nextflow_line in self.nf_lines_workflow:
-                nextflow_file.write(f'{nextflow_line}\n')
+            nextflow_file.writelines(self.iter_file_representation())
+        written_paths = [output_path]
+        companion_files = [
+            (self.module_file_name, self.module_representation),
+            (self.config_file_name, self.config_representation)
+        ]
+        for file_name, representation in companion_files:
+            if not file_name:
+                continue
+            file_path = join(dirname(output_path), file_name)
+            with open(file_path, mode='w', encoding='utf-8') as companion_file:
+                companion_file.write(representation())
+            written_paths.append(file_path)
+        return written_paths
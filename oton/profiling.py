@@ -0,0 +1,222 @@
+from csv import DictReader
+from math import ceil
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .instrumentation import get_logger
+from .models.constants import FUSED_PROCESS_PREFIX
+from .models.nf_block_process import NextflowBlockProcess
+from .utils import DURATION_UNITS_MS, MEMORY_UNITS_BYTES, parse_duration, parse_memory
+from .validators.ocrd_validator import ProcessorCallArguments
+
+__all__ = [
+    "TaskStatistics",
+    "aggregate_by_executable",
+    "aggregate_traces",
+    "format_duration",
+    "format_memory",
+    "iter_trace_records",
+    "suggest_resource_profile"
+]
+
+logger = get_logger(__name__)
+
+# Only completed tasks were measured in the run of the trace, cached tasks repeat old measurements
+MEASURED_STATUS = 'COMPLETED'
+
+# The task name of the n-th execution of a process, e.g. "ocrd_cis_ocropy_dewarp_6 (3)"
+TASK_SUFFIX_PATTERN = re.compile(r'\s*\(.*\)$')
+# The process of fused steps, e.g. "ocrd_fused_0_3" running the steps 0 to 3 in one task
+FUSED_PROCESS_PATTERN = re.compile(rf'^{FUSED_PROCESS_PREFIX}(\d+)_(\d+)$')
+
+
+def parse_cpu_percentage(value: str) -> Optional[float]:
+    value = value.strip().rstrip('%')
+    if not value or value == '-':
+        return None
+    return float(value)
+
+
+def format_duration(milliseconds: Optional[float]) -> str:
+    if milliseconds is None:
+        return '-'
+    if milliseconds < DURATION_UNITS_MS['s']:
+        return f'{milliseconds:.0f}ms'
+    if milliseconds < DURATION_UNITS_MS['m']:
+        return f"{milliseconds / DURATION_UNITS_MS['s']:.1f}s"
+    if milliseconds < DURATION_UNITS_MS['h']:
+        return f"{milliseconds / DURATION_UNITS_MS['m']:.1f}m"
+    return f"{milliseconds / DURATION_UNITS_MS['h']:.1f}h"
+
+
+def format_memory(size: Optional[float]) -> str:
+    if size is None:
+        return '-'
+    for unit in ('PB', 'TB', 'GB', 'MB', 'KB'):
+        if size >= MEMORY_UNITS_BYTES[unit]:
+            return f'{size / MEMORY_UNITS_BYTES[unit]:.1f} {unit}'
+    return f'{size:.0f} B'
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    # Nearest rank percentile, the values must be sorted
+    if not values:
+        return None
+    return values[max(0, ceil(percent / 100 * len(values)) - 1)]
+
+
+def iter_trace_records(trace_paths: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """Stream the task records of the tab separated Nextflow trace files, one by one"""
+    for trace_path in trace_paths:
+        with open(trace_path, mode='r', encoding='utf-8', newline='') as trace_file:
+            reader = DictReader(trace_file, delimiter='\t')
+            if not reader.fieldnames or 'name' not in reader.fieldnames:
+                raise ValueError(f"Not a Nextflow trace file, the 'name' column is missing: {trace_path}")
+            yield from reader
+
+
+class TaskStatistics:
+    """The measurements of the tasks of a workflow step or of an executable"""
+
+    def __init__(
+        self,
+        name: str,
+        executable: str,
+        step: Optional[ProcessorCallArguments] = None,
+        fused_steps: Optional[List[ProcessorCallArguments]] = None
+    ):
+        self.name = name
+        self.executable = executable
+        # The workflow step, if the task could be mapped back to the OCR-D workflow
+        self.step = step
+        # The workflow steps run by the task of fused steps, whose measurements belong to no single executable
+        self.fused_steps: List[ProcessorCallArguments] = fused_steps or []
+        self.failed: int = 0
+        self.realtimes: List[float] = []
+        self.cpu_percentages: List[float] = []
+        self.peak_rss: List[float] = []
+
+    def add_record(self, record: Dict[str, str]):
+        if record.get('status', MEASURED_STATUS) != MEASURED_STATUS:
+            if record.get('status') in ('FAILED', 'ABORTED'):
+                self.failed += 1
+            return
+        # The realtime is the wall time of the task itself, the duration includes the scheduling
+        realtime = parse_duration(record.get('realtime') or record.get('duration') or '-')
+        if realtime is not None:
+            self.realtimes.append(realtime)
+        cpu_percentage = parse_cpu_percentage(record.get('%cpu') or '-')
+        if cpu_percentage is not None:
+            self.cpu_percentages.append(cpu_percentage)
+        peak_rss = parse_memory(record.get('peak_rss') or '-')
+        if peak_rss is not None:
+            self.peak_rss.append(peak_rss)
+
+    def merge(self, other: 'TaskStatistics'):
+        self.failed += other.failed
+        self.realtimes.extend(other.realtimes)
+        self.cpu_percentages.extend(other.cpu_percentages)
+        self.peak_rss.extend(other.peak_rss)
+
+    @property
+    def count(self) -> int:
+        return len(self.realtimes)
+
+    @property
+    def total_realtime(self) -> float:
+        return sum(self.realtimes)
+
+    @property
+    def mean_cpu_percentage(self) -> Optional[float]:
+        return sum(self.cpu_percentages) / len(self.cpu_percentages) if self.cpu_percentages else None
+
+    @property
+    def max_peak_rss(self) -> Optional[float]:
+        return max(self.peak_rss) if self.peak_rss else None
+
+    def realtime_percentile(self, percent: float) -> Optional[float]:
+        return percentile(sorted(self.realtimes), percent)
+
+    def cpu_percentile(self, percent: float) -> Optional[float]:
+        return percentile(sorted(self.cpu_percentages), percent)
+
+    def peak_rss_percentile(self, percent: float) -> Optional[float]:
+        return percentile(sorted(self.peak_rss), percent)
+
+
+def aggregate_traces(
+    trace_paths: Iterable[str],
+    processors: Optional[List[ProcessorCallArguments]] = None
+) -> Dict[str, TaskStatistics]:
+    """Aggregate the tasks of the trace files per workflow step, keyed by the Nextflow process name.
+
+    If the processors of the converted OCR-D workflow are given, the steps are mapped back to them.
+    Otherwise, the executable is derived from the process name. Tasks of the helper processes,
+    e.g., of the page parallel mode, are aggregated as well, but have no step. Tasks of fused steps
+    are mapped to all of their steps and keep the process name as executable, so that they are not
+    mistaken for the tasks of an OCR-D executable.
+    """
+    steps_by_name: Dict[str, ProcessorCallArguments] = {}
+    for index, processor in enumerate(processors or []):
+        steps_by_name[NextflowBlockProcess.build_process_name(processor.executable, index)] = processor
+
+    statistics: Dict[str, TaskStatistics] = {}
+    for record in iter_trace_records(trace_paths):
+        # Strip the execution suffix and the name of the enclosing workflow, if any
+        name = TASK_SUFFIX_PATTERN.sub('', record['name']).rsplit(':', 1)[-1]
+        if name not in statistics:
+            step = steps_by_name.get(name, None)
+            fused_match = FUSED_PROCESS_PATTERN.match(name)
+            fused_steps = None
+            if step:
+                executable = step.executable
+            elif fused_match:
+                executable = name
+                first_index, last_index = int(fused_match.group(1)), int(fused_match.group(2))
+                fused_steps = (processors or [])[first_index:last_index + 1]
+            elif re.search(r'_\d+$', name):
+                executable = name.rsplit('_', 1)[0].replace('_', '-')
+            else:
+                executable = name
+            statistics[name] = TaskStatistics(name, executable, step, fused_steps)
+        statistics[name].add_record(record)
+    logger.info(f"Aggregated the tasks of {len(statistics)} Nextflow processes")
+    return statistics
+
+
+def aggregate_by_executable(step_statistics: Dict[str, TaskStatistics]) -> Dict[str, TaskStatistics]:
+    statistics: Dict[str, TaskStatistics] = {}
+    for step in step_statistics.values():
+        if step.executable not in statistics:
+            statistics[step.executable] = TaskStatistics(step.executable, step.executable)
+        statistics[step.executable].merge(step)
+    return statistics
+
+
+def suggest_resource_profile(
+    executable_statistics: Dict[str, TaskStatistics],
+    percent: float = 95,
+    headroom: float = 1.25
+) -> Dict[str, dict]:
+    """Suggest the resources of the OCR-D executables from the observed percentiles.
+
+    The cpus are the used cores, the memory is the peak RSS with some headroom rounded up to
+    whole GB, and the time is twice the wall time rounded up to whole minutes. The result has
+    the layout of a resource profile file, see `ResourceProfile`.
+    """
+    profile = {}
+    for executable, statistics in sorted(executable_statistics.items()):
+        if not executable.startswith('ocrd-') or not statistics.count:
+            continue
+        resources = {}
+        cpu_percentage = statistics.cpu_percentile(percent)
+        if cpu_percentage is not None:
+            resources['cpus'] = max(1, ceil(cpu_percentage / 100))
+        peak_rss = statistics.peak_rss_percentile(percent)
+        if peak_rss is not None:
+            resources['memory'] = f"{max(1, ceil(peak_rss * headroom / MEMORY_UNITS_BYTES['GB']))} GB"
+        realtime = statistics.realtime_percentile(percent)
+        if realtime is not None:
+            resources['time'] = f"{max(1, ceil(2 * realtime / DURATION_UNITS_MS['m']))}m"
+        profile[executable] = resources
+    return profile
@@ -0,0 +1,149 @@
+from hashlib import sha256
+from json import dumps, loads
+from os import getpid, makedirs, replace, stat
+from os.path import join
+from threading import Lock
+from typing import Dict, Optional
+
+from .constants import OCRD_ALL_JSON_FILE, OTON_CACHE_DIR
+from .instrumentation import get_logger
+
+__all__ = [
+    "OCRD_ALL_JSON",
+    "OcrdToolRegistry"
+]
+
+logger = get_logger(__name__)
+
+INDEX_FILE_NAME = 'ocrd_all_tool.idx'
+
+
+class OcrdToolRegistry:
+    """Lazy, per-executable view of the `ocrd_all_tool.json` registry.
+
+    On first use an index file is built in the cache directory. It consists of a single
+    JSON header line (content hash of the source, and byte offset and length of each tool
+    description) followed by the concatenated tool descriptions. A lookup then only reads
+    and parses the description of the requested executable. The index is rebuilt whenever
+    the content hash of the source file changes. If the cache directory is not writable,
+    the whole registry is loaded into memory instead.
+    """
+
+    def __init__(self, source_path: str, cache_dir: Optional[str] = OTON_CACHE_DIR):
+        self.source_path = source_path
+        self.cache_dir = cache_dir
+        self.index_path = join(cache_dir, INDEX_FILE_NAME) if cache_dir else None
+        self._header: Optional[dict] = None
+        self._data_offset: int = 0
+        self._tools: Dict[str, dict] = {}
+        self._fully_loaded: bool = False
+        # Guards the (re)building of the index when the registry is shared by threads
+        self._lock = Lock()
+
+    @property
+    def version(self) -> str:
+        """The content hash of the source registry file"""
+        return self._load_header()['sha256']
+
+    def get(self, executable: str, default=None) -> Optional[dict]:
+        if executable in self._tools:
+            return self._tools[executable]
+        header = self._load_header()
+        if self._fully_loaded:
+            return self._tools.get(executable, default)
+        location = header['offsets'].get(executable, None)
+        if location is None:
+            return default
+        start, length = location
+        with open(self.index_path, mode='rb') as index_file:
+            index_file.seek(self._data_offset + start)
+            tool_json = loads(index_file.read(length))
+        self._tools[executable] = tool_json
+        return tool_json
+
+    def __getitem__(self, executable: str) -> dict:
+        tool_json = self.get(executable)
+        if tool_json is None:
+            raise KeyError(executable)
+        return tool_json
+
+    def __contains__(self, executable: str) -> bool:
+        return executable in self.keys()
+
+    def keys(self):
+        header = self._load_header()
+        if self._fully_loaded:
+            return self._tools.keys()
+        return header['offsets'].keys()
+
+    def _load_header(self) -> dict:
+        if self._header is not None:
+            return self._header
+        with self._lock:
+            if self._header is None:
+                self._header = self._locate_index()
+        return self._header
+
+    def _locate_index(self) -> dict:
+        source_stat = stat(self.source_path)
+        header = None
+        if self.index_path:
+            header = self._read_index_header()
+            if header and header['size'] == source_stat.st_size and header['mtime_ns'] == source_stat.st_mtime_ns:
+                return header
+        with open(self.source_path, mode='rb') as source_file:
+            source_bytes = source_file.read()
+        source_hash = sha256(source_bytes).hexdigest()
+        if header and header['sha256'] == source_hash:
+            # Only the file metadata changed, the index is still valid
+            return header
+        return self._build_index(source_bytes, source_hash, source_stat)
+
+    def _read_index_header(self) -> Optional[dict]:
+        try:
+            with open(self.index_path, mode='rb') as index_file:
+                header_line = index_file.readline()
+                self._data_offset = index_file.tell()
+            return loads(header_line)
+        except (OSError, ValueError):
+            return None
+
+    def _build_index(self, source_bytes: bytes, source_hash: str, source_stat) -> dict:
+        all_tools = loads(source_bytes)
+        offsets = {}
+        chunks = []
+        position = 0
+        for executable, tool_json in all_tools.items():
+            chunk = dumps(tool_json, separators=(',', ':')).encode('utf-8')
+            offsets[executable] = [position, len(chunk)]
+            chunks.append(chunk)
+            position += len(chunk)
+        header = {
+            'sha256': source_hash,
+            'size': source_stat.st_size,
+            'mtime_ns': source_stat.st_mtime_ns,
+            'offsets': offsets
+        }
+        if not self.index_path:
+            self._tools = all_tools
+            self._fully_loaded = True
+            return header
+        header_line = dumps(header, separators=(',', ':')).encode('utf-8') + b'\n'
+        try:
+            makedirs(self.cache_dir, exist_ok=True)
+            # Write to a process specific file first, so that concurrent builders do not clash
+            tmp_path = f'{self.index_path}.{getpid()}.tmp'
+            with open(tmp_path, mode='wb') as index_file:
+                index_file.write(header_line)
+                index_file.write(b''.join(chunks))
+            replace(tmp_path, self.index_path)
+            self._data_offset = len(header_line)
+            logger.debug("Built ocrd tool registry index: %s", self.index_path)
+        except OSError as error:
+            logger.warning(f"Failed to write ocrd tool registry index, loading it in memory: {error}")
+            self._tools = all_tools
+            self._fully_loaded = True
+        return header
+
+
+OCRD_ALL_JSON = OcrdToolRegistry(OCRD_ALL_JSON_FILE)
@@ -0,0 +1,92 @@
+from json import load
+from math import ceil
+from typing import Dict, List, Optional
+
+from .constants import RESOURCE_PROFILE_FILE
+from .instrumentation import get_logger
+from .utils import DURATION_UNITS_MS, parse_duration, parse_memory
+
+__all__ = [
+    "DEFAULT_ENTRY",
+    "RESOURCE_KEYS",
+    "ResourceProfile"
+]
+
+logger = get_logger(__name__)
+
+# The entry applied to the executables without an own entry
+DEFAULT_ENTRY = 'default'
+# The supported resources and their types
+RESOURCE_KEYS = {
+    'cpus': int,
+    'memory': str,
+    'time': str,
+    'maxForks': int
+}
+
+
+class ResourceProfile:
+    """The compute resources requested per OCR-D executable.
+
+    A profile maps executable names (e.g. `ocrd-calamari-recognize`) and the `default` entry
+    to the resources `cpus`, `memory`, `time` and `maxForks`. The resources of an executable
+    are those of the `default` entry, overridden by its own entry.
+    """
+
+    def __init__(self, entries: Dict[str, dict]):
+        for name, resources in entries.items():
+            ResourceProfile.validate_entry(name, resources)
+        self.entries: Dict[str, dict] = entries
+
+    @staticmethod
+    def validate_entry(name: str, resources: dict):
+        if not isinstance(resources, dict):
+            raise ValueError(f"Resources of '{name}' must be an object, got: {resources}")
+        for key, value in resources.items():
+            if key not in RESOURCE_KEYS:
+                raise ValueError(f"Unknown resource '{key}' of '{name}', expected one of: {list(RESOURCE_KEYS)}")
+            expected_type = RESOURCE_KEYS[key]
+            if not isinstance(value, expected_type) or isinstance(value, bool):
+                raise ValueError(f"Resource '{key}' of '{name}' must be of type {expected_type.__name__}: {value}")
+            if expected_type is int and value < 1:
+                raise ValueError(f"Resource '{key}' of '{name}' must be positive: {value}")
+
+    @staticmethod
+    def load(profile_path: Optional[str] = None) -> 'ResourceProfile':
+        """Load the built-in profile, overridden per resource by the entries of the profile file, if any"""
+        with open(RESOURCE_PROFILE_FILE, mode='r', encoding='utf-8') as profile_file:
+            entries = load(profile_file)
+        if profile_path:
+            with open(profile_path, mode='r', encoding='utf-8') as profile_file:
+                user_entries = load(profile_file)
+            if not isinstance(user_entries, dict):
+                raise ValueError(f"The resource profile must be an object: {profile_path}")
+            for name, resources in user_entries.items():
+                ResourceProfile.validate_entry(name, resources)
+                entries[name] = {**entries.get(name, {}), **resources}
+            logger.info(f"Loaded resource profile: {profile_path}")
+        return ResourceProfile(entries)
+
+    def get(self, executable: str) -> dict:
+        return {**self.entries.get(DEFAULT_ENTRY, {}), **self.entries.get(executable, {})}
+
+    @staticmethod
+    def combine(resources_list: List[dict]) -> dict:
+        """Combine the resources of steps running back to back in a single task.
+
+        The task needs the most cpus and memory of the steps, the sum of their times
+        and the fewest concurrent forks of the steps.
+        """
+        combined = {}
+        for resources in resources_list:
+            if 'cpus' in resources:
+                combined['cpus'] = max(combined.get('cpus', 0), resources['cpus'])
+            if 'memory' in resources and (
+                    'memory' not in combined or parse_memory(resources['memory']) > parse_memory(combined['memory'])):
+                combined['memory'] = resources['memory']
+            if 'maxForks' in resources:
+                combined['maxForks'] = min(combined.get('maxForks', resources['maxForks']), resources['maxForks'])
+        times = [parse_duration(resources['time']) for resources in resources_list if 'time' in resources]
+        if times:
+            combined['time'] = f"{ceil(sum(times) / DURATION_UNITS_MS['m'])}m"
+        return combined
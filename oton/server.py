@@ -0,0 +1,96 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from logging import DEBUG
+from os import remove
+from os.path import exists
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Optional
+
+from .converter import Converter
+from .instrumentation import get_logger
+from .registry import OCRD_ALL_JSON
+from .validators.ocrd_validator import OCRDValidator
+
+__all__ = [
+    "ConversionRequestHandler",
+    "create_server"
+]
+
+logger = get_logger(__name__)
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """Handles the conversion and validation requests of the `oton serve` daemon.
+
+    Both endpoints expect a POST request with a JSON body holding the content of the
+    OCR-D workflow under `workflow`:
+    - `/convert` accepts the additional options `dockerized`, `page_parallel`, `dag`, `existing_groups`,
+      `keep_groups`, `prune_dead_steps` and `merge_duplicates` and responds with the Nextflow script under `nextflow`
+    - `/validate` accepts the additional option `existing_groups` and responds with `valid` set to true
+    The file groups are given as lists.
+    Failures are responded with status 400 and the message under `error`.
+    """
+
+    def do_POST(self):
+        if self.path not in ('/convert', '/validate'):
+            self.__respond(404, {'error': f"Unknown endpoint: {self.path}"})
+            return
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            request = loads(self.rfile.read(content_length) or b'{}')
+            workflow = request['workflow']
+            if self.path == '/convert':
+                nextflow = Converter.convert_string(
+                    workflow,
+                    dockerized=bool(request.get('dockerized', False)),
+                    page_parallel=int(request.get('page_parallel', 0)),
+                    dag=bool(request.get('dag', False)),
+                    existing_file_grps=request.get('existing_groups'),
+                    keep_file_grps=request.get('keep_groups'),
+                    prune_dead_steps=bool(request.get('prune_dead_steps', False)),
+                    merge_duplicates=bool(request.get('merge_duplicates', False))
+                )
+                self.__respond(200, {'nextflow': nextflow})
+            else:
+                OCRDValidator(existing_file_grps=request.get('existing_groups')).validate_string(workflow)
+                self.__respond(200, {'valid': True})
+        except KeyError as error:
+            self.__respond(400, {'error': f"Missing request field: {error}"})
+        except Exception as error:
+            self.__respond(400, {'error': f"{type(error).__name__}: {error}"})
+
+    def __respond(self, status: int, body: dict):
+        encoded_body = dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def address_string(self):
+        # The client address of Unix socket connections is not a (host, port) tuple
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if logger.isEnabledFor(DEBUG):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('unix', 0)
+
+
+def create_server(host: str = '127.0.0.1', port: int = 8090, socket_path: Optional[str] = None):
+    """Create the conversion server listening on the Unix socket if given, else on the host and port"""
+    # Load the registry index upfront, so that the first request does not pay for it
+    OCRD_ALL_JSON.keys()
+    if socket_path:
+        if exists(socket_path):
+            remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, ConversionRequestHandler)
+    return ThreadingHTTPServer((host, port), ConversionRequestHandler)
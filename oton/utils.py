@@ -1,15 +1,29 @@
-import logging
-from typing import List, Tuple
+from glob import glob
+from hashlib import sha256
+import re
+from os import stat
+from os.path import dirname, isdir, isfile, join
+from time import sleep
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-from .constants import OTON_LOG_FORMAT, OTON_LOG_LEVEL
+from .instrumentation import get_logger
 
 __all__ = [
-    "read_from_file"
+    "collect_workflow_files",
+    "parse_duration",
+    "parse_memory",
+    "read_from_file",
+    "read_from_lines",
+    "read_from_string",
+    "watch_file_changes"
 ]
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.getLevelName(OTON_LOG_LEVEL))
-logging.basicConfig(format=OTON_LOG_FORMAT)
+logger = get_logger(__name__)
+
+DURATION_UNITS_MS = {'ms': 1, 's': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000}
+DURATION_PATTERN = re.compile(r'([\d.]+)\s*(ms|s|m|h|d)')
+MEMORY_UNITS_BYTES = {'B': 1, 'KB': 2 ** 10, 'MB': 2 ** 20, 'GB': 2 ** 30, 'TB': 2 ** 40, 'PB': 2 ** 50}
+MEMORY_PATTERN = re.compile(r'([\d.]+)\s*([KMGTP]?B)')
 
 
 def purify_line(line):
@@ -24,14 +38,110 @@ def purify_line(line):
     return cleaned_line
 
 
-def read_from_file(input_file: str) -> Tuple[str, List[str]]:
+def read_from_lines(lines: Iterable[str]) -> Tuple[str, List[str]]:
     file_lines = []
-    with open(input_file, mode='r', encoding='utf-8') as ocrd_file:
-        for line in ocrd_file:
-            purified_line = purify_line(line)
-            if len(purified_line) > 0:
-                file_lines.append(purified_line)
+    for line in lines:
+        purified_line = purify_line(line)
+        if len(purified_line) > 0:
+            file_lines.append(purified_line)
+    if not file_lines:
+        raise ValueError("The OCR-D workflow is empty")
 
     ocrd_process_command = file_lines[0]
     processor_tasks = file_lines[1:]
     return ocrd_process_command, processor_tasks
+
+
+def read_from_file(input_file: str) -> Tuple[str, List[str]]:
+    with open(input_file, mode='r', encoding='utf-8') as ocrd_file:
+        return read_from_lines(ocrd_file)
+
+
+def read_from_string(workflow: str) -> Tuple[str, List[str]]:
+    return read_from_lines(workflow.splitlines())
+
+
+def collect_workflow_files(source: str) -> List[str]:
+    """Resolve a directory, a glob pattern or a manifest file to a list of workflow files.
+
+    A directory yields all of its `*.txt` files. A manifest is a text file with one
+    workflow path per line, empty lines and lines starting with `#` are ignored.
+    Relative paths of a manifest are relative to the directory of the manifest.
+    Raises a `FileNotFoundError` naming the path if the source or an entry of the manifest does not exist.
+    """
+    if isdir(source):
+        return sorted(glob(join(source, '*.txt')))
+    if any(char in source for char in '*?['):
+        workflow_files = sorted(glob(source))
+        if not workflow_files:
+            raise FileNotFoundError(f"No files match the pattern: {source}")
+        return workflow_files
+    if not isfile(source):
+        raise FileNotFoundError(f"Neither a directory nor a manifest file: {source}")
+    with open(source, mode='r', encoding='utf-8') as manifest_file:
+        entries = [line.strip() for line in manifest_file if line.strip() and not line.strip().startswith('#')]
+    workflow_files = [join(dirname(source), entry) for entry in entries]
+    for workflow_file in workflow_files:
+        if not isfile(workflow_file):
+            raise FileNotFoundError(f"Workflow file listed in the manifest {source} not found: {workflow_file}")
+    return workflow_files
+
+
+def watch_file_changes(file_path: str, interval: float = 1.0) -> Iterator[str]:
+    """Yield the path of the file once initially and then whenever its content changes.
+
+    The file is polled every `interval` seconds. Its content is hashed only when its
+    modification time or size changed, so touching the file does not trigger a change.
+    """
+    last_stat: Optional[Tuple[int, int]] = None
+    last_hash: Optional[str] = None
+    while True:
+        try:
+            file_stat = stat(file_path)
+            current_stat = (file_stat.st_mtime_ns, file_stat.st_size)
+        except OSError:
+            current_stat = None
+        if current_stat is not None and current_stat != last_stat:
+            last_stat = current_stat
+            with open(file_path, mode='rb') as watched_file:
+                current_hash = sha256(watched_file.read()).hexdigest()
+            if current_hash != last_hash:
+                last_hash = current_hash
+                yield file_path
+        sleep(interval)
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse a duration of Nextflow traces and directives, e.g. `1h 2m 3s`, to milliseconds.
+
+    Plain numbers are taken as milliseconds, as in raw traces. Missing values (`-`) yield None.
+    """
+    value = value.strip()
+    if not value or value == '-':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        raise ValueError(f"Invalid duration: {value}")
+    return sum(float(amount) * DURATION_UNITS_MS[unit] for amount, unit in parts)
+
+
+def parse_memory(value: str) -> Optional[float]:
+    """Parse a memory size of Nextflow traces and directives, e.g. `1.2 GB`, to bytes.
+
+    Plain numbers are taken as bytes, as in raw traces. Missing values (`-`) yield None.
+    """
+    value = value.strip()
+    if not value or value == '-':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = MEMORY_PATTERN.fullmatch(value)
+    if not match:
+        raise ValueError(f"Invalid memory size: {value}")
+    return float(match.group(1)) * MEMORY_UNITS_BYTES[match.group(2)]
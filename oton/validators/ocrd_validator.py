@@ -1,17 +1,29 @@
 from copy import deepcopy
+from functools import lru_cache
 import json
-from typing import List, Optional
-from shlex import split as shlex_split
+from logging import DEBUG
+from typing import List, Optional, TYPE_CHECKING
 
+from jsonschema import Draft6Validator
+from ocrd_models import ValidationReport
 from ocrd_validators import ParameterValidator
 from ocrd_utils import parse_json_string_or_file, set_json_key_value_overrides
 
-from ..constants import OCRD_ALL_JSON
+from ..cache import ValidationCache
+from ..constants import OTON_VALIDATION_CACHE
+from ..instrumentation import count, get_logger, span
+from ..registry import OCRD_ALL_JSON
 from .validator_utils import (
+    split_arguments,
     validate_file_path,
     validate_ocrd_process_command,
 )
-from ..utils import read_from_file
+from ..utils import read_from_file, read_from_string
+
+if TYPE_CHECKING:
+    from ..ir import WorkflowIR
+
+logger = get_logger(__name__)
 
 
 # This class is based on ocrd.task_sequence.ProcessorTask
@@ -35,12 +47,17 @@ class ProcessorCallArguments:
         self.output_file_grps = output_file_grps
         self.parameters = parameters
 
-        self.ocrd_tool_json = OCRD_ALL_JSON.get(self.executable, None)
-        if not self.ocrd_tool_json:
+        ocrd_tool_json = OCRD_ALL_JSON.get(self.executable, None)
+        if not ocrd_tool_json:
             raise ValueError(f"Ocrd tool JSON of '{self.executable}' not found!")
-        if 'output_file_grp' in self.ocrd_tool_json and not self.output_file_grps:
+        if 'output_file_grp' in ocrd_tool_json and not self.output_file_grps:
             raise ValueError(f"Processor '{executable}' requires 'output_file_grp' but none was provided.")
 
+    @property
+    def ocrd_tool_json(self) -> dict:
+        # Looked up by the executable in the registry, instead of holding the description per instance
+        return OCRD_ALL_JSON[self.executable]
+
     def __str__(self):
         str_repr = f"{self.executable}" \
                    f" -m {self.mets_file_path}" \
@@ -51,87 +68,164 @@ class ProcessorCallArguments:
         return str_repr
 
 
-def validate_processor_params(processor_args: ProcessorCallArguments, overwrite_with_defaults=False):
-    # The ParameterValidator overwrites the missing parameters with their defaults
-    backup_curr_params = deepcopy(processor_args.parameters)
-
-    report = ParameterValidator(processor_args.ocrd_tool_json).validate(processor_args.parameters)
+@lru_cache(maxsize=128)
+def get_parameter_validator(executable: str, tool_version: str, with_defaults: bool = False) -> ParameterValidator:
+    # The tool version is part of the cache key only, so that a changed registry invalidates the entries
+    # Note: The ParameterValidator modifies the passed ocrd tool JSON, hence the copy
+    parameter_validator = ParameterValidator(deepcopy(OCRD_ALL_JSON[executable]))
+    if not with_defaults:
+        # The default validator class of the ParameterValidator inserts the missing defaults into
+        # the validated parameters. Use the plain validator class with the same schema instead.
+        parameter_validator.validator = Draft6Validator(parameter_validator.validator.schema)
+    return parameter_validator
+
+
+def validate_processor_params(
+    processor_args: ProcessorCallArguments,
+    overwrite_with_defaults=False,
+    validation_cache: Optional[ValidationCache] = None
+):
+    # Without overwriting, the defaults are left out to keep the produced NF executable file less populated
+    # Note: The defaults, still get overwritten in run-time
+    # The missing parameters are validated as empty ones, without setting them on the passed arguments
+    params = processor_args.parameters if processor_args.parameters is not None else {}
+    cache_key = None
+    if validation_cache:
+        cache_key = validation_cache.build_key(
+            processor_args.executable, params, OCRD_ALL_JSON.version, overwrite_with_defaults)
+        cached_entry = validation_cache.load(cache_key)
+        count('validation_cache_hits' if cached_entry is not None else 'validation_cache_misses')
+        if cached_entry is not None:
+            report = ValidationReport()
+            report.errors.extend(cached_entry['errors'])
+            if overwrite_with_defaults:
+                # The cached parameters hold the inserted defaults
+                processor_args.parameters = cached_entry['parameters']
+            if not report.is_valid:
+                raise Exception(report.errors)
+            return report
+
+    parameter_validator = get_parameter_validator(
+        processor_args.executable, OCRD_ALL_JSON.version, overwrite_with_defaults)
+    report = parameter_validator.validate(params)
+    if cache_key:
+        validation_cache.store(cache_key, report.errors, params)
     if not report.is_valid:
         raise Exception(report.errors)
-
-    # Remove the overwritten defaults to keep the produced NF executable file less populated
-    # Note: The defaults, still get overwritten in run-time
-    if not overwrite_with_defaults:
-        processor_args.parameters = deepcopy(backup_curr_params)
+    if overwrite_with_defaults:
+        processor_args.parameters = params
     return report
 
 
-def validate_all_processors(processors: List[ProcessorCallArguments]):
-    prev_output_file_grps = []
-
-    first_processor = processors[0]
-    validate_processor_params(first_processor, overwrite_with_defaults=False)
-
-    prev_output_file_grps += first_processor.output_file_grps.split(',')
-    for processor in processors[1:]:
-        validate_processor_params(processor, overwrite_with_defaults=False)
-        for input_file_grp in processor.input_file_grps.split(','):
-            if input_file_grp not in prev_output_file_grps:
-                # TODO: This is not ideal...
-                if "GT" not in input_file_grp:
-                    if "OCR-D-OCR" not in input_file_grp:
-                        raise ValueError(f"Input file group not produced by previous steps: {input_file_grp}")
-        prev_output_file_grps += processor.output_file_grps.split(',')
+def validate_all_processors(
+    processors: List[ProcessorCallArguments],
+    validation_cache: Optional[ValidationCache] = None,
+    existing_file_grps: Optional[List[str]] = None
+):
+    """Validate the parameters of the steps and that each step reads available file groups only.
+
+    The file groups available to a step are those produced by the previous steps and those present in
+    the workspace already, i.e., the input file groups of the first step and the `existing_file_grps`.
+    """
+    available_file_grps = set(processors[0].input_file_grps.split(','))
+    if existing_file_grps:
+        available_file_grps.update(existing_file_grps)
+    for index, processor in enumerate(processors):
+        validate_processor_params(processor, overwrite_with_defaults=False, validation_cache=validation_cache)
+        missing_file_grps = [file_grp for file_grp in processor.input_file_grps.split(',')
+                             if file_grp not in available_file_grps]
+        if missing_file_grps:
+            raise ValueError(
+                f"Input file groups of step {index} ({processor.executable}) neither produced by previous steps "
+                f"nor declared as existing in the workspace: {','.join(missing_file_grps)}")
+        if processor.output_file_grps:
+            available_file_grps.update(processor.output_file_grps.split(','))
 
 
 def parse_arguments(processor_arguments) -> ProcessorCallArguments:
-    tokens = shlex_split(processor_arguments)
-    executable = f"{tokens.pop(0)}"
+    tokens = split_arguments(processor_arguments)
+    executable = f"{tokens[0]}"
     input_file_grps = []
     output_file_grps = []
     parameters = {}
-    while tokens:
-        if tokens[0] == '-I':
-            for grp in tokens[1].split(','):
-                input_file_grps.append(grp)
-            tokens = tokens[2:]
-        elif tokens[0] == '-O':
-            for grp in tokens[1].split(','):
-                output_file_grps.append(grp)
-            tokens = tokens[2:]
-        elif tokens[0] == '-p':
-            parameters = {**parameters, **parse_json_string_or_file(tokens[1])}
-            tokens = tokens[2:]
-        elif tokens[0] == '-P':
-            set_json_key_value_overrides(parameters, tokens[1:3])
-            tokens = tokens[3:]
-        else:
+    # Walk the tokens by index, slicing the remaining tokens in each step is quadratic
+    position = 1
+    while position < len(tokens):
+        option = tokens[position]
+        values_count = 2 if option == '-P' else 1
+        if option not in ('-I', '-O', '-p', '-P') or position + values_count >= len(tokens):
             raise ValueError(f"Failed parsing processor arguments: {processor_arguments} "
-                             f"with tokens remaining: {tokens}")
+                             f"with tokens remaining: {tokens[position:]}")
+        if option == '-I':
+            input_file_grps.extend(tokens[position + 1].split(','))
+        elif option == '-O':
+            output_file_grps.extend(tokens[position + 1].split(','))
+        elif option == '-p':
+            parameters = {**parameters, **parse_json_string_or_file(tokens[position + 1])}
+        else:
+            set_json_key_value_overrides(parameters, tokens[position + 1:position + 3])
+        position += 1 + values_count
     input_file_grps = ','.join(input_file_grps)
     output_file_grps = ','.join(output_file_grps)
     return ProcessorCallArguments(executable, input_file_grps, output_file_grps, parameters)
 
 
 class OCRDValidator:
-    def __init__(self):
+    def __init__(
+        self,
+        validation_cache: Optional[ValidationCache] = None,
+        existing_file_grps: Optional[List[str]] = None
+    ):
         self.ocrd_process_command: str = ''
         self.processors: List[ProcessorCallArguments] = []
+        # The file groups present in the workspace before the first step, besides its input file groups
+        self.existing_file_grps: Optional[List[str]] = existing_file_grps
+        # The on-disk cache of the parameter validation is used if given or enabled by OTON_VALIDATION_CACHE
+        if validation_cache is None and OTON_VALIDATION_CACHE:
+            validation_cache = ValidationCache()
+        self.validation_cache: Optional[ValidationCache] = validation_cache
 
     def validate(self, input_file: str):
-        validate_file_path(input_file)
-        self.ocrd_process_command, processor_tasks = read_from_file(input_file)
-
-        print(f"OCRD_PROCESS: {self.ocrd_process_command}")
-        for task in processor_tasks:
-            print(f"TASK: [{task}]")
-
-        validate_ocrd_process_command(self.ocrd_process_command)
-        for processor_arguments in processor_tasks:
-            processor_call_arguments: ProcessorCallArguments = parse_arguments(processor_arguments)
-            self.processors.append(processor_call_arguments)
-
-        for processor in self.processors:
-            print(f"ProcessorCore: [{processor}]")
-
-        validate_all_processors(self.processors)
+        with span('read'):
+            validate_file_path(input_file)
+            self.ocrd_process_command, processor_tasks = read_from_file(input_file)
+        self.__validate_tasks(processor_tasks)
+
+    def validate_string(self, workflow: str):
+        with span('read'):
+            self.ocrd_process_command, processor_tasks = read_from_string(workflow)
+        self.__validate_tasks(processor_tasks)
+
+    def validate_ir(self, workflow_ir: 'WorkflowIR'):
+        """Take the steps of a parsed and validated workflow, see `WorkflowIR`.
+
+        The workflow is validated again only if it was validated against another version of the tool registry.
+        """
+        self.ocrd_process_command = workflow_ir.ocrd_process_command
+        self.processors = workflow_ir.to_processors()
+        count('steps', len(self.processors))
+        if workflow_ir.tool_version != OCRD_ALL_JSON.version:
+            with span('validate'):
+                validate_ocrd_process_command(self.ocrd_process_command)
+                validate_all_processors(self.processors, self.validation_cache, self.existing_file_grps)
+
+    def __validate_tasks(self, processor_tasks: List[str]):
+        # The messages are formatted only if debugging, they dominate the time of small conversions otherwise
+        if logger.isEnabledFor(DEBUG):
+            logger.debug("OCRD_PROCESS: %s", self.ocrd_process_command)
+            for task in processor_tasks:
+                logger.debug("TASK: [%s]", task)
+
+        with span('parse'):
+            validate_ocrd_process_command(self.ocrd_process_command)
+            for processor_arguments in processor_tasks:
+                processor_call_arguments: ProcessorCallArguments = parse_arguments(processor_arguments)
+                self.processors.append(processor_call_arguments)
+        count('steps', len(self.processors))
+
+        if logger.isEnabledFor(DEBUG):
+            for processor in self.processors:
+                logger.debug("ProcessorCore: [%s]", processor)
+
+        with span('validate'):
+            validate_all_processors(self.processors, self.validation_cache, self.existing_file_grps)
@@ -1,19 +1,16 @@
-import logging
 from os.path import exists, isfile
+import re
+from typing import List
 
-from ..constants import (
-    OTON_LOG_LEVEL,
-    OTON_LOG_FORMAT
-)
+from ..instrumentation import get_logger
 
 __all__ = [
+    "split_arguments",
     "validate_file_path",
     "validate_ocrd_process_command"
 ]
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.getLevelName(OTON_LOG_LEVEL))
-logging.basicConfig(format=OTON_LOG_FORMAT)
+logger = get_logger(__name__)
 
 
 def validate_file_path(filepath: str):
@@ -21,11 +18,54 @@ def validate_file_path(filepath: str):
         raise ValueError(f"{filepath} does not exist!")
     if not isfile(filepath):
         raise ValueError(f"{filepath} is not a readable file!")
-    logger.debug(f"Input file path validated: {filepath}")
+    logger.debug("Input file path validated: %s", filepath)
 
 
 def validate_ocrd_process_command(line: str):
     expected = 'ocrd process'
     if line != expected:
         raise ValueError(f"Invalid first line. Expected: '{expected}', got: '{line}'")
-    logger.info(f"Line 0 was validated successfully")
+    logger.info("Line 0 was validated successfully")
+
+
+# Tokens of a POSIX shell word: single quoted, double quoted, escaped character, unquoted characters or a separator
+ARGUMENT_TOKEN_PATTERN = re.compile(r"""'([^']*)'|"((?:[^"\\]|\\.)*)"|\\(.)|([^\s'"\\]+)|(\s+)""", re.DOTALL)
+DOUBLE_QUOTED_ESCAPE_PATTERN = re.compile(r'\\([\\"])')
+
+
+def split_arguments(line: str) -> List[str]:
+    """Split a processor call like `shlex.split` does in POSIX mode, without comments.
+
+    `shlex` reads the line character by character, which is slow for the large inline JSON
+    parameters of auto-generated workflows. This splits it with a single regular expression scan.
+    """
+    tokens = []
+    current_token = []
+    in_token = False
+    position = 0
+    for match in ARGUMENT_TOKEN_PATTERN.finditer(line):
+        if match.start() != position:
+            break
+        position = match.end()
+        single_quoted, double_quoted, escaped, unquoted, separator = match.groups()
+        if separator is not None:
+            if in_token:
+                tokens.append(''.join(current_token))
+                current_token = []
+                in_token = False
+            continue
+        in_token = True
+        if single_quoted is not None:
+            current_token.append(single_quoted)
+        elif double_quoted is not None:
+            # Only the escape character and the quote itself can be escaped within double quotes
+            current_token.append(DOUBLE_QUOTED_ESCAPE_PATTERN.sub(r'\1', double_quoted))
+        elif escaped is not None:
+            current_token.append(escaped)
+        else:
+            current_token.append(unquoted)
+    if position != len(line):
+        raise ValueError(f"No closing quotation or escaped character in: {line}")
+    if in_token:
+        tokens.append(''.join(current_token))
+    return tokens
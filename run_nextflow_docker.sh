@@ -13,6 +13,7 @@ METS_PATH="$WORKSPACE_PATH/mets.xml"
 nextflow run "$NEXTFLOW_SCRIPT" \
 -ansi-log false \
 -with-report \
+-with-trace \
 --workspace_path "$WORKSPACE_PATH" \
 --mets_path "$METS_PATH" \
 --docker_pwd "$WORKSPACE_PATH" \
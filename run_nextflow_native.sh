@@ -8,4 +8,5 @@ METS_PATH="$SCRIPT_DIR/tests/execution_tests/dummy_ws_native_test/data/mets.xml"
 nextflow run "$NEXTFLOW_SCRIPT" \
 -ansi-log false \
 -with-report \
+-with-trace \
 --mets_path "$METS_PATH"
@@ -0,0 +1,23 @@
+from benchmarks.bench_conversion import PHASES, compare_to_baseline, generate_workflow, run_benchmark
+from oton.validators.ocrd_validator import OCRDValidator
+
+
+def test_generated_workflow_is_valid(tmp_path):
+    """Tests that the synthetic workflows of the benchmark pass the validation"""
+    workflow_path = tmp_path / 'workflow.txt'
+    workflow_path.write_text(generate_workflow(25, with_parameters=True), encoding='utf-8')
+    validator = OCRDValidator()
+    validator.validate(str(workflow_path))
+    assert len(validator.processors) == 25
+
+
+def test_benchmark_results_and_baseline():
+    """Smoke test of the benchmark run and the comparison against a baseline"""
+    current = run_benchmark([10], repeats=1)
+    assert set(current['results']['10'].keys()) == set(PHASES)
+
+    slow_baseline = {'results': {'10': {phase: 1000.0 for phase in PHASES}}}
+    assert compare_to_baseline(current, slow_baseline, tolerance=0.25) == []
+    fast_current = {'results': {'10': {'parse_arguments': 1.0}}}
+    fast_baseline = {'results': {'10': {'parse_arguments': 0.5}}}
+    assert len(compare_to_baseline(fast_current, fast_baseline, tolerance=0.25)) == 1
@@ -0,0 +1,47 @@
+from pkg_resources import resource_filename
+
+from oton import cache as cache_module
+from oton import converter as converter_module
+from oton.cache import ConversionCache, get_converter_version
+from oton.converter import Converter
+
+
+def test_conversion_cache_key():
+    """Tests that the cache key depends on the workflow and the conversion options"""
+    lines = ["ocrd process", "olena-binarize -I OCR-D-IMG -O OCR-D-BIN"]
+    key = ConversionCache.build_key(lines, "v1", {'dockerized': False})
+    assert key == ConversionCache.build_key(list(lines), "v1", {'dockerized': False})
+    assert key != ConversionCache.build_key(lines, "v1", {'dockerized': True})
+    assert key != ConversionCache.build_key(lines, "v2", {'dockerized': False})
+    assert key != ConversionCache.build_key(lines[:1], "v1", {'dockerized': False})
+
+
+def test_cache_key_follows_converter_sources(tmp_path, monkeypatch):
+    """Tests that a changed converter source yields new cache keys, regardless of the released version"""
+    (tmp_path / 'cache.py').write_text('RENDER = 1\n')
+    monkeypatch.setattr(cache_module, '__file__', str(tmp_path / 'cache.py'))
+    lines = ["ocrd process", "olena-binarize -I OCR-D-IMG -O OCR-D-BIN"]
+    get_converter_version.cache_clear()
+    key = ConversionCache.build_key(lines, "v1", {})
+    (tmp_path / 'models').mkdir()
+    (tmp_path / 'models' / 'render.py').write_text('RENDER = 2\n')
+    get_converter_version.cache_clear()
+    assert key != ConversionCache.build_key(lines, "v1", {})
+    get_converter_version.cache_clear()
+
+
+def test_cached_conversion_skips_validation(tmp_path, monkeypatch):
+    """Tests that a repeated conversion is served from the cache without validating again"""
+    monkeypatch.setattr(converter_module, 'ConversionCache', lambda: ConversionCache(str(tmp_path)))
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    first_output = tmp_path / 'first.nf'
+    second_output = tmp_path / 'second.nf'
+
+    Converter().convert_OtoN(str(input_path), str(first_output), use_cache=True)
+
+    def fail_validation(*args, **kwargs):
+        raise AssertionError("The workflow was validated again")
+    monkeypatch.setattr(converter_module.OCRDValidator, 'validate', fail_validation)
+    Converter().convert_OtoN(str(input_path), str(second_output), use_cache=True)
+
+    assert first_output.read_text() == second_output.read_text()
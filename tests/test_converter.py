@@ -1,8 +1,14 @@
 from pkg_resources import resource_filename
+import pytest
 from oton.converter import Converter
-from re import sub
+from oton.resources import ResourceProfile
+from hashlib import md5
+from re import findall, sub
 import os
 
+# The ground truth of the evaluation workflow is present in the workspace before the first step
+WORKFLOW3_GT_FILE_GRPS = ['OCR-D-GT-SEG-LINE', 'OCR-D-GT-SEG-PAGE']
+
 
 def clean_up(path):
     """Cleans up test artifacts from file system
@@ -73,3 +79,311 @@ def test_models_volume_for_docker():
         wf = fp.read()
     clean_up(output_path)
     assert expected in wf
+
+
+def test_batch_conversion_reports_failures(tmp_path):
+    """Tests that a batch conversion converts all valid workflows and
+    reports the broken ones without aborting the batch.
+    """
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    broken_path = tmp_path / 'broken.txt'
+    broken_path.write_text('ocrd process \\\n  "not-a-processor -I OCR-D-IMG -O OCR-D-BIN"\n', encoding='utf-8')
+    output_dir = tmp_path / 'out'
+
+    report = Converter().convert_batch([input_path, str(broken_path)], str(output_dir), workers=2)
+
+    assert len(report) == 2
+    assert report[0][2] is None
+    assert os.path.isfile(report[0][1])
+    assert report[1][0] == str(broken_path)
+    assert "not found" in report[1][2]
+
+
+def test_batch_conversion_existing_file_grps(tmp_path):
+    """Tests that the existing file groups declared for a batch apply to each of its workflows"""
+    input_path = resource_filename('oton', 'assets/workflow3.txt')
+
+    report = Converter().convert_batch([input_path], str(tmp_path / 'failed'), workers=1)
+    assert "OCR-D-GT-SEG-LINE" in report[0][2]
+    report = Converter().convert_batch(
+        [input_path], str(tmp_path / 'out'), workers=2, existing_file_grps=WORKFLOW3_GT_FILE_GRPS,
+        keep_file_grps=['OCR-D-EVAL-SEG-BLOCK', 'OCR-D-EVAL-SEG-LINE', 'OCR-D-EVAL-SEG-PAGE'])
+    assert report[0][2] is None
+    assert os.path.isfile(report[0][1])
+
+
+def test_batch_manifest_relative_entries(tmp_path, monkeypatch):
+    """Tests that the relative entries of a manifest are resolved against the directory of the manifest"""
+    from oton.utils import collect_workflow_files
+    workflows_dir = tmp_path / 'workflows'
+    workflows_dir.mkdir()
+    (workflows_dir / 'workflow.txt').write_text('ocrd process\n"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"\n')
+    manifest_path = workflows_dir / 'manifest.lst'
+    manifest_path.write_text('# workflows of the batch\nworkflow.txt\n\n')
+    monkeypatch.chdir(tmp_path)
+
+    assert collect_workflow_files('workflows/manifest.lst') == [os.path.join('workflows', 'workflow.txt')]
+    manifest_path.write_text('workflow.txt\nmissing.txt\n')
+    with pytest.raises(FileNotFoundError, match='missing.txt'):
+        collect_workflow_files('workflows/manifest.lst')
+
+
+def test_batch_conversion_missing_source(tmp_path):
+    """Tests that a missing batch source is reported as bad parameter naming the path"""
+    from click.testing import CliRunner
+    from oton.cli import cli
+    for input_source in [str(tmp_path / 'missing'), str(tmp_path / 'missing' / '*.txt')]:
+        result = CliRunner().invoke(cli, ['convert-batch', '-I', input_source, '-O', str(tmp_path / 'out')])
+        assert result.exit_code == 2
+        assert input_source in result.output
+        assert "Invalid value for '-I' / '--input_source'" in result.output
+
+
+def test_conversion_dag_deduplicated(tmp_path):
+    """Tests that identical steps of the DAG mode share their module process, which names the METS copy
+    after the running process
+    """
+    workflow_path = tmp_path / 'workflow.txt'
+    workflow_path.write_text(
+        'ocrd process \\\n'
+        '  "olena-binarize -I OCR-D-IMG -O OCR-D-BIN" \\\n'
+        '  "olena-binarize -I OCR-D-IMG -O OCR-D-BIN2"\n', encoding='utf-8')
+    output_path = tmp_path / 'nextflow.nf'
+
+    Converter().convert_OtoN(str(workflow_path), str(output_path), dag=True, deduplicate=True,
+                             keep_file_grps=['OCR-D-BIN', 'OCR-D-BIN2'])
+    wf = output_path.read_text(encoding='utf-8')
+    module = (tmp_path / 'nextflow_modules.nf').read_text(encoding='utf-8')
+
+    assert module.count("process ") == 1
+    for index in range(2):
+        assert f"include {{ ocrd_olena_binarize_t0 as ocrd_olena_binarize_{index} }}" in wf
+    assert '+ ".${task.process.tokenize(\':\')[-1]}.xml"' in module
+
+
+def test_conversion_page_parallel():
+    """E2E test for a page parallel conversion. Each processor has to be limited to the pages
+    of its chunk and the chunks have to be merged back into the METS file at the end.
+    """
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    output_path = resource_filename(__name__, 'assets/output_page_parallel_workflow.nf')
+
+    Converter().convert_OtoN(input_path=input_path, output_path=output_path, page_parallel=4)
+    with open(output_path, mode='r', encoding='utf-8') as fp:
+        wf = fp.read()
+    clean_up(output_path)
+
+    assert 'params.page_chunks = "4"' in wf
+    assert "ocrd-cis-ocropy-binarize -m ${mets_file} -I ${input_file_grp} -O ${output_file_grp} -g ${page_range}" in wf
+    assert "ocrd_cis_ocropy_binarize_0(split_mets.out, params.input_file_grp, \"OCR-D-BIN\")" in wf
+    assert "merge_mets(ocrd_calamari_recognize_7.out.collect(flat: false))" in wf
+    assert "maxForks 1\n\n    input:\n        tuple" not in wf
+
+
+def test_conversion_dag():
+    """E2E test for a DAG conversion. Independent steps have to start from the METS file
+    and the branches have to be joined at the end.
+    """
+    input_path = resource_filename('oton', 'assets/workflow3.txt')
+    output_path = resource_filename(__name__, 'assets/output_dag_workflow.nf')
+
+    Converter().convert_OtoN(
+        input_path=input_path, output_path=output_path, dag=True, existing_file_grps=WORKFLOW3_GT_FILE_GRPS)
+    with open(output_path, mode='r', encoding='utf-8') as fp:
+        wf = fp.read()
+    clean_up(output_path)
+
+    assert 'ocrd_dinglehopper_1(params.mets_path, "OCR-D-GT-SEG-LINE,OCR-D-OCR", "OCR-D-EVAL-SEG-LINE")' in wf
+    assert 'ocrd_dinglehopper_2(params.mets_path, "OCR-D-GT-SEG-PAGE,OCR-D-OCR", "OCR-D-EVAL-SEG-PAGE")' in wf
+    assert "join_mets(ocrd_dinglehopper_0.out.mix(ocrd_dinglehopper_1.out, ocrd_dinglehopper_2.out).collect())" in wf
+
+
+def test_conversion_deduplicated(tmp_path):
+    """E2E test for a conversion with deduplicated processes. Identical processes have to be
+    defined once in the module file and included under the name of each step.
+    """
+    input_path = resource_filename('oton', 'assets/workflow3.txt')
+    output_path = tmp_path / 'nextflow3.nf'
+
+    Converter().convert_OtoN(
+        input_path=input_path, output_path=str(output_path), deduplicate=True,
+        existing_file_grps=WORKFLOW3_GT_FILE_GRPS)
+    wf = output_path.read_text(encoding='utf-8')
+    module = (tmp_path / 'nextflow3_modules.nf').read_text(encoding='utf-8')
+
+    for index in range(3):
+        assert f"include {{ ocrd_dinglehopper_t0 as ocrd_dinglehopper_{index} }} from './nextflow3_modules.nf'" in wf
+    assert "process" not in wf
+    assert module.count("process ") == 1
+    assert "ocrd_dinglehopper_1(ocrd_dinglehopper_0.out, \"OCR-D-GT-SEG-LINE,OCR-D-OCR\", \"OCR-D-EVAL-SEG-LINE\")" in wf
+
+
+def test_conversion_native_container(tmp_path):
+    """E2E test for a conversion with the native container directive. The steps must not start a
+    container on their own and the config enabling the container engine is written next to the script.
+    """
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    output_path = tmp_path / 'output_container_workflow.nf'
+
+    Converter().convert_OtoN(input_path=input_path, output_path=str(output_path), container='docker')
+    wf = output_path.read_text(encoding='utf-8')
+    config = (tmp_path / 'output_container_workflow.config').read_text(encoding='utf-8')
+
+    assert "docker run" not in wf
+    assert wf.count("container params.container_image") == 8
+    assert "params.container_options = \"-v $params.workspace_path:$params.workspace_path" in wf
+    assert "docker {\n    enabled = true" in config
+
+
+def test_conversion_shared_workspace_with_scratch():
+    """Tests that the METS path is passed as value in the shared workspace mode and that
+    the steps work on a copy of the workspace in their scratch directory.
+    """
+    workflow = 'ocrd process\n"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"'
+
+    nextflow = Converter.convert_string(workflow, shared_workspace=True)
+    assert "path mets_file" not in nextflow
+    assert "val mets_file" in nextflow
+
+    nextflow = Converter.convert_string(workflow, shared_workspace=True, scratch='true')
+    assert "scratch true" in nextflow
+    assert "ocrd-olena-binarize -m scratch_workspace/${mets_name}" in nextflow
+    assert "find . -type f -exec cp --parents -t ${workspace_dir} {} +" in nextflow
+
+
+def test_scratch_requires_mets_path_values():
+    workflow = 'ocrd process\n"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"'
+    with pytest.raises(ValueError):
+        Converter.convert_string(workflow, scratch='true')
+
+
+def test_conversion_multi_workspace():
+    """Tests that the workspaces are fed through the steps as a channel with bounded concurrency
+    and that the status of each workspace is summarized.
+    """
+    workflow = 'ocrd process\n"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"\n"anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP"'
+    nextflow = Converter.convert_string(workflow, multi_workspace=16)
+
+    assert 'params.max_workspaces = "16"' in nextflow
+    assert nextflow.count("maxForks params.max_workspaces.toInteger()") == 2
+    assert 'ocrd_olena_binarize_0(mets_paths, params.input_file_grp, "OCR-D-BIN")' in nextflow
+    assert ".join(ocrd_anybaseocr_crop_1.out.map { [it, true] }, remainder: true)" in nextflow
+    with pytest.raises(ValueError):
+        Converter.convert_string(workflow, multi_workspace=16, dag=True)
+
+    # The concurrency of the steps limited by the resource profile holds across the workspaces
+    profile = ResourceProfile({'default': {'cpus': 1}, 'ocrd-anybaseocr-crop': {'maxForks': 2}})
+    nextflow = Converter.convert_string(workflow, multi_workspace=16, resource_profile=profile)
+    assert nextflow.count("maxForks params.max_workspaces.toInteger()") == 1
+    assert "maxForks Math.min(2, params.max_workspaces.toInteger())" in nextflow
+
+
+def test_conversion_resumable():
+    """Tests that the steps of the resumable mode are chained by stamps named by their fingerprints,
+    which stay the same for unchanged steps and change after a changed step.
+    """
+    binarize = '"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"'
+    crop = '"anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP"'
+    denoise = '"skimage-denoise -I OCR-D-CROP -O OCR-D-DENOISE"'
+
+    def stamps(*steps, **options):
+        nextflow = Converter.convert_string('\n'.join(('ocrd process',) + steps), resumable=True, **options)
+        return findall(r'path\("(\w+)\.stamp"\)', nextflow), nextflow
+
+    original, nextflow = stamps(binarize, crop)
+    assert nextflow.count("cache 'deep'") == 2
+    assert "tuple val(mets_file), path(upstream_stamp)" in nextflow
+    assert "ocrd-anybaseocr-crop -m ${mets_file} -I ${input_file_grp} -O ${output_file_grp} --overwrite" in nextflow
+    assert stamps(binarize, crop)[0] == original
+    # An appended step keeps the fingerprints of the previous steps
+    assert stamps(binarize, crop, denoise)[0][:2] == original
+    # A changed step changes the fingerprints of itself and the following steps
+    changed = stamps(binarize.replace(' -I', ' -P impl sauvola -I'), crop)[0]
+    assert changed[0] != original[0] and changed[1] != original[1]
+
+    nextflow = stamps(binarize, crop, store_dir='/data/store')[1]
+    assert 'params.store_dir = "/data/store"' in nextflow
+    store_dir = findall(r'storeDir "(.+)/OCR-D-CROP"', nextflow)[0]
+    # The stamps of the workspaces are stored apart, Nextflow evaluates the directory per METS path
+    assert store_dir == '${params.store_dir}/${mets_file.md5()}'
+    store_dirs = {store_dir.replace('${mets_file.md5()}', md5(mets_path.encode()).hexdigest())
+                  for mets_path in ('/data/ws1/mets.xml', '/data/ws2/mets.xml')}
+    assert len(store_dirs) == 2
+    with pytest.raises(ValueError):
+        Converter.convert_string(binarize, store_dir='/data/store')
+
+
+def test_conversion_prunes_dead_steps():
+    """Tests that the steps whose output is neither read later nor kept are left out of the script"""
+    workflow = (
+        'ocrd process \\\n'
+        '  "olena-binarize -I OCR-D-IMG -O OCR-D-BIN" \\\n'
+        '  "skimage-denoise -I OCR-D-BIN -O OCR-D-DENOISE" \\\n'
+        '  "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP"\n'
+    )
+    assert "ocrd_skimage_denoise_1" in Converter.convert_string(workflow, prune_dead_steps=True)
+    wf = Converter.convert_string(workflow, keep_file_grps=['OCR-D-CROP'], prune_dead_steps=True)
+    assert "ocrd_skimage_denoise" not in wf
+    assert 'ocrd_anybaseocr_crop_1(ocrd_olena_binarize_0.out, "OCR-D-BIN", "OCR-D-CROP")' in wf
+
+    wf = Converter.convert_string(workflow, keep_file_grps=['OCR-D-DENOISE', 'OCR-D-CROP'], prune_dead_steps=True)
+    assert "ocrd_skimage_denoise_1" in wf
+    with pytest.raises(ValueError, match="OCR-D-OCR"):
+        Converter.convert_string(workflow, keep_file_grps=['OCR-D-OCR'])
+
+
+def test_conversion_prune_keeps_dag_sinks(tmp_path):
+    """Tests that pruning the evaluation workflow keeps its parallel branches"""
+    input_path = resource_filename('oton', 'assets/workflow3.txt')
+    output_path = tmp_path / 'nextflow3.nf'
+
+    Converter().convert_OtoN(input_path, str(output_path), dag=True, existing_file_grps=WORKFLOW3_GT_FILE_GRPS,
+                             prune_dead_steps=True)
+    wf = output_path.read_text(encoding='utf-8')
+    for index, level in enumerate(('BLOCK', 'LINE', 'PAGE')):
+        assert f'ocrd_dinglehopper_{index}(params.mets_path, ' in wf
+        assert f'"OCR-D-EVAL-SEG-{level}")' in wf
+
+
+def test_conversion_merges_duplicate_steps():
+    """Tests that a repeated step is left out of the script and its reader reads the output of the first call"""
+    workflow = (
+        'ocrd process \\\n'
+        '  "olena-binarize -I OCR-D-IMG -O OCR-D-BIN" \\\n'
+        '  "olena-binarize -I OCR-D-IMG -O OCR-D-BIN-COPY" \\\n'
+        '  "anybaseocr-crop -I OCR-D-BIN-COPY -O OCR-D-CROP"\n'
+    )
+    wf = Converter.convert_string(workflow, merge_duplicates=True)
+    assert 'ocrd_anybaseocr_crop_1(ocrd_olena_binarize_0.out, "OCR-D-BIN", "OCR-D-CROP")' in wf
+    assert "OCR-D-BIN-COPY" not in wf
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_conversion_targets(tmp_path, monkeypatch, parallel):
+    """Tests that the targets rendered from a single validation equal the separate conversions"""
+    from oton import converter
+    from oton.validators import ocrd_validator
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    Converter.convert_OtoN(input_path, str(tmp_path / 'native.nf'))
+    Converter.convert_OtoN(input_path, str(tmp_path / 'dockerized.nf'), dockerized=True)
+    Converter.convert_OtoN(input_path, str(tmp_path / 'singularity.nf'), container='singularity')
+
+    validations = []
+    validate_all_processors = ocrd_validator.validate_all_processors
+    monkeypatch.setattr(ocrd_validator, 'validate_all_processors',
+                        lambda *args: validations.append(args) or validate_all_processors(*args))
+    if parallel:
+        monkeypatch.setattr(converter, 'PARALLEL_RENDER_MIN_STEPS', 0)
+    targets_dir = tmp_path / 'targets'
+    targets_dir.mkdir()
+    Converter.convert_OtoN(
+        input_path, str(targets_dir / 'native.nf'), workers=3,
+        targets=[('dockerized', str(targets_dir / 'dockerized.nf')),
+                 ('singularity', str(targets_dir / 'singularity.nf'))])
+
+    assert len(validations) == 1
+    assert sorted(os.listdir(targets_dir)) == ['dockerized.nf', 'native.nf', 'singularity.config', 'singularity.nf']
+    for file_name in os.listdir(targets_dir):
+        assert (targets_dir / file_name).read_text() == (tmp_path / file_name).read_text()
+    with pytest.raises(ValueError, match="Unknown target flavour"):
+        Converter.convert_OtoN(input_path, str(targets_dir / 'native.nf'), targets=[('podman', 'podman.nf')])
@@ -0,0 +1,92 @@
+from oton.dataflow import (
+    build_dependency_graph,
+    find_dead_steps,
+    find_sink_steps,
+    is_linear_chain,
+    merge_duplicate_steps
+)
+from oton.validators.ocrd_validator import parse_arguments
+
+
+def build_graph(*tasks):
+    return build_dependency_graph([parse_arguments(task) for task in tasks])
+
+
+def test_linear_workflow_graph():
+    """Tests that a sequential workflow stays a linear chain"""
+    graph = build_graph(
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN",
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP",
+        "olena-binarize -I OCR-D-CROP -O OCR-D-BIN2"
+    )
+    assert graph == [[], [0], [1]]
+    assert is_linear_chain(graph)
+
+
+def test_branching_workflow_graph():
+    """Tests that independent steps do not depend on each other, that joins depend on all
+    branches and that transitive dependencies are removed
+    """
+    graph = build_graph(
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN",
+        "dinglehopper -I OCR-D-GT-SEG-BLOCK,OCR-D-BIN -O OCR-D-EVAL-BLOCK",
+        "dinglehopper -I OCR-D-GT-SEG-LINE,OCR-D-BIN -O OCR-D-EVAL-LINE",
+        "dinglehopper -I OCR-D-EVAL-BLOCK,OCR-D-EVAL-LINE,OCR-D-BIN -O OCR-D-EVAL-ALL"
+    )
+    assert graph == [[], [0], [0], [1, 2]]
+    assert find_sink_steps(graph) == [3]
+    assert not is_linear_chain(graph)
+
+
+def test_overwriting_step_waits_for_readers():
+    """Tests that a step overwriting a file group waits for the previous readers of it"""
+    graph = build_graph(
+        "dinglehopper -I OCR-D-GT-SEG-BLOCK,OCR-D-OCR -O OCR-D-EVAL",
+        "dinglehopper -I OCR-D-GT-SEG-LINE,OCR-D-OCR -O OCR-D-EVAL-LINE",
+        "calamari-recognize -I OCR-D-IMG -O OCR-D-OCR"
+    )
+    assert graph == [[], [], [0, 1]]
+
+
+def test_dead_steps():
+    """Tests that steps feeding neither a later live step nor the kept file groups are dead"""
+    processors = [parse_arguments(task) for task in (
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN",
+        "skimage-denoise -I OCR-D-BIN -O OCR-D-DENOISE",
+        "skimage-binarize -I OCR-D-DENOISE -O OCR-D-BIN2",
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP"
+    )]
+    # Without kept file groups, the final output is unknown
+    assert find_dead_steps(processors) == []
+    assert find_dead_steps(processors, ['OCR-D-CROP']) == [1, 2]
+    assert find_dead_steps(processors, ['OCR-D-CROP', 'OCR-D-BIN2']) == []
+    assert find_dead_steps(processors, ['OCR-D-DENOISE']) == [2, 3]
+
+
+def test_merge_duplicate_steps():
+    """Tests that a repeated step on the same input is removed and its readers read the output of the first call"""
+    processors = [parse_arguments(task) for task in (
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN",
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP",
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP2",
+        "skimage-binarize -I OCR-D-CROP2 -O OCR-D-BIN2",
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN3 -P impl kim",
+        "dinglehopper -I OCR-D-BIN2,OCR-D-BIN3 -O OCR-D-EVAL"
+    )]
+    merged, duplicates = merge_duplicate_steps(processors)
+    assert duplicates == {2: 1}
+    assert [processor.input_file_grps for processor in merged] == [
+        "OCR-D-IMG", "OCR-D-BIN", "OCR-D-CROP", "OCR-D-IMG", "OCR-D-BIN2,OCR-D-BIN3"]
+    assert processors[3].input_file_grps == "OCR-D-CROP2"
+
+
+def test_duplicate_steps_kept():
+    """Tests that repeated steps are kept if their input was overwritten or their output is final"""
+    processors = [parse_arguments(task) for task in (
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP",
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN",
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP2",
+        "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP3"
+    )]
+    assert merge_duplicate_steps(processors)[1] == {}
+    assert merge_duplicate_steps(processors, ['OCR-D-CROP', 'OCR-D-CROP2'])[1] == {3: 2}
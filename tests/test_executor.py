@@ -0,0 +1,99 @@
+import os
+from pkg_resources import resource_filename
+import pytest
+from time import perf_counter
+from oton.executor import ExecutionError, LocalExecutor, split_page_ranges
+from oton.validators.ocrd_validator import OCRDValidator
+
+# Stands in for the OCR-D processors, logs its call, takes STUB_SLEEP seconds and fails if named by STUB_FAIL
+STUB_PROCESSOR = """#!/bin/sh
+echo "$(basename "$0") $*" >> "$STUB_LOG"
+if [ -n "$STUB_SLEEP" ]; then sleep "$STUB_SLEEP"; fi
+if [ "$(basename "$0")" = "$STUB_FAIL" ]; then echo "stub failure"; exit 3; fi
+"""
+# Stands in for the OCR-D workspace commands of the page chunks
+STUB_OCRD = """#!/bin/sh
+case "$*" in
+  *list-page*) echo "log message on stderr" >&2; printf 'P1\\nP2\\nP3\\nP4\\nP5\\n' ;;
+  *) echo "ocrd $*" >> "$STUB_LOG" ;;
+esac
+"""
+
+
+@pytest.fixture
+def stub_workspace(tmp_path, monkeypatch):
+    validator = OCRDValidator()
+    validator.validate(resource_filename(__name__, 'assets/workflow.txt'))
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for executable, content in [(processor.executable, STUB_PROCESSOR) for processor in validator.processors] + \
+            [('ocrd', STUB_OCRD)]:
+        (bin_dir / executable).write_text(content)
+        (bin_dir / executable).chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('STUB_LOG', str(tmp_path / 'calls.log'))
+    mets_path = tmp_path / 'ws' / 'mets.xml'
+    mets_path.parent.mkdir()
+    mets_path.write_text('<mets/>')
+    return validator.processors, str(mets_path), tmp_path / 'calls.log'
+
+
+def test_split_page_ranges():
+    assert split_page_ranges(['P1', 'P2', 'P3', 'P4', 'P5'], 2) == ['P1,P2,P3', 'P4,P5']
+    assert split_page_ranges(['P1', 'P2'], 4) == ['P1', 'P2']
+    assert split_page_ranges([], 4) == []
+
+
+def test_run_steps_in_order(stub_workspace):
+    processors, mets_path, calls_log = stub_workspace
+    reported = []
+    results = LocalExecutor(processors, mets_path, concurrency=2, on_result=reported.append).run()
+
+    assert [result.index for result in results] == list(range(8))
+    assert reported == results and all(result.succeeded for result in results)
+    calls = calls_log.read_text().splitlines()
+    assert [call.split()[0] for call in calls] == [processor.executable for processor in processors]
+    assert calls[2] == f"ocrd-skimage-binarize -m {mets_path} -I OCR-D-CROP -O OCR-D-BIN2 -p {{\"method\": \"li\"}}"
+
+
+def test_run_page_chunks(stub_workspace):
+    processors, mets_path, calls_log = stub_workspace
+    results = LocalExecutor(processors, mets_path, concurrency=4, page_chunks=2).run()
+
+    assert len(results) == 16
+    assert {result.page_range for result in results} == {'P1,P2,P3', 'P4,P5'}
+    calls = calls_log.read_text().splitlines()
+    chunk_mets_path = mets_path.replace('mets.xml', 'mets.chunk2.xml')
+    assert sum(f"-m {chunk_mets_path} " in call for call in calls) == 8
+    assert calls[-2:] == [
+        f"ocrd workspace -m {mets_path} merge --force --no-copy-files -g P1,P2,P3 "
+        f"{mets_path.replace('mets.xml', 'mets.chunk1.xml')}",
+        f"ocrd workspace -m {mets_path} merge --force --no-copy-files -g P4,P5 {chunk_mets_path}"
+    ]
+    assert sorted(os.listdir(os.path.dirname(mets_path))) == ['mets.xml']
+
+
+def test_run_stops_at_failed_step(stub_workspace, monkeypatch):
+    processors, mets_path, calls_log = stub_workspace
+    monkeypatch.setenv('STUB_FAIL', 'ocrd-anybaseocr-crop')
+    with pytest.raises(ExecutionError) as error:
+        LocalExecutor(processors, mets_path).run()
+
+    assert error.value.result.index == 1 and error.value.result.returncode == 3
+    assert "stub failure" in str(error.value)
+    assert len(calls_log.read_text().splitlines()) == 2
+
+
+def test_step_duration_excludes_queueing(stub_workspace, monkeypatch):
+    """Tests that the duration of a call waiting for a free slot excludes the waiting time"""
+    processors, mets_path, _ = stub_workspace
+    monkeypatch.setenv('STUB_SLEEP', '0.3')
+    start = perf_counter()
+    results = LocalExecutor(processors[:1], mets_path, concurrency=1, page_chunks=2).run()
+    elapsed = perf_counter() - start
+
+    assert len(results) == 2
+    assert all(result.duration >= 0.3 for result in results)
+    # The chunks ran one after the other, the second one waited for the first one.
+    # Including the waiting time, the durations would add up to more than the elapsed time.
+    assert sum(result.duration for result in results) <= elapsed
@@ -0,0 +1,54 @@
+import pytest
+
+from oton.converter import Converter
+from oton.fusion import plan_fusion
+from oton.validators.ocrd_validator import OCRDValidator
+
+
+@pytest.fixture
+def processors():
+    validator = OCRDValidator()
+    validator.validate('oton/assets/workflow1.txt')
+    return validator.processors
+
+
+def test_plan_fusion_policies(processors):
+    """Tests that the groups of each policy cover all steps in order"""
+    assert plan_fusion(processors, '0-1,3-5') == [[0, 1], [2], [3, 4, 5], [6], [7]]
+    assert plan_fusion(processors, 'preprocessing') == [[0, 1, 2, 3, 4], [5], [6], [7]]
+    assert plan_fusion(processors, 'light') == [[0], [1], [2, 3, 4], [5], [6], [7]]
+    with pytest.raises(ValueError):
+        plan_fusion(processors, '3-5,4-6')
+
+
+def test_conversion_with_fused_steps():
+    """Tests that the fused steps run back to back in a single process, called like a single step"""
+    workflow = '\n'.join([
+        'ocrd process',
+        '"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"',
+        '"anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP"',
+        '"calamari-recognize -I OCR-D-CROP -O OCR-D-OCR"'
+    ])
+    nextflow = Converter.convert_string(workflow, fuse='preprocessing')
+
+    assert "ocrd-olena-binarize -m ${mets_file} -I ${input_file_grp} -O OCR-D-BIN\n" in nextflow
+    assert "ocrd-anybaseocr-crop -m ${mets_file} -I OCR-D-BIN -O ${output_file_grp}\n" in nextflow
+    assert 'ocrd_fused_0_1(params.mets_path, params.input_file_grp, "OCR-D-CROP")' in nextflow
+    assert 'ocrd_calamari_recognize_2(ocrd_fused_0_1.out, "OCR-D-CROP", "OCR-D-OCR")' in nextflow
+
+
+def test_dockerized_conversion_with_fused_steps():
+    """Tests that the fused steps of the dockerized variant run in a single container"""
+    workflow = '\n'.join([
+        'ocrd process',
+        '"olena-binarize -I OCR-D-IMG -O OCR-D-BIN"',
+        '"skimage-denoise -I OCR-D-BIN -O OCR-D-DENOISE -P level-of-operation page"',
+        '"calamari-recognize -I OCR-D-DENOISE -O OCR-D-OCR"'
+    ])
+    nextflow = Converter.convert_string(workflow, dockerized=True, fuse='preprocessing')
+
+    fused_process = nextflow[nextflow.index('process ocrd_fused_0_1'):nextflow.index('process ocrd_calamari')]
+    assert fused_process.count('${params.docker_command}') == 1
+    assert "${params.docker_command} sh -c 'ocrd-olena-binarize -m ${mets_file} -I ${input_file_grp} " \
+           "-O OCR-D-BIN && ocrd-skimage-denoise -m ${mets_file} -I OCR-D-BIN -O ${output_file_grp} " \
+           "-p '\"'\"'{\"level-of-operation\": \"page\"}'\"'\"''\n" in fused_process
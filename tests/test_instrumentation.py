@@ -0,0 +1,40 @@
+from pkg_resources import resource_filename
+from oton.converter import Converter
+from oton.instrumentation import NO_SPAN, Tracer, get_tracer, isolated_trace, span
+
+
+def test_spans_are_no_ops_without_tracing():
+    assert get_tracer() is None
+    assert span('read') is NO_SPAN
+
+
+def test_tracer_aggregates_and_merges():
+    tracer = Tracer()
+    tracer.add_span('render', 0.002)
+    tracer.add_span('render', 0.004)
+    tracer.count('steps', 3)
+    other = Tracer()
+    other.add_span('render', 0.010)
+    other.count('steps', 2)
+
+    tracer.merge(other.to_dict())
+    trace = tracer.to_dict()
+    assert trace['spans']['render']['count'] == 3
+    assert round(trace['spans']['render']['total_ms'], 6) == 16
+    assert round(trace['spans']['render']['max_ms'], 6) == 10
+    assert trace['counters'] == {'steps': 5}
+
+
+def test_conversion_phases_traced(tmp_path):
+    """Tests if the phases of the conversions are recorded, including those of the batch workers
+    """
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    with isolated_trace() as tracer:
+        Converter().convert_OtoN(input_path, str(tmp_path / 'workflow.nf'))
+        Converter().convert_batch([input_path], str(tmp_path / 'batch'), workers=2)
+    assert get_tracer() is None
+
+    assert {'read', 'parse', 'validate', 'render', 'write'} <= set(tracer.spans)
+    assert tracer.spans['write'][0] == 2
+    assert tracer.counters['workflows'] == 2
+    assert tracer.counters['steps'] == tracer.counters['processes'] == 16
@@ -0,0 +1,60 @@
+from pickle import dumps, loads
+from pkg_resources import resource_filename
+import pytest
+from oton.converter import Converter
+from oton.ir import IR_FORMAT_BINARY, WorkflowIR
+from oton.validators.ocrd_validator import OCRDValidator
+
+
+def parse_workflow() -> WorkflowIR:
+    validator = OCRDValidator()
+    validator.validate(resource_filename(__name__, 'assets/workflow_with_duplicate_processors.txt'))
+    return WorkflowIR.from_processors(validator.ocrd_process_command, validator.processors)
+
+
+def test_ir_round_trips():
+    """Tests if the binary, JSON and pickled representations restore an equal workflow
+    """
+    workflow_ir = parse_workflow()
+    assert WorkflowIR.from_bytes(workflow_ir.to_bytes()) == workflow_ir
+    assert WorkflowIR.from_json(workflow_ir.to_json()) == workflow_ir
+    assert loads(dumps(workflow_ir)) == workflow_ir
+    # The repeated executables and file groups are stored once in the binary representation
+    assert len(workflow_ir.to_bytes()) < len(workflow_ir.to_json())
+
+
+def test_ir_is_immutable_and_shares_strings():
+    workflow_ir = parse_workflow()
+    step = workflow_ir.steps[0]
+    with pytest.raises(AttributeError):
+        step.input_file_grps = 'OCR-D-OTHER'
+    with pytest.raises(AttributeError):
+        step.extra = 'value'
+    step.parameters['level-of-operation'] = 'line'
+    assert step == workflow_ir.steps[0] and 'level-of-operation' not in step.parameters_json
+
+    restored = WorkflowIR.from_bytes(workflow_ir.to_bytes())
+    assert restored.steps[2].executable is workflow_ir.steps[0].executable
+    assert step.ocrd_tool_json['executable'] == step.executable
+
+
+def test_ir_rejects_corrupt_input():
+    content = parse_workflow().to_bytes()
+    with pytest.raises(ValueError):
+        WorkflowIR.from_bytes(content[:len(content) // 2])
+    with pytest.raises(ValueError):
+        WorkflowIR.from_json('{"steps": []}')
+
+
+def test_conversion_from_ir(tmp_path):
+    """Tests if converting the representation produces the script of the workflow file
+    """
+    input_path = resource_filename(__name__, 'assets/workflow.txt')
+    validator = OCRDValidator()
+    validator.validate(input_path)
+    ir_path = str(tmp_path / 'workflow.ir')
+    WorkflowIR.from_processors(validator.ocrd_process_command, validator.processors).save(ir_path, IR_FORMAT_BINARY)
+
+    Converter().convert_OtoN(input_path, str(tmp_path / 'expected.nf'))
+    Converter().convert_OtoN(ir_path, str(tmp_path / 'from_ir.nf'))
+    assert (tmp_path / 'from_ir.nf').read_text() == (tmp_path / 'expected.nf').read_text()
@@ -0,0 +1,91 @@
+import pytest
+
+from oton.profiling import aggregate_by_executable, aggregate_traces, suggest_resource_profile
+from oton.utils import parse_duration, parse_memory
+from oton.validators.ocrd_validator import OCRDValidator
+
+TRACE_HEADER = 'task_id\thash\tname\tstatus\texit\tduration\trealtime\t%cpu\tpeak_rss\n'
+
+
+def write_trace(path, rows):
+    path.write_text(TRACE_HEADER + ''.join('\t'.join(row) + '\n' for row in rows))
+    return str(path)
+
+
+@pytest.mark.parametrize('value, expected', [('1h 2m 3s', 3723000), ('2.5s', 2500), ('120ms', 120), ('42', 42)])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [('1.5 GB', 1.5 * 2 ** 30), ('512 KB', 512 * 2 ** 10), ('100', 100)])
+def test_parse_memory(value, expected):
+    assert parse_memory(value) == expected
+
+
+def test_aggregate_traces_of_many_runs(tmp_path):
+    """Tests that the tasks of many runs are aggregated per step and mapped back to the workflow steps"""
+    first_trace = write_trace(tmp_path / 'trace1.txt', [
+        ('1', 'ab/0', 'ocrd_cis_ocropy_binarize_0', 'COMPLETED', '0', '3s', '2s', '100.0%', '100 MB'),
+        ('2', 'ab/1', 'ocrd_calamari_recognize_7 (1)', 'COMPLETED', '0', '1m 1s', '1m', '350.0%', '3 GB'),
+        ('3', 'ab/2', 'ocrd_calamari_recognize_7 (2)', 'FAILED', '1', '2s', '1s', '10.0%', '1 GB'),
+    ])
+    second_trace = write_trace(tmp_path / 'trace2.txt', [
+        ('1', 'cd/0', 'ocrd_cis_ocropy_binarize_0', 'CACHED', '0', '3s', '2s', '100.0%', '100 MB'),
+        ('2', 'cd/1', 'ocrd_calamari_recognize_7', 'COMPLETED', '0', '2m 1s', '2m', '380.0%', '3.5 GB'),
+    ])
+    validator = OCRDValidator()
+    validator.validate('oton/assets/workflow1.txt')
+
+    statistics = aggregate_traces([first_trace, second_trace], validator.processors)
+    recognize = statistics['ocrd_calamari_recognize_7']
+    assert recognize.step is validator.processors[7]
+    assert recognize.count == 2
+    assert recognize.failed == 1
+    assert recognize.total_realtime == 3 * 60 * 1000
+    # Cached tasks were not measured in the run of the trace
+    assert statistics['ocrd_cis_ocropy_binarize_0'].count == 1
+
+    profile = suggest_resource_profile(aggregate_by_executable(statistics))
+    assert profile['ocrd-calamari-recognize'] == {'cpus': 4, 'memory': '5 GB', 'time': '4m'}
+    assert profile['ocrd-cis-ocropy-binarize']['cpus'] == 1
+
+
+def test_aggregate_traces_of_fused_steps(tmp_path):
+    """Tests that the tasks of fused steps are mapped to all of their steps but not to an executable"""
+    trace = write_trace(tmp_path / 'trace.txt', [
+        ('1', 'ab/0', 'ocrd_fused_0_1', 'COMPLETED', '0', '3s', '2s', '100.0%', '100 MB'),
+        ('2', 'ab/1', 'ocrd_skimage_binarize_2', 'COMPLETED', '0', '3s', '2s', '100.0%', '100 MB'),
+    ])
+    validator = OCRDValidator()
+    validator.validate('oton/assets/workflow1.txt')
+
+    statistics = aggregate_traces([trace], validator.processors)
+    assert statistics['ocrd_fused_0_1'].fused_steps == validator.processors[0:2]
+    assert statistics['ocrd_fused_0_1'].step is None
+    profile = suggest_resource_profile(aggregate_by_executable(statistics))
+    assert list(profile) == ['ocrd-skimage-binarize']
+    assert list(suggest_resource_profile(aggregate_by_executable(aggregate_traces([trace])))) == [
+        'ocrd-skimage-binarize']
+
+
+def test_profile_maps_tasks_of_pruned_workflow(tmp_path):
+    """Tests that the profile command maps the tasks to the steps as converted with the dataflow options"""
+    from click.testing import CliRunner
+    from oton.cli import cli
+    workflow_path = tmp_path / 'workflow.txt'
+    workflow_path.write_text(
+        'ocrd process \\\n'
+        '  "olena-binarize -I OCR-D-IMG -O OCR-D-BIN" \\\n'
+        '  "skimage-denoise -I OCR-D-BIN -O OCR-D-DENOISE" \\\n'
+        '  "anybaseocr-crop -I OCR-D-BIN -O OCR-D-CROP"\n')
+    # The trace of the script converted with --prune-dead-steps, without the denoising step
+    trace = write_trace(tmp_path / 'trace.txt', [
+        ('1', 'ab/0', 'ocrd_olena_binarize_0', 'COMPLETED', '0', '3s', '2s', '100.0%', '100 MB'),
+        ('2', 'ab/1', 'ocrd_anybaseocr_crop_1', 'COMPLETED', '0', '3s', '2s', '100.0%', '100 MB'),
+    ])
+
+    result = CliRunner().invoke(cli, ['profile', '-T', trace, '-I', str(workflow_path), '--keep-groups', 'OCR-D-CROP',
+                                       '--prune-dead-steps'])
+    assert result.exit_code == 0, result.output
+    assert "-I OCR-D-BIN -O OCR-D-CROP" in result.output
+    assert "OCR-D-DENOISE" not in result.output
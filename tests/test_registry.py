@@ -0,0 +1,40 @@
+from json import dump, load
+from os.path import isfile
+
+from oton.constants import OCRD_ALL_JSON_FILE
+from oton.registry import OcrdToolRegistry
+
+
+def test_registry_index_lookup(tmp_path):
+    """Tests that a lookup through the built index returns the same
+    tool description as the full registry JSON
+    """
+    with open(OCRD_ALL_JSON_FILE) as fp:
+        expected = load(fp)
+
+    registry = OcrdToolRegistry(OCRD_ALL_JSON_FILE, cache_dir=str(tmp_path))
+    assert registry.get('ocrd-olena-binarize') == expected['ocrd-olena-binarize']
+    assert registry.get('ocrd-not-existing') is None
+    assert isfile(registry.index_path)
+
+    # A fresh registry reuses the already built index
+    registry = OcrdToolRegistry(OCRD_ALL_JSON_FILE, cache_dir=str(tmp_path))
+    assert registry['ocrd-calamari-recognize'] == expected['ocrd-calamari-recognize']
+    assert set(registry.keys()) == set(expected.keys())
+
+
+def test_registry_index_invalidation(tmp_path):
+    """Tests that the index gets rebuilt once the content of the registry changes"""
+    source_path = tmp_path / 'ocrd_all_tool.json'
+    with open(source_path, mode='w') as fp:
+        dump({'ocrd-dummy': {'executable': 'ocrd-dummy'}}, fp)
+    registry = OcrdToolRegistry(str(source_path), cache_dir=str(tmp_path / 'cache'))
+    first_version = registry.version
+    assert 'ocrd-dummy' in registry
+
+    with open(source_path, mode='w') as fp:
+        dump({'ocrd-other': {'executable': 'ocrd-other', 'parameters': {}}}, fp)
+    registry = OcrdToolRegistry(str(source_path), cache_dir=str(tmp_path / 'cache'))
+    assert registry.version != first_version
+    assert 'ocrd-dummy' not in registry
+    assert registry['ocrd-other'] == {'executable': 'ocrd-other', 'parameters': {}}
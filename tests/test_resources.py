@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from oton.converter import Converter
+from oton.resources import ResourceProfile
+
+
+def test_profile_overrides_builtin_entries(tmp_path):
+    """Tests that a profile file overrides the built-in resources per resource,
+    and that executables without an own entry get the default resources.
+    """
+    profile_path = tmp_path / 'profile.json'
+    profile_path.write_text(json.dumps({
+        'default': {'memory': '3 GB'},
+        'ocrd-calamari-recognize': {'cpus': 8}
+    }))
+    profile = ResourceProfile.load(str(profile_path))
+
+    calamari_resources = profile.get('ocrd-calamari-recognize')
+    assert calamari_resources['cpus'] == 8
+    assert calamari_resources['memory'] == '8 GB'
+    assert profile.get('ocrd-unknown-processor')['memory'] == '3 GB'
+
+
+@pytest.mark.parametrize('resources', [{'gpus': 1}, {'cpus': '4'}, {'cpus': 0}])
+def test_profile_rejects_invalid_resources(resources):
+    with pytest.raises(ValueError):
+        ResourceProfile({'ocrd-calamari-recognize': resources})
+
+
+def test_conversion_with_resources():
+    """Tests that the steps request their resources and bind their thread limits to the requested cpus"""
+    workflow = 'ocrd process\n"calamari-recognize -I OCR-D-IMG -O OCR-D-OCR"'
+    profile = ResourceProfile({'ocrd-calamari-recognize': {'cpus': 4, 'memory': '8 GB', 'maxForks': 2}})
+
+    nextflow = Converter.convert_string(workflow, resource_profile=profile)
+    assert "cpus 4" in nextflow
+    assert "memory '8 GB'" in nextflow
+    # The steps of a linear workflow still share the METS file
+    assert "maxForks 1" in nextflow
+    assert "env OMP_NUM_THREADS=${task.cpus} OMP_THREAD_LIMIT=${task.cpus} ocrd-calamari-recognize" in nextflow
+
+    nextflow = Converter.convert_string(workflow, page_parallel=4, resource_profile=profile)
+    assert "maxForks 2" in nextflow
@@ -0,0 +1,40 @@
+from http.client import HTTPConnection
+from json import dumps, loads
+from threading import Thread
+
+from oton.converter import Converter
+from oton.server import create_server
+
+
+def post(port, endpoint, body):
+    connection = HTTPConnection('127.0.0.1', port)
+    connection.request('POST', endpoint, body=dumps(body), headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    result = response.status, loads(response.read())
+    connection.close()
+    return result
+
+
+def test_server_convert_and_validate():
+    """Tests the conversion and validation endpoints of the daemon"""
+    with open('tests/assets/workflow.txt', mode='r', encoding='utf-8') as fp:
+        workflow = fp.read()
+
+    server = create_server(port=0)
+    port = server.server_address[1]
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        status, body = post(port, '/convert', {'workflow': workflow, 'dockerized': True})
+        assert status == 200
+        assert body['nextflow'] == Converter.convert_string(workflow, dockerized=True)
+
+        status, body = post(port, '/validate', {'workflow': workflow})
+        assert status == 200
+        assert body['valid'] is True
+
+        status, body = post(port, '/validate', {'workflow': 'ocrd process\n"not-a-processor -I A -O B"'})
+        assert status == 400
+        assert "not found" in body['error']
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+from oton.cli import cli
+
+# The modules only needed to convert or validate a workflow, these dominate the cold start of the CLI
+HEAVY_MODULES = ["ocrd", "ocrd_models", "ocrd_validators", "ocrd_utils", "jsonschema", "pkg_resources"]
+
+CLI_RUNNER = f"""
+import sys
+from oton.cli import cli
+try:
+    cli(sys.argv[1:])
+except (SystemExit, ValueError):
+    pass
+print(sorted(module for module in {HEAVY_MODULES!r} if module in sys.modules), file=sys.stderr)
+"""
+
+
+@pytest.mark.parametrize("arguments", [
+    ["--help"],
+    *([command, "--help"] for command in sorted(cli.commands)),
+    ["validate", "-I", "tests/assets/not_existing.txt"],
+])
+def test_cli_cold_start(arguments):
+    """Tests that the CLI subcommands that do not convert or validate anything
+    start without importing the heavy dependencies.
+    """
+    result = subprocess.run([sys.executable, "-c", CLI_RUNNER] + arguments, capture_output=True, text=True)
+
+    assert result.stderr.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,101 @@
+import pytest
+
+from oton.cache import ValidationCache
+from oton.validators import ocrd_validator
+from oton.validators.ocrd_validator import (
+    OCRDValidator,
+    ProcessorCallArguments,
+    get_parameter_validator,
+    parse_arguments,
+    validate_all_processors,
+    validate_processor_params
+)
+
+
+def test_validators_cached_per_processor():
+    """Tests that the parameter validators are compiled once per distinct processor
+    and not once per workflow step
+    """
+    get_parameter_validator.cache_clear()
+    validator = OCRDValidator()
+    validator.validate('tests/assets/workflow_with_duplicate_processors.txt')
+
+    distinct_executables = {processor.executable for processor in validator.processors}
+    assert len(validator.processors) == 13
+    assert get_parameter_validator.cache_info().currsize == len(distinct_executables)
+
+
+def test_validation_keeps_parameters():
+    """Tests that validating does not insert the defaults into the parameters,
+    unless explicitly requested
+    """
+    processor = parse_arguments("olena-binarize -I OCR-D-IMG -O OCR-D-BIN -P impl kim")
+    validate_processor_params(processor, overwrite_with_defaults=False)
+    assert processor.parameters == {"impl": "kim"}
+
+    validate_processor_params(processor, overwrite_with_defaults=True)
+    assert processor.parameters["impl"] == "kim"
+    assert processor.parameters["k"] == 0.34
+
+
+def test_validation_keeps_missing_parameters():
+    """Tests that validating a call without parameters leaves the parameters unset"""
+    processor = ProcessorCallArguments("olena-binarize", "OCR-D-IMG", "OCR-D-BIN")
+    validate_processor_params(processor, overwrite_with_defaults=False)
+    assert processor.parameters is None
+
+
+def test_validation_cache_across_runs(tmp_path, monkeypatch):
+    """Tests that repeated validations are served from the on-disk cache, including the invalid ones"""
+    validation_cache = ValidationCache(str(tmp_path))
+    OCRDValidator(validation_cache).validate('tests/assets/workflow_with_duplicate_processors.txt')
+    invalid_processor = parse_arguments("olena-binarize -I OCR-D-IMG -O OCR-D-BIN -P impl unknown")
+    with pytest.raises(Exception):
+        validate_processor_params(invalid_processor, validation_cache=validation_cache)
+
+    def fail_compilation(*args, **kwargs):
+        raise AssertionError("The parameters were validated again")
+    monkeypatch.setattr(ocrd_validator, 'get_parameter_validator', fail_compilation)
+    validator = OCRDValidator(validation_cache)
+    validator.validate('tests/assets/workflow_with_duplicate_processors.txt')
+    assert len(validator.processors) == 13
+    with pytest.raises(Exception):
+        validate_processor_params(invalid_processor, validation_cache=validation_cache)
+
+
+def test_split_arguments_like_shlex():
+    """Tests that the processor calls are tokenized like shlex does in POSIX mode"""
+    from shlex import split as shlex_split
+    from oton.validators.validator_utils import split_arguments
+
+    lines = [
+        "olena-binarize -I OCR-D-IMG -O OCR-D-BIN -P impl kim",
+        "skimage-binarize -I A,B  -O C -p '{\"method\": \"li\", \"k\": [1, 2]}'",
+        "a \"b \\\" c\" d\\ e 'f''g'",
+        "",
+    ]
+    for line in lines:
+        assert split_arguments(line) == shlex_split(line)
+
+
+def test_parse_arguments_options():
+    """Tests that all options of a processor call are parsed"""
+    processor = parse_arguments(
+        "olena-binarize -I OCR-D-IMG -I OCR-D-IMG2 -O OCR-D-BIN -p '{\"impl\": \"kim\", \"k\": 0.2}' -P dpi 300")
+    assert processor.executable == "ocrd-olena-binarize"
+    assert processor.input_file_grps == "OCR-D-IMG,OCR-D-IMG2"
+    assert processor.output_file_grps == "OCR-D-BIN"
+    assert processor.parameters == {"impl": "kim", "k": 0.2, "dpi": 300}
+
+
+def test_existing_file_grps_declared():
+    """Tests that steps may read the file groups produced before, the input of the first step and
+    the declared existing file groups only
+    """
+    processors = [parse_arguments(task) for task in (
+        "dinglehopper -I OCR-D-GT-SEG-BLOCK,OCR-D-OCR -O OCR-D-EVAL-SEG-BLOCK",
+        "dinglehopper -I OCR-D-GT-SEG-LINE,OCR-D-OCR -O OCR-D-EVAL-SEG-LINE"
+    )]
+    with pytest.raises(ValueError, match="OCR-D-GT-SEG-LINE"):
+        validate_all_processors(processors)
+    validate_all_processors(processors, existing_file_grps=['OCR-D-GT-SEG-LINE'])